@@ -1,24 +1,29 @@
 import os
-import time
-import threading
-from flask import Flask, render_template, jsonify
+import atexit
+from flask import Flask, render_template, jsonify, Response, request
 from dotenv import load_dotenv
-import sqlite3
 from transformers import pipeline
-from pycoingecko import CoinGeckoAPI
 from web3 import Web3
-import plotly.graph_objs as go
-import requests
+from http_client import get_session
 import numpy as np
+from ingestion import latest_prices
+from storage import format_ts, parse_time, check_ts, check_id, PAGE_DATASETS
+from backends import get_backend
+from worker import IngestionWorker
+from breaker import breakers
+from metrics import render_metrics, CONTENT_TYPE
+from broker import tick_broker, start_tick_tailer, replay_after, lag_message, STREAM_BUFFER
+from charting import chart_series, parse_range, CHART_POINTS, MAX_CHART_POINTS, CHART_API_MAX_AGE
 
 # Cargar variables de entorno desde el archivo .env
 load_dotenv()
 
 app = Flask(__name__)
-
-# Configuración de PostgreSQL
-# Configuración de SQLite
-DB_NAME = "trading_bot.db"
+# Los estáticos (incluida la página de gráficos) se cachean en el navegador;
+# Flask responde 304 con ETag cuando caducan y no han cambiado
+app.config['SEND_FILE_MAX_AGE_DEFAULT'] = int(os.getenv('STATIC_MAX_AGE', 3600))
+# Los ts de ticks son milisegundos desde epoch; en las plantillas se muestran como fecha
+app.jinja_env.filters['format_ts'] = format_ts
 
 # Inicializar modelo de Hugging Face (Análisis de sentimiento)
 # Usamos un modelo específico para finanzas si es posible, o uno general
@@ -29,82 +34,53 @@ print("Modelo cargado.")
 # Configurar Web3 con Alchemy
 alchemy_url = os.getenv('ALCHEMY_URL')
 if alchemy_url:
-    web3 = Web3(Web3.HTTPProvider(alchemy_url))
+    # Mismas conexiones keep-alive, timeouts y reintentos que el resto de llamadas externas
+    upstream = get_session()
+    web3 = Web3(Web3.HTTPProvider(alchemy_url, request_kwargs={"timeout": upstream.timeout}, session=upstream))
 else:
     print("Advertencia: ALCHEMY_URL no configurado. La funcionalidad Web3 estará desactivada.")
     web3 = None
 
-# Conexión a CoinGecko
-cg = CoinGeckoAPI()
-
-# Función para obtener una conexión a la base de datos
-def get_db_connection():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row  # Para acceder a columnas por nombre
-    return conn
-
-# Función para cerrar una conexión a la base de datos
-def close_db_connection(conn):
-    conn.close()
-
-# Función para obtener precios de CoinGecko y guardarlos en la base de datos
-def fetch_and_store_prices(interval=60):
-    while True:
-        try:
-            # Obtener precios de CoinGecko
-            prices = cg.get_price(ids='matic-network,usd-coin', vs_currencies='usd')
-            matic_price = prices['matic-network']['usd']
-            usdc_price = prices['usd-coin']['usd']
-
-            # Guardar en la base de datos
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO prices (timestamp, token1, price1, token2, price2)
-                VALUES (datetime('now'), 'MATIC', ?, 'USDC', ?)
-            """, (matic_price, usdc_price))
-            conn.commit()
-            close_db_connection(conn)
-
-            print(f"Precios guardados: MATIC={matic_price}, USDC={usdc_price}")
-
-            # Esperar el intervalo
-            time.sleep(interval)
-        except Exception as e:
-            print(f"Error fetching or storing prices: {e}")
-            time.sleep(30)  # Reintentar después de 30 segundos
-
-# Iniciar el hilo para obtener y guardar precios
-threading.Thread(target=fetch_and_store_prices, daemon=True).start()
+# Backend de almacenamiento (STORAGE_BACKEND: sqlite por defecto, o postgres).
+# Los workers web solo abren la base: las migraciones las aplican
+# python create_db.py, worker.py o el hook on_starting de gunicorn.conf.py
+# (una vez, en el proceso maestro, antes de crear los workers).
+storage_backend = get_backend()
+
+# La ingesta (sondeo, escritura, retención y relleno de huecos) corre en un
+# proceso aparte, python worker.py, y los workers web solo leen. Con
+# INGEST_EMBEDDED=1 el propio proceso web compite por el lease de ingesta
+# (cómodo con python app.py); aun con varios workers de gunicorn solo uno sondea.
+ingestion_worker = None
+if os.getenv("INGEST_EMBEDDED", "0") == "1":
+    # Con la ingesta embebida (python app.py) no hay worker.py que migre antes
+    storage_backend.init_schema()
+    ingestion_worker = IngestionWorker(storage_backend)
+    ingestion_worker.start_in_thread()
+    # Último flush y liberación del lease al apagar el proceso
+    atexit.register(ingestion_worker.shutdown)
+
+# Ticks nuevos para /stream/prices: si este proceso lleva la ingesta los
+# publica al guardarlos; si no, se leen de la tabla ticks mientras haya clientes
+start_tick_tailer(storage_backend, paused=lambda: ingestion_worker is not None and ingestion_worker.leading)
+STREAM_HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", 15))
+# Filas por respuesta de las APIs de datos
+DEFAULT_PAGE_SIZE = int(os.getenv("API_PAGE_SIZE", 1000))
+MAX_PAGE_SIZE = int(os.getenv("API_MAX_PAGE_SIZE", 5000))
 
 # Ruta para la página principal
 @app.route("/")
 def home():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        # Número total de ticks desde tick_stats (tiempo constante)
+        total_records = storage_backend.total_ticks()
 
-        # Obtener el número total de registros en la tabla prices
-        cursor.execute("SELECT COUNT(*) FROM prices")
-        total_records = cursor.fetchone()[0]
+        # Obtener los últimos 10 ticks
+        last_records = storage_backend.latest_ticks(10)
 
-        # Obtener los últimos 10 registros de la tabla prices
-        cursor.execute("""
-            SELECT timestamp, token1, price1, token2, price2 
-            FROM prices 
-            ORDER BY timestamp DESC 
-            LIMIT 10
-        """)
-        last_records = cursor.fetchall()
-
-        # Obtener estadísticas de precios
-        cursor.execute("SELECT MIN(price1), MAX(price1), AVG(price1) FROM prices")
-        matic_stats = cursor.fetchone()
-
-        cursor.execute("SELECT MIN(price2), MAX(price2), AVG(price2) FROM prices")
-        usdc_stats = cursor.fetchone()
-
-        close_db_connection(conn)
+        # Estadísticas de precios mantenidas incrementalmente en tick_stats
+        matic_stats = storage_backend.symbol_stats('coingecko', 'MATIC')
+        usdc_stats = storage_backend.symbol_stats('coingecko', 'USDC')
 
         return render_template("index.html", 
                             total_records=total_records,
@@ -115,49 +91,178 @@ def home():
     except Exception as e:
         return render_template("error.html", error_message=str(e))
 
-# Ruta para mostrar gráficos
+# Ruta para mostrar gráficos: página estática (static/chart.html) que pide los
+# datos a /api/chart con los parámetros de su URL
 @app.route("/chart")
 def chart():
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Obtener datos para el gráfico de precios
-        cursor.execute("""
-            SELECT timestamp, price1, price2 
-            FROM prices 
-            ORDER BY timestamp DESC 
-            LIMIT 100
-        """)
-        chart_data = cursor.fetchall()
-        timestamps = [row[0] for row in chart_data]
-        price1 = [row[1] for row in chart_data]
-        price2 = [row[2] for row in chart_data]
-
-        close_db_connection(conn)
-
-        # Crear gráficos con Plotly
-        price1_trace = go.Scatter(x=timestamps, y=price1, mode='lines', name='Precio MATIC')
-        price2_trace = go.Scatter(x=timestamps, y=price2, mode='lines', name='Precio USDC')
-        layout = go.Layout(title='Gráfico de Precios', xaxis={'title': 'Fecha'}, yaxis={'title': 'Precio'})
-        chart_fig = go.Figure(data=[price1_trace, price2_trace], layout=layout)
-        chart_html = chart_fig.to_html(full_html=False)
-
-        return render_template("chart.html", chart_html=chart_html)
+    return app.send_static_file("chart.html")
 
-    except Exception as e:
-        return render_template("error.html", error_message=str(e))
+# Series de precios en columnas para los gráficos
+# Parámetros: symbol (repetible o separado por comas), source, start y end (ms,
+# fecha ISO o, para start, una duración como 7d) y points
+@app.route("/api/chart")
+def api_chart():
+    try:
+        source = request.args.get('source', 'coingecko')
+        names = [s.strip() for value in request.args.getlist('symbol') for s in value.split(',') if s.strip()] or ['MATIC', 'USDC']
+        start_ts, end_ts = parse_range(request.args.get('start', '24h'), request.args.get('end', ''))
+        points = min(MAX_CHART_POINTS, max(3, request.args.get('points', CHART_POINTS, type=int)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Una serie por símbolo, a la resolución del rango y reducida con LTTB
+    series = []
+    resolution = None
+    for name in names:
+        ts, prices, resolution = chart_series(storage_backend, source, name, start_ts, end_ts, points)
+        series.append({"symbol": name, "ts": ts, "price": prices})
+
+    response = jsonify({
+        "source": source, "start": start_ts, "end": end_ts,
+        "resolution": resolution or "ticks", "series": series,
+    })
+    # Caché corta en el navegador y 304 si los datos no han cambiado
+    response.cache_control.max_age = CHART_API_MAX_AGE
+    response.add_etag()
+    return response.make_conditional(request)
+
+# Ticks más nuevos que el cursor del cliente, para refrescar sin volver a
+# descargar lo que ya tiene. Parámetros: after_id (id del último tick visto) o
+# after_ts (su ts; con after_id además, el cursor es el par (ts, id)), symbol,
+# source y limit. Con after_ts se reciben también ticks tardíos de otros
+# símbolos con el mismo ts; con after_id, los insertados después aunque su ts
+# sea anterior (p. ej. huecos rellenados).
+@app.route("/api/ticks/since")
+def api_ticks_since():
+    after_id = request.args.get('after_id', type=int)
+    after_ts = request.args.get('after_ts', type=int)
+    if after_id is None and after_ts is None:
+        return jsonify({"error": "Falta el cursor: after_id o after_ts"}), 400
+    try:
+        after_id = check_id(after_id) if after_id is not None else None
+        after_ts = check_ts(after_ts) if after_ts is not None else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    names = [s.strip() for value in request.args.getlist('symbol') for s in value.split(',') if s.strip()]
+    limit = min(MAX_PAGE_SIZE, max(1, request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)))
+    rows = storage_backend.ticks_since(after_id, after_ts, request.args.get('source'), names, limit)
+
+    # Columnas, y el cursor para la siguiente petición (el mismo si no hay
+    # nada nuevo; sin after_id si la petición tampoco lo traía)
+    if rows:
+        after_id = rows[-1][0]
+        after_ts = rows[-1][1] if after_ts is not None else None
+    cursor = {"after_ts": after_ts} if after_ts is not None else {}
+    if after_id is not None:
+        cursor["after_id"] = after_id
+    return jsonify({
+        "id": [row[0] for row in rows],
+        "ts": [row[1] for row in rows],
+        "source": [row[2] for row in rows],
+        "symbol": [row[3] for row in rows],
+        "price": [row[4] for row in rows],
+        "cursor": cursor,
+        "more": len(rows) == limit,
+    })
+
+# Página de prices, trades o logs paginada por keyset sobre (ts, id).
+# Parámetros: fields (separados por comas; por defecto todos), symbol, source,
+# start y end (ms o fecha ISO), order (asc o desc), limit y cursor (el de la
+# respuesta anterior, opaco para el cliente). Responde en columnas con el
+# cursor de la página siguiente (null en la última).
+def keyset_api(dataset):
+    try:
+        fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()] or None
+        names = [s.strip() for value in request.args.getlist('symbol') for s in value.split(',') if s.strip()]
+        start, end = request.args.get('start'), request.args.get('end')
+        start_ts = parse_time(start) if start else None
+        end_ts = parse_time(end) if end else None
+        order = request.args.get('order', 'asc')
+        if order not in ('asc', 'desc'):
+            raise ValueError("order debe ser asc o desc")
+        cursor = request.args.get('cursor')
+        after = None
+        if cursor:
+            ts, _, row_id = cursor.partition(':')
+            if not (ts.isdigit() and row_id.isdigit()):
+                raise ValueError("Cursor no válido")
+            after = (check_ts(int(ts)), check_id(int(row_id)))
+        limit = min(MAX_PAGE_SIZE, max(1, request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)))
+        rows = storage_backend.keyset_page(dataset, fields, names, request.args.get('source'),
+                                           start_ts, end_ts, after, order == 'desc', limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    fields = fields or list(PAGE_DATASETS[dataset]["fields"])
+    page = {field: [row[i] for row in rows] for i, field in enumerate(fields)}
+    # Las dos últimas columnas de cada fila son su ts en ms y su id
+    page["cursor"] = f"{rows[-1][-2]}:{rows[-1][-1]}" if len(rows) == limit else None
+    return jsonify(page)
+
+@app.route("/api/prices")
+def api_prices():
+    return keyset_api("prices")
+
+@app.route("/api/trades")
+def api_trades():
+    return keyset_api("trades")
+
+@app.route("/api/logs")
+def api_logs():
+    return keyset_api("logs")
+
+# Precios en vivo por Server-Sent Events (EventSource en el navegador)
+# Parámetros: symbol (repetible o separado por comas; por defecto todos). Al
+# reconectar, el navegador envía Last-Event-ID y se reenvían los ticks perdidos.
+@app.route("/stream/prices")
+def stream_prices():
+    names = [s.strip() for value in request.args.getlist('symbol') for s in value.split(',') if s.strip()]
+    subscription = tick_broker.subscribe(names)
+    if subscription is None:
+        return jsonify({"error": "Demasiados clientes conectados"}), 503
+    last_event_id = request.headers.get('Last-Event-ID', '')
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            if last_event_id.isdigit():
+                # Lo perdido desde Last-Event-ID; si no cabe en STREAM_BUFFER
+                # mensajes, el cliente recibe un lag y recarga
+                missed, truncated = replay_after(storage_backend, subscription, int(last_event_id), STREAM_BUFFER)
+                yield "".join(missed)
+                if truncated:
+                    yield lag_message()
+            while True:
+                messages, dropped = subscription.drain(STREAM_HEARTBEAT)
+                if dropped:
+                    # El cliente no da abasto: se le avisa para que recargue lo perdido
+                    yield lag_message(dropped)
+                # Un comentario como latido mantiene viva la conexión en los proxies
+                yield "".join(messages) if messages else ": ping\n\n"
+        finally:
+            tick_broker.unsubscribe(subscription)
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # Ruta para mostrar estrategias
 @app.route("/strategy")
 def strategy():
     try:
-        # Obtener datos de CoinGecko (ejemplo: precio de Bitcoin)
-        bitcoin_price = cg.get_price(ids='bitcoin', vs_currencies='usd')['bitcoin']['usd']
-
-        # Obtener el último bloque de Polygon Amoy desde Alchemy
-        if web3 and web3.is_connected():
-            latest_block = web3.eth.block_number
+        # Precio de Bitcoin del último sondeo (sin llamar a CoinGecko): de la caché
+        # del motor si la ingesta corre en este proceso, o del último tick guardado
+        bitcoin_tick = latest_prices.get('BTC')
+        if bitcoin_tick:
+            bitcoin_price = bitcoin_tick.price
+        else:
+            bitcoin_row = storage_backend.latest_tick('BTC')
+            bitcoin_price = bitcoin_row[3] if bitcoin_row else "No disponible todavía"
+
+        # Obtener el último bloque de Polygon Amoy desde Alchemy. Si Alchemy está
+        # caído, el breaker responde al instante con el último bloque conocido.
+        if web3:
+            latest_block = breakers.get('alchemy').call_or_last(
+                lambda: web3.eth.block_number, default="No disponible (Alchemy no responde)")
         else:
             latest_block = "No disponible (configura ALCHEMY_URL)"
 
@@ -168,18 +273,21 @@ def strategy():
     except Exception as e:
         return render_template("error.html", error_message=str(e))
 
+# Función para obtener noticias de CryptoPanic (lanza excepción si falla, para el breaker)
+def fetch_news():
+    api_key = os.getenv('CRYPTOPANIC_API_KEY', 'TU_API_KEY')
+    news_url = f"https://cryptopanic.com/api/v1/posts/?auth_token={api_key}"
+    response = get_session().get(news_url)
+    response.raise_for_status()
+    return response.json()
+
 # Ruta para mostrar noticias y sentimiento
 @app.route("/news")
 def news():
     try:
-        # Obtener noticias de CryptoPanic
-        api_key = os.getenv('CRYPTOPANIC_API_KEY', 'TU_API_KEY')
-        news_url = f"https://cryptopanic.com/api/v1/posts/?auth_token={api_key}"
-        response = requests.get(news_url)
-        if response.status_code == 200:
-            news_data = response.json()
-        else:
-            news_data = {"error": "No se pudieron obtener noticias (Verifica tu API KEY)"}
+        # Noticias de CryptoPanic, o las últimas obtenidas si no responde
+        news_data = breakers.get('cryptopanic').call_or_last(
+            fetch_news, default={"error": "No se pudieron obtener noticias (Verifica tu API KEY)"})
 
         return render_template("news.html", news_data=news_data)
 
@@ -228,6 +336,11 @@ def liquidity():
     except Exception as e:
         return render_template("error.html", error_message=str(e))
 
+# Métricas de los breakers y de los límites de los proveedores (formato Prometheus)
+@app.route("/metrics")
+def metrics():
+    return Response(render_metrics(), mimetype=CONTENT_TYPE)
+
 # Iniciar el servidor
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5001, debug=False)
@@ -0,0 +1,866 @@
+import io
+import os
+import threading
+import time
+
+import storage
+import stats
+import rollups
+import retention
+from create_db import DB_NAME, init_db
+from db import ConnectionManager
+
+# Backends de almacenamiento: la ingesta y las rutas usan esta interfaz y no
+# saben si debajo hay un fichero SQLite o un servidor PostgreSQL.
+#
+#   init_schema()                                   crear/migrar el esquema
+#   write_ticks(ticks)                              escribir un lote en una transacción
+#   latest_ticks(limit)                             últimos ticks de todos los símbolos
+#   latest_tick(name)                               último tick de un símbolo en cualquier fuente
+#   symbol_series(source, name, limit)              últimos ticks de un símbolo
+#   tick_series(source, name, start, end)           ticks de un símbolo en un rango
+#   ticks_after(after_id, limit) / max_tick_id()    ticks nuevos por id (para /stream/prices)
+#   ticks_since(after_id, after_ts, source, names, limit)  ticks más nuevos que un cursor
+#   keyset_page(dataset, fields, names, source, start, end, after, descending, limit)
+#                                                   página de prices/trades/logs por (tiempo, id)
+#   total_ticks() / symbol_stats(source, name)      estadísticas de tick_stats
+#   candles(source, name, resolution, start, end)   velas OHLC
+#   write_ohlcv(source, name, timeframe, bars)      velas de un exchange + cursor, en una transacción
+#   ohlcv_cursor(source, name, timeframe)           ts de la última vela guardada (o None)
+#   ohlcv_series(source, name, timeframe, start, end)
+#   write_order_books(books)                        fotos del libro de órdenes
+#   order_book_metrics(source, name, start, end)    spread, mid, volúmenes e imbalance
+#   order_book_at(source, name, ts)                 última foto hasta ts, con sus niveles
+#   list_symbols()                                  pares (fuente, nombre)
+#   find_gaps(source, name, min_gap_ms, start, end) huecos en la serie de un símbolo
+#   backfill_chunks_done(job)                       checkpoints del backfill
+#   mark_backfill_chunk(job, start, end)
+#   acquire_lease(name, owner, ttl_ms)              obtener o renovar un lease; True si es de owner
+#   release_lease(name, owner)
+#   apply_retention(rules)                          purgar por lotes según RETENTION_RULES
+#   close()
+
+
+class SQLiteBackend:
+    name = "sqlite"
+
+    def __init__(self, path=DB_NAME):
+        self.path = path
+        self.db = ConnectionManager(path)
+
+    def init_schema(self):
+        init_db(self.path)
+
+    def write_ticks(self, ticks):
+        with self.db.write() as conn:
+            storage.write_ticks(conn.cursor(), ticks)
+
+    def latest_ticks(self, limit=10):
+        return storage.latest_ticks(self.db.reader(), limit)
+
+    def latest_tick(self, name):
+        return storage.latest_tick(self.db.reader(), name)
+
+    def symbol_series(self, source, name, limit=100):
+        return storage.symbol_series(self.db.reader(), source, name, limit)
+
+    def tick_series(self, source, name, start_ts, end_ts):
+        return storage.tick_series(self.db.reader(), source, name, start_ts, end_ts)
+
+    def ticks_after(self, after_id, limit=1000):
+        return storage.ticks_after(self.db.reader(), after_id, limit)
+
+    def max_tick_id(self):
+        return storage.max_tick_id(self.db.reader())
+
+    def ticks_since(self, after_id=None, after_ts=None, source=None, names=None, limit=1000):
+        return storage.ticks_since(self.db.reader(), after_id, after_ts, source, names, limit)
+
+    def keyset_page(self, dataset, fields=None, names=None, source=None, start_ts=None, end_ts=None,
+                    after=None, descending=False, limit=1000):
+        return storage.keyset_page(self.db.reader(), dataset, fields, names, source, start_ts, end_ts,
+                                   after, descending, limit)
+
+    def total_ticks(self):
+        return stats.total_ticks(self.db.reader())
+
+    def symbol_stats(self, source, name):
+        return stats.symbol_stats(self.db.reader(), source, name)
+
+    def candles(self, source, name, resolution, start_ts, end_ts):
+        return rollups.candles(self.db.reader(), source, name, resolution, start_ts, end_ts)
+
+    def write_ohlcv(self, source, name, timeframe, bars):
+        with self.db.write() as conn:
+            storage.write_ohlcv(conn.cursor(), source, name, timeframe, bars)
+
+    def ohlcv_cursor(self, source, name, timeframe):
+        return storage.ohlcv_cursor(self.db.reader(), source, name, timeframe)
+
+    def ohlcv_series(self, source, name, timeframe, start_ts, end_ts):
+        return storage.ohlcv_series(self.db.reader(), source, name, timeframe, start_ts, end_ts)
+
+    def write_order_books(self, books):
+        with self.db.write() as conn:
+            storage.write_order_books(conn.cursor(), books)
+
+    def order_book_metrics(self, source, name, start_ts, end_ts):
+        return storage.order_book_metrics(self.db.reader(), source, name, start_ts, end_ts)
+
+    def order_book_at(self, source, name, ts):
+        return storage.order_book_at(self.db.reader(), source, name, ts)
+
+    def list_symbols(self):
+        return storage.list_symbols(self.db.reader())
+
+    def find_gaps(self, source, name, min_gap_ms, start_ts, end_ts):
+        return storage.find_gaps(self.db.reader(), source, name, min_gap_ms, start_ts, end_ts)
+
+    def backfill_chunks_done(self, job):
+        return storage.backfill_chunks_done(self.db.reader(), job)
+
+    def mark_backfill_chunk(self, job, chunk_start, chunk_end):
+        with self.db.write() as conn:
+            storage.mark_backfill_chunk(conn.cursor(), job, chunk_start, chunk_end)
+
+    def acquire_lease(self, name, owner, ttl_ms):
+        with self.db.write() as conn:
+            return storage.acquire_lease(conn.cursor(), name, owner, ttl_ms)
+
+    def release_lease(self, name, owner):
+        with self.db.write() as conn:
+            storage.release_lease(conn.cursor(), name, owner)
+
+    # Con una conexión propia, serializada con el resto de escritores
+    def apply_retention(self, rules=None):
+        conn = self.db.connect()
+        try:
+            return retention.apply_retention(conn, rules, lock=self.db.write_lock)
+        finally:
+            conn.close()
+
+    def close(self):
+        self.db.close()
+
+
+# Esquema equivalente en PostgreSQL. En lugar de triggers por fila, tick_stats
+# y las velas se actualizan una vez por lote a partir de los ticks insertados
+# y de los corregidos.
+PG_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS symbols (
+        id SERIAL PRIMARY KEY,
+        source TEXT NOT NULL,
+        name TEXT NOT NULL,
+        UNIQUE (source, name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ticks (
+        id BIGSERIAL PRIMARY KEY,
+        symbol_id INTEGER NOT NULL REFERENCES symbols (id),
+        ts BIGINT NOT NULL,
+        price DOUBLE PRECISION NOT NULL
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_ticks_symbol_ts ON ticks (symbol_id, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_ticks_ts ON ticks (ts)",
+    # Keyset por (ts, id) en /api/ticks/since (en SQLite el índice (ts) ya incluye el rowid)
+    "CREATE INDEX IF NOT EXISTS idx_ticks_ts_id ON ticks (ts, id)",
+    """
+    CREATE TABLE IF NOT EXISTS tick_stats (
+        symbol_id INTEGER PRIMARY KEY REFERENCES symbols (id),
+        count BIGINT NOT NULL,
+        sum DOUBLE PRECISION NOT NULL,
+        min DOUBLE PRECISION NOT NULL,
+        max DOUBLE PRECISION NOT NULL,
+        mean DOUBLE PRECISION NOT NULL,
+        m2 DOUBLE PRECISION NOT NULL,
+        last_ts BIGINT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+        job TEXT NOT NULL,
+        chunk_start BIGINT NOT NULL,
+        chunk_end BIGINT NOT NULL,
+        done_ts BIGINT NOT NULL,
+        PRIMARY KEY (job, chunk_start)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_ts BIGINT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ohlcv (
+        symbol_id INTEGER NOT NULL REFERENCES symbols (id),
+        timeframe TEXT NOT NULL,
+        ts BIGINT NOT NULL,
+        open DOUBLE PRECISION NOT NULL,
+        high DOUBLE PRECISION NOT NULL,
+        low DOUBLE PRECISION NOT NULL,
+        close DOUBLE PRECISION NOT NULL,
+        volume DOUBLE PRECISION,
+        PRIMARY KEY (symbol_id, timeframe, ts)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ohlcv_cursors (
+        symbol_id INTEGER NOT NULL REFERENCES symbols (id),
+        timeframe TEXT NOT NULL,
+        since_ts BIGINT NOT NULL,
+        PRIMARY KEY (symbol_id, timeframe)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_ohlcv_ts ON ohlcv (ts)",
+    """
+    CREATE TABLE IF NOT EXISTS order_books (
+        id BIGSERIAL PRIMARY KEY,
+        symbol_id INTEGER NOT NULL REFERENCES symbols (id),
+        ts BIGINT NOT NULL,
+        bid_levels INTEGER NOT NULL,
+        ask_levels INTEGER NOT NULL,
+        best_bid DOUBLE PRECISION,
+        best_ask DOUBLE PRECISION,
+        bid_volume DOUBLE PRECISION NOT NULL,
+        ask_volume DOUBLE PRECISION NOT NULL,
+        bids BYTEA NOT NULL,
+        asks BYTEA NOT NULL
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_order_books_symbol_ts ON order_books (symbol_id, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_order_books_ts ON order_books (ts)",
+    """
+    CREATE TABLE IF NOT EXISTS trades (
+        id BIGSERIAL PRIMARY KEY,
+        side TEXT NOT NULL,
+        token1 TEXT NOT NULL,
+        token2 TEXT NOT NULL,
+        price1 DOUBLE PRECISION NOT NULL,
+        price2 DOUBLE PRECISION NOT NULL,
+        timestamp TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'UTC')
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_trades_timestamp_id ON trades (timestamp, id)",
+    """
+    CREATE TABLE IF NOT EXISTS logs (
+        id BIGSERIAL PRIMARY KEY,
+        message TEXT NOT NULL,
+        timestamp TIMESTAMP DEFAULT (NOW() AT TIME ZONE 'UTC')
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_logs_timestamp_id ON logs (timestamp, id)",
+    # Migraciones de datos ya aplicadas (ver PostgresBackend.init_schema)
+    """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        name TEXT PRIMARY KEY,
+        applied_ts BIGINT NOT NULL
+    )
+    """,
+] + [
+    statement
+    for resolution in rollups.RESOLUTIONS
+    for statement in (
+        f"""
+        CREATE TABLE IF NOT EXISTS ohlc_{resolution} (
+            symbol_id INTEGER NOT NULL REFERENCES symbols (id),
+            bucket_ts BIGINT NOT NULL,
+            open DOUBLE PRECISION NOT NULL,
+            high DOUBLE PRECISION NOT NULL,
+            low DOUBLE PRECISION NOT NULL,
+            close DOUBLE PRECISION NOT NULL,
+            open_ts BIGINT NOT NULL,
+            close_ts BIGINT NOT NULL,
+            count BIGINT NOT NULL,
+            PRIMARY KEY (symbol_id, bucket_ts)
+        )
+        """,
+        f"CREATE INDEX IF NOT EXISTS idx_ohlc_{resolution}_bucket ON ohlc_{resolution} (bucket_ts)",
+    )
+]
+
+# Los lotes se cargan con COPY en una tabla temporal y desde ahí se insertan.
+# Como en SQLite (storage.write_ticks), un tick repetido con otro precio lo
+# reemplaza: ticks_new guarda los nuevos y ticks_updated los corregidos con su
+# precio anterior; los repetidos con el mismo precio se ignoran.
+PG_STAGING = [
+    """
+    CREATE TEMP TABLE IF NOT EXISTS ticks_staging (
+        symbol_id INTEGER, ts BIGINT, price DOUBLE PRECISION
+    ) ON COMMIT DELETE ROWS
+    """,
+    """
+    CREATE TEMP TABLE IF NOT EXISTS ticks_new (
+        symbol_id INTEGER, ts BIGINT, price DOUBLE PRECISION
+    ) ON COMMIT DELETE ROWS
+    """,
+    """
+    CREATE TEMP TABLE IF NOT EXISTS ticks_updated (
+        symbol_id INTEGER, ts BIGINT, price DOUBLE PRECISION, old_price DOUBLE PRECISION
+    ) ON COMMIT DELETE ROWS
+    """,
+    """
+    CREATE TEMP TABLE IF NOT EXISTS ticks_removed (
+        symbol_id INTEGER, price DOUBLE PRECISION
+    ) ON COMMIT DELETE ROWS
+    """,
+]
+
+# previous lee los precios anteriores con la instantánea previa al upsert (todas
+# las partes de un WITH la comparten); xmax = 0 distingue las filas insertadas
+# de las actualizadas
+PG_INSERT_STAGED = """
+    WITH batch AS (
+        SELECT DISTINCT ON (symbol_id, ts) symbol_id, ts, price
+        FROM ticks_staging
+        ORDER BY symbol_id, ts
+    ), previous AS (
+        SELECT t.symbol_id, t.ts, t.price
+        FROM ticks t
+        JOIN batch b ON b.symbol_id = t.symbol_id AND b.ts = t.ts
+    ), written AS (
+        INSERT INTO ticks (symbol_id, ts, price)
+        SELECT symbol_id, ts, price FROM batch
+        ON CONFLICT (symbol_id, ts) DO UPDATE SET price = excluded.price
+        WHERE ticks.price <> excluded.price
+        RETURNING symbol_id, ts, price, xmax = 0 AS inserted
+    ), updated AS (
+        INSERT INTO ticks_updated
+        SELECT w.symbol_id, w.ts, w.price, p.price
+        FROM written w
+        JOIN previous p ON p.symbol_id = w.symbol_id AND p.ts = w.ts
+        WHERE NOT w.inserted
+    )
+    INSERT INTO ticks_new SELECT symbol_id, ts, price FROM written WHERE inserted
+"""
+
+# Combinar las estadísticas del lote con las guardadas (Chan et al.)
+PG_MERGE_STATS = """
+    INSERT INTO tick_stats (symbol_id, count, sum, min, max, mean, m2, last_ts)
+    SELECT symbol_id, COUNT(*), SUM(price), MIN(price), MAX(price),
+           AVG(price), VAR_POP(price) * COUNT(*), MAX(ts)
+    FROM ticks_new
+    GROUP BY symbol_id
+    ON CONFLICT (symbol_id) DO UPDATE SET
+        count = tick_stats.count + excluded.count,
+        sum = tick_stats.sum + excluded.sum,
+        min = LEAST(tick_stats.min, excluded.min),
+        max = GREATEST(tick_stats.max, excluded.max),
+        mean = tick_stats.mean + (excluded.mean - tick_stats.mean)
+            * excluded.count / (tick_stats.count + excluded.count),
+        m2 = tick_stats.m2 + excluded.m2 + (excluded.mean - tick_stats.mean) ^ 2
+            * tick_stats.count * excluded.count / (tick_stats.count + excluded.count),
+        last_ts = GREATEST(tick_stats.last_ts, excluded.last_ts)
+"""
+
+# Precios corregidos: como el trigger de stats.py, reemplazar el valor en la
+# media y en M2 (M2 = suma de x² - n·media²); min/max solo se amplían
+PG_CORRECT_STATS = """
+    UPDATE tick_stats st SET
+        sum = st.sum + u.delta,
+        min = LEAST(st.min, u.low),
+        max = GREATEST(st.max, u.high),
+        mean = st.mean + u.delta / st.count,
+        m2 = st.m2 + u.squares - u.delta * (2 * st.mean + u.delta / st.count)
+    FROM (
+        SELECT symbol_id, SUM(price - old_price) AS delta,
+               SUM(price * price - old_price * old_price) AS squares,
+               MIN(price) AS low, MAX(price) AS high
+        FROM ticks_updated
+        GROUP BY symbol_id
+    ) u
+    WHERE st.symbol_id = u.symbol_id
+"""
+
+PG_MERGE_OHLC = """
+    INSERT INTO ohlc_{resolution} (symbol_id, bucket_ts, open, high, low, close, open_ts, close_ts, count)
+    SELECT symbol_id, ts - ts % {width} AS bucket_ts,
+           (ARRAY_AGG(price ORDER BY ts))[1], MAX(price), MIN(price),
+           (ARRAY_AGG(price ORDER BY ts DESC))[1], MIN(ts), MAX(ts), COUNT(*)
+    FROM ticks_new
+    GROUP BY symbol_id, bucket_ts
+    ON CONFLICT (symbol_id, bucket_ts) DO UPDATE SET
+        open = CASE WHEN excluded.open_ts < ohlc_{resolution}.open_ts
+                    THEN excluded.open ELSE ohlc_{resolution}.open END,
+        open_ts = LEAST(ohlc_{resolution}.open_ts, excluded.open_ts),
+        close = CASE WHEN excluded.close_ts >= ohlc_{resolution}.close_ts
+                     THEN excluded.close ELSE ohlc_{resolution}.close END,
+        close_ts = GREATEST(ohlc_{resolution}.close_ts, excluded.close_ts),
+        high = GREATEST(ohlc_{resolution}.high, excluded.high),
+        low = LEAST(ohlc_{resolution}.low, excluded.low),
+        count = ohlc_{resolution}.count + excluded.count
+"""
+
+# Precios corregidos en las velas, como el trigger de rollups.py
+PG_CORRECT_OHLC = """
+    UPDATE ohlc_{resolution} o SET
+        open = COALESCE((SELECT u.price FROM ticks_updated u
+                         WHERE u.symbol_id = o.symbol_id AND u.ts = o.open_ts), o.open),
+        close = COALESCE((SELECT u.price FROM ticks_updated u
+                          WHERE u.symbol_id = o.symbol_id AND u.ts = o.close_ts), o.close),
+        high = GREATEST(o.high, b.high),
+        low = LEAST(o.low, b.low)
+    FROM (
+        SELECT symbol_id, ts - ts % {width} AS bucket_ts, MAX(price) AS high, MIN(price) AS low
+        FROM ticks_updated
+        GROUP BY symbol_id, bucket_ts
+    ) b
+    WHERE o.symbol_id = b.symbol_id AND o.bucket_ts = b.bucket_ts
+"""
+
+# Un lote de la retención de ticks: los borrados quedan en ticks_removed para
+# descontarlos de tick_stats en la misma transacción
+PG_DELETE_TICKS = """
+    WITH removed AS (
+        DELETE FROM ticks
+        WHERE id IN (SELECT id FROM ticks WHERE ts < %s LIMIT %s)
+        RETURNING symbol_id, price
+    )
+    INSERT INTO ticks_removed SELECT symbol_id, price FROM removed
+"""
+
+# Como stats.remove_from_stats: los símbolos sin ticks restantes pierden su
+# fila y al resto se les restan count y sum y se separan media y M2 (Chan a la
+# inversa). min/max y last_ts los recalcula PG_REFRESH_STATS_BOUNDS.
+PG_REMOVE_STATS = [
+    """
+    DELETE FROM tick_stats st
+    USING (SELECT symbol_id, COUNT(*) AS count FROM ticks_removed GROUP BY symbol_id) r
+    WHERE st.symbol_id = r.symbol_id AND st.count <= r.count
+    """,
+    """
+    UPDATE tick_stats st SET
+        count = st.count - r.count,
+        sum = st.sum - r.sum,
+        mean = (st.count * st.mean - r.sum) / (st.count - r.count),
+        m2 = GREATEST(0, st.m2 - r.m2 - (r.mean - (st.count * st.mean - r.sum) / (st.count - r.count)) ^ 2
+            * r.count * (st.count - r.count) / st.count)
+    FROM (
+        SELECT symbol_id, COUNT(*) AS count, SUM(price) AS sum, AVG(price) AS mean,
+               VAR_POP(price) * COUNT(*) AS m2
+        FROM ticks_removed
+        GROUP BY symbol_id
+    ) r
+    WHERE st.symbol_id = r.symbol_id
+    """,
+]
+
+PG_REFRESH_STATS_BOUNDS = """
+    UPDATE tick_stats st SET (min, max, last_ts) = (
+        SELECT MIN(price), MAX(price), MAX(ts) FROM ticks WHERE symbol_id = st.symbol_id
+    )
+    WHERE st.symbol_id = ANY(%s)
+"""
+
+# Identificador del bloqueo consultivo que serializa init_schema entre procesos
+PG_SCHEMA_LOCK = 727001
+# Bloqueo consultivo de las escrituras en ticks (ver _merge_staged)
+PG_TICKS_LOCK = 727002
+
+
+class PostgresBackend:
+    name = "postgres"
+
+    def __init__(self, minconn=1, maxconn=10, **params):
+        # psycopg2 solo hace falta con este backend
+        from psycopg2.pool import ThreadedConnectionPool
+
+        params = params or {
+            "host": os.getenv("DB_HOST"),
+            "dbname": os.getenv("DB_NAME"),
+            "user": os.getenv("DB_USER"),
+            "password": os.getenv("DB_PASSWORD"),
+            "port": os.getenv("DB_PORT", 5432),
+            "sslmode": os.getenv("DB_SSLMODE", "prefer"),
+        }
+        self.pool = ThreadedConnectionPool(minconn, maxconn, **params)
+        # getconn() lanza PoolError en vez de esperar si las maxconn están en
+        # uso: con más hilos que conexiones, los que sobran esperan aquí turno
+        self._slots = threading.BoundedSemaphore(maxconn)
+        # Caché (fuente, nombre) -> id de symbols
+        self.symbol_ids = {}
+
+    def _run(self, work):
+        with self._slots:
+            conn = self.pool.getconn()
+            try:
+                # with conn: commit al salir o rollback si hay excepción
+                with conn, conn.cursor() as cursor:
+                    return work(cursor)
+            finally:
+                self.pool.putconn(conn)
+
+    def _query(self, sql, params=()):
+        def work(cursor):
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+        return self._run(work)
+
+    # PG_SCHEMA es idempotente; las migraciones de datos de PG_MIGRATIONS se
+    # aplican una sola vez (schema_migrations). El bloqueo consultivo evita que
+    # dos procesos las apliquen a la vez.
+    def init_schema(self):
+        def work(cursor):
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (PG_SCHEMA_LOCK,))
+            for statement in PG_SCHEMA:
+                cursor.execute(statement)
+            cursor.execute("SELECT name FROM schema_migrations")
+            applied = {row[0] for row in cursor.fetchall()}
+            for migration in PG_MIGRATIONS:
+                if migration.__name__ not in applied:
+                    migration(self, cursor)
+                    cursor.execute("""
+                        INSERT INTO schema_migrations (name, applied_ts)
+                        VALUES (%s, (EXTRACT(EPOCH FROM NOW()) * 1000)::BIGINT)
+                    """, (migration.__name__,))
+                    print(f"Migración aplicada: {migration.__name__}")
+        self._run(work)
+
+    # Pasar a ticks las filas de ticks_staging y actualizar con ellas
+    # tick_stats y las velas. Los cursores por id (ticks_after, ticks_since)
+    # suponen que los ids se hacen visibles en orden; con dos transacciones a
+    # la vez, la que toma ids más altos podría confirmar antes y el cursor
+    # saltaría los de la otra. El bloqueo consultivo, hasta el commit, hace
+    # que los escritores tomen ids y confirmen de uno en uno, como el único
+    # escritor de SQLite.
+    def _merge_staged(self, cursor):
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (PG_TICKS_LOCK,))
+        cursor.execute(PG_INSERT_STAGED)
+        cursor.execute(PG_MERGE_STATS)
+        cursor.execute(PG_CORRECT_STATS)
+        for resolution, width in rollups.RESOLUTIONS.items():
+            cursor.execute(PG_MERGE_OHLC.format(resolution=resolution, width=width))
+            cursor.execute(PG_CORRECT_OHLC.format(resolution=resolution, width=width))
+
+    # Tabla ancha prices de las versiones anteriores (la que creaba el README
+    # en PostgreSQL): como migration_001_ticks en SQLite, sus filas pasan a
+    # ticks con fuente coingecko y ts en milisegundos (timestamp en UTC)
+    def migrate_legacy_prices(self, cursor):
+        cursor.execute("SELECT to_regclass('prices')")
+        if cursor.fetchone()[0] is None:
+            return
+        for statement in PG_STAGING:
+            cursor.execute(statement)
+        for token, price in (("token1", "price1"), ("token2", "price2")):
+            cursor.execute(f"""
+                INSERT INTO symbols (source, name)
+                SELECT DISTINCT 'coingecko', {token} FROM prices
+                ON CONFLICT (source, name) DO NOTHING
+            """)
+            cursor.execute(f"""
+                INSERT INTO ticks_staging (symbol_id, ts, price)
+                SELECT s.id, (EXTRACT(EPOCH FROM p.timestamp) * 1000)::BIGINT, p.{price}
+                FROM prices p
+                JOIN symbols s ON s.source = 'coingecko' AND s.name = p.{token}
+            """)
+        self._merge_staged(cursor)
+
+    def _symbol_id(self, cursor, source, name):
+        key = (source, name)
+        symbol_id = self.symbol_ids.get(key)
+        if symbol_id is None:
+            cursor.execute("""
+                INSERT INTO symbols (source, name) VALUES (%s, %s)
+                ON CONFLICT (source, name) DO UPDATE SET name = excluded.name
+                RETURNING id
+            """, key)
+            symbol_id = self.symbol_ids[key] = cursor.fetchone()[0]
+        return symbol_id
+
+    def write_ticks(self, ticks):
+        def work(cursor):
+            for statement in PG_STAGING:
+                cursor.execute(statement)
+            data = io.StringIO("".join(
+                f"{self._symbol_id(cursor, tick.source, tick.symbol)}\t{int(tick.ts)}\t{float(tick.price)!r}\n"
+                for tick in ticks
+            ))
+            cursor.copy_expert("COPY ticks_staging (symbol_id, ts, price) FROM STDIN", data)
+            self._merge_staged(cursor)
+
+        try:
+            self._run(work)
+        except Exception:
+            # Si la transacción se deshace, los ids recién cacheados pueden no existir
+            self.symbol_ids.clear()
+            raise
+
+    def latest_ticks(self, limit=10):
+        return self._query("""
+            SELECT t.ts, s.source, s.name, t.price
+            FROM ticks t
+            JOIN symbols s ON s.id = t.symbol_id
+            ORDER BY t.ts DESC
+            LIMIT %s
+        """, (limit,))
+
+    def symbol_series(self, source, name, limit=100):
+        rows = self._query("""
+            SELECT t.ts, t.price
+            FROM ticks t
+            WHERE t.symbol_id = (SELECT id FROM symbols WHERE source = %s AND name = %s)
+            ORDER BY t.ts DESC
+            LIMIT %s
+        """, (source, name, limit))
+        return rows[::-1]
+
+    def tick_series(self, source, name, start_ts, end_ts):
+        return self._query("""
+            SELECT t.ts, t.price
+            FROM ticks t
+            WHERE t.symbol_id = (SELECT id FROM symbols WHERE source = %s AND name = %s)
+              AND t.ts >= %s AND t.ts < %s
+            ORDER BY t.ts
+        """, (source, name, start_ts, end_ts))
+
+    def ticks_after(self, after_id, limit=1000):
+        return self._query("""
+            SELECT t.id, t.ts, s.source, s.name, t.price
+            FROM ticks t
+            JOIN symbols s ON s.id = t.symbol_id
+            WHERE t.id > %s
+            ORDER BY t.id
+            LIMIT %s
+        """, (after_id, limit))
+
+    def max_tick_id(self):
+        return self._query("SELECT COALESCE(MAX(id), 0) FROM ticks")[0][0]
+
+    def ticks_since(self, after_id=None, after_ts=None, source=None, names=None, limit=1000):
+        where, params, order = storage.since_clauses(after_id, after_ts, source, names, "%s")
+        return self._query(f"""
+            SELECT t.id, t.ts, s.source, s.name, t.price
+            FROM ticks t
+            JOIN symbols s ON s.id = t.symbol_id
+            WHERE {where}
+            ORDER BY {order}
+            LIMIT %s
+        """, params + [limit])
+
+    # trades y logs guardan TIMESTAMP sin zona (UTC)
+    def keyset_page(self, dataset, fields=None, names=None, source=None, start_ts=None, end_ts=None,
+                    after=None, descending=False, limit=1000):
+        symbol_ids = None
+        if names and "symbol_id" in storage.PAGE_DATASETS[dataset]:
+            symbol_ids = [row[0] for row in self._query(*storage.symbol_ids_query(names, source, placeholder="%s"))]
+        sql, params = storage.keyset_page_query(
+            dataset, fields, names, source, start_ts, end_ts, after, descending, limit, placeholder="%s",
+            ms_expr=lambda column: f"(EXTRACT(EPOCH FROM {column}) * 1000)::BIGINT",
+            db_time=lambda ms: storage.ts_to_datetime(ms).replace(tzinfo=None),
+            symbol_ids=symbol_ids,
+        )
+        return self._query(sql, params)
+
+    def latest_tick(self, name):
+        # Como en storage.latest_tick: un último tick por id de símbolo vía (symbol_id, ts)
+        rows = self._query("""
+            SELECT t.ts, s.source, s.name, t.price
+            FROM symbols s
+            JOIN ticks t ON t.id = (
+                SELECT id FROM ticks WHERE symbol_id = s.id ORDER BY ts DESC LIMIT 1
+            )
+            WHERE s.name = %s
+            ORDER BY t.ts DESC
+            LIMIT 1
+        """, (name,))
+        return rows[0] if rows else None
+
+    def total_ticks(self):
+        return self._query("SELECT COALESCE(SUM(count), 0) FROM tick_stats")[0][0]
+
+    def symbol_stats(self, source, name):
+        rows = self._query("""
+            SELECT st.min, st.max, st.mean,
+                   CASE WHEN st.count > 1 THEN SQRT(st.m2 / (st.count - 1)) ELSE 0 END
+            FROM tick_stats st
+            JOIN symbols s ON s.id = st.symbol_id
+            WHERE s.source = %s AND s.name = %s
+        """, (source, name))
+        return rows[0] if rows else (None, None, None, None)
+
+    def candles(self, source, name, resolution, start_ts, end_ts):
+        if resolution not in rollups.RESOLUTIONS:
+            raise ValueError(f"Resolución desconocida: {resolution}")
+        return self._query(f"""
+            SELECT bucket_ts, open, high, low, close, count
+            FROM ohlc_{resolution}
+            WHERE symbol_id = (SELECT id FROM symbols WHERE source = %s AND name = %s)
+              AND bucket_ts >= %s AND bucket_ts < %s
+            ORDER BY bucket_ts
+        """, (source, name, start_ts, end_ts))
+
+    def write_ohlcv(self, source, name, timeframe, bars):
+        def work(cursor):
+            symbol_id = self._symbol_id(cursor, source, name)
+            cursor.executemany("""
+                INSERT INTO ohlcv (symbol_id, timeframe, ts, open, high, low, close, volume)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (symbol_id, timeframe, ts) DO UPDATE SET
+                    open = excluded.open, high = excluded.high, low = excluded.low,
+                    close = excluded.close, volume = excluded.volume
+            """, [(symbol_id, timeframe, int(bar[0]), *bar[1:6]) for bar in bars])
+            cursor.execute("""
+                INSERT INTO ohlcv_cursors (symbol_id, timeframe, since_ts) VALUES (%s, %s, %s)
+                ON CONFLICT (symbol_id, timeframe) DO UPDATE
+                SET since_ts = GREATEST(ohlcv_cursors.since_ts, excluded.since_ts)
+            """, (symbol_id, timeframe, max(int(bar[0]) for bar in bars)))
+        self._run(work)
+
+    def ohlcv_cursor(self, source, name, timeframe):
+        rows = self._query("""
+            SELECT c.since_ts
+            FROM ohlcv_cursors c
+            JOIN symbols s ON s.id = c.symbol_id
+            WHERE s.source = %s AND s.name = %s AND c.timeframe = %s
+        """, (source, name, timeframe))
+        return rows[0][0] if rows else None
+
+    def ohlcv_series(self, source, name, timeframe, start_ts, end_ts):
+        return self._query("""
+            SELECT ts, open, high, low, close, volume
+            FROM ohlcv
+            WHERE symbol_id = (SELECT id FROM symbols WHERE source = %s AND name = %s)
+              AND timeframe = %s AND ts >= %s AND ts < %s
+            ORDER BY ts
+        """, (source, name, timeframe, start_ts, end_ts))
+
+    def write_order_books(self, books):
+        def work(cursor):
+            rows = [storage.order_book_row(self._symbol_id(cursor, book.source, book.symbol), book) for book in books]
+            cursor.executemany("""
+                INSERT INTO order_books (symbol_id, ts, bid_levels, ask_levels, best_bid, best_ask,
+                                         bid_volume, ask_volume, bids, asks)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (symbol_id, ts) DO NOTHING
+            """, rows)
+        self._run(work)
+
+    def order_book_metrics(self, source, name, start_ts, end_ts):
+        return self._query("""
+            SELECT ts, best_ask - best_bid AS spread, (best_ask + best_bid) / 2 AS mid,
+                   bid_volume, ask_volume,
+                   (bid_volume - ask_volume) / NULLIF(bid_volume + ask_volume, 0) AS imbalance
+            FROM order_books
+            WHERE symbol_id = (SELECT id FROM symbols WHERE source = %s AND name = %s)
+              AND ts >= %s AND ts < %s
+            ORDER BY ts
+        """, (source, name, start_ts, end_ts))
+
+    def order_book_at(self, source, name, ts):
+        rows = self._query("""
+            SELECT ts, bids, asks
+            FROM order_books
+            WHERE symbol_id = (SELECT id FROM symbols WHERE source = %s AND name = %s) AND ts <= %s
+            ORDER BY ts DESC
+            LIMIT 1
+        """, (source, name, ts))
+        if not rows:
+            return None
+        ts, bids, asks = rows[0]
+        return ts, storage.unpack_levels(bytes(bids)), storage.unpack_levels(bytes(asks))
+
+    def list_symbols(self):
+        return [tuple(row) for row in self._query("SELECT source, name FROM symbols ORDER BY source, name")]
+
+    def find_gaps(self, source, name, min_gap_ms, start_ts, end_ts):
+        return self._query(storage.FIND_GAPS_SQL.format(p="%s"), (source, name, start_ts, start_ts, end_ts, min_gap_ms))
+
+    def backfill_chunks_done(self, job):
+        return self._query("SELECT chunk_start, chunk_end FROM backfill_checkpoints WHERE job = %s", (job,))
+
+    def mark_backfill_chunk(self, job, chunk_start, chunk_end):
+        def work(cursor):
+            cursor.execute("""
+                INSERT INTO backfill_checkpoints (job, chunk_start, chunk_end, done_ts)
+                VALUES (%s, %s, %s, (EXTRACT(EPOCH FROM NOW()) * 1000)::BIGINT)
+                ON CONFLICT (job, chunk_start) DO UPDATE
+                SET chunk_end = excluded.chunk_end, done_ts = excluded.done_ts
+            """, (job, chunk_start, chunk_end))
+        self._run(work)
+
+    # El reloj es el del servidor: todos los procesos comparan contra la misma hora
+    def acquire_lease(self, name, owner, ttl_ms):
+        def work(cursor):
+            cursor.execute("""
+                INSERT INTO leases (name, owner, expires_ts)
+                VALUES (%s, %s, (EXTRACT(EPOCH FROM NOW()) * 1000)::BIGINT + %s)
+                ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_ts = excluded.expires_ts
+                WHERE leases.owner = excluded.owner
+                   OR leases.expires_ts < (EXTRACT(EPOCH FROM NOW()) * 1000)::BIGINT
+                RETURNING owner
+            """, (name, owner, ttl_ms))
+            return cursor.fetchone() is not None
+        return self._run(work)
+
+    def release_lease(self, name, owner):
+        def work(cursor):
+            cursor.execute("DELETE FROM leases WHERE name = %s AND owner = %s", (name, owner))
+        self._run(work)
+
+    # Las mismas reglas que en SQLite (retention.TABLES), en lotes de
+    # batch_size filas, cada uno en su transacción y seguido de una pausa. El
+    # espacio lo recupera el autovacuum del servidor.
+    def apply_retention(self, rules=None, batch_size=5000, pause=0.05):
+        rules = retention.parse_rules() if rules is None else rules
+        now = int(time.time() * 1000)
+        deleted = {}
+        for table, keep_ms in rules.items():
+            if self._query("SELECT to_regclass(%s)", (table,))[0][0] is None:
+                continue
+            column, key, in_ms = retention.TABLES[table]
+            cutoff = now - keep_ms if in_ms else storage.format_ts(now - keep_ms)
+
+            def work(cursor):
+                if table == "ticks":
+                    for statement in PG_STAGING:
+                        cursor.execute(statement)
+                    cursor.execute(PG_DELETE_TICKS, (cutoff, batch_size))
+                    count = cursor.rowcount
+                    cursor.execute("SELECT DISTINCT symbol_id FROM ticks_removed")
+                    touched.update(row[0] for row in cursor.fetchall())
+                    for statement in PG_REMOVE_STATS:
+                        cursor.execute(statement)
+                    return count
+                cursor.execute(f"""
+                    DELETE FROM {table}
+                    WHERE ({key}) IN (SELECT {key} FROM {table} WHERE {column} < %s LIMIT %s)
+                """, (cutoff, batch_size))
+                return cursor.rowcount
+
+            deleted[table] = 0
+            touched = set()
+            while True:
+                count = self._run(work)
+                deleted[table] += count
+                if count < batch_size:
+                    break
+                time.sleep(pause)
+            if touched:
+                self._run(lambda cursor: cursor.execute(PG_REFRESH_STATS_BOUNDS, (sorted(touched),)))
+        return deleted
+
+    def close(self):
+        self.pool.closeall()
+
+
+# Migraciones de datos de PostgreSQL, en orden
+PG_MIGRATIONS = [
+    PostgresBackend.migrate_legacy_prices,
+]
+
+
+# Backend según STORAGE_BACKEND (sqlite por defecto, o postgres)
+def get_backend(kind=None):
+    kind = kind or os.getenv("STORAGE_BACKEND", "sqlite")
+    if kind == "sqlite":
+        return SQLiteBackend(os.getenv("SQLITE_PATH", DB_NAME))
+    if kind == "postgres":
+        return PostgresBackend(
+            minconn=int(os.getenv("DB_POOL_MIN", 1)),
+            maxconn=int(os.getenv("DB_POOL_MAX", 10)),
+        )
+    raise ValueError(f"STORAGE_BACKEND desconocido: {kind}")
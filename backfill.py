@@ -0,0 +1,228 @@
+import argparse
+import asyncio
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from backends import get_backend
+from http_client import coingecko_client, ccxt_exchange
+from ingestion import Tick, now_ms
+from retention import parse_rules
+from storage import parse_time
+from universe import load_universe
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+# Presupuesto por proveedor: como mucho `concurrency` peticiones a la vez y
+# una cada 60/per_minute segundos
+class RateBudget:
+    def __init__(self, per_minute, concurrency=2):
+        self.interval = 60.0 / per_minute
+        self.concurrency = concurrency
+        self._semaphore = None
+        self._lock = None
+        self._next = 0.0
+
+    async def __aenter__(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._lock = asyncio.Lock()
+        await self._semaphore.acquire()
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def __aexit__(self, *exc):
+        self._semaphore.release()
+
+
+# Histórico de CoinGecko (market_chart/range). La granularidad la decide la API
+# según la longitud del rango: 5 minutos hasta 1 día, horaria hasta 90 días.
+class CoinGeckoHistory:
+    provider = "coingecko"
+    # Pidiendo como mucho un día por llamada se obtienen puntos cada 5 minutos
+    resolution_ms = 5 * 60 * 1000
+    max_window_ms = DAY_MS
+
+    def __init__(self, coin_id, symbol, vs_currency="usd", client=None):
+        self.source = "coingecko"
+        self.coin_id = coin_id
+        self.symbol = symbol
+        self.vs_currency = vs_currency
+        self.client = client or coingecko_client()
+
+    @property
+    def job(self):
+        return f"coingecko:{self.coin_id}:{self.vs_currency}"
+
+    # Una sola petición cubre toda la ventana: no hay página siguiente
+    def fetch_page(self, start_ts, end_ts):
+        data = self.client.get_coin_market_chart_range_by_id(
+            self.coin_id, self.vs_currency, start_ts // 1000, end_ts // 1000
+        )
+        ticks = [
+            Tick(self.source, self.symbol, price, int(ts))
+            for ts, price in data.get("prices", [])
+            if start_ts <= ts < end_ts
+        ]
+        return ticks, None
+
+
+# Histórico de un exchange de ccxt con fetch_ohlcv: cada vela se guarda como un
+# tick con su precio de cierre en el último milisegundo de la vela
+class CcxtHistory:
+    def __init__(self, exchange, symbol, timeframe="1m"):
+        self.exchange = exchange
+        self.provider = exchange.id
+        self.source = exchange.id
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.timeframe_ms = exchange.parse_timeframe(timeframe) * 1000
+        self.resolution_ms = self.timeframe_ms
+        self.max_window_ms = 1000 * self.timeframe_ms
+
+    @property
+    def job(self):
+        return f"{self.source}:{self.symbol}:{self.timeframe}"
+
+    # Una página de hasta 1000 velas desde since y el since de la siguiente
+    # (None si no quedan). Si el exchange ignora since y devuelve siempre las
+    # mismas velas (o solo velas anteriores) la página no avanza: se corta
+    # ahí en lugar de pedirla otra vez sin fin.
+    def fetch_page(self, since, end_ts):
+        candles = self.exchange.fetch_ohlcv(self.symbol, self.timeframe, since=since, limit=1000)
+        ticks = [
+            Tick(self.source, self.symbol, close, ts + self.timeframe_ms - 1)
+            for ts, _open, _high, _low, close, _volume in candles
+            if since <= ts < end_ts
+        ]
+        if not candles or candles[-1][0] < since:
+            return ticks, None
+        next_since = candles[-1][0] + self.timeframe_ms
+        return ticks, next_since if next_since > since else None
+
+
+# Dividir [start_ts, end_ts) en tramos de chunk_ms
+def split_range(start_ts, end_ts, chunk_ms):
+    return [(start, min(start + chunk_ms, end_ts)) for start in range(start_ts, end_ts, chunk_ms)]
+
+
+# Tramos sin un checkpoint que los cubra enteros. done son las filas
+# (chunk_start, chunk_end) de backfill_chunks_done: un tramo que empieza igual
+# pero se guardó más corto (otro --end u otro --chunk-days) sigue pendiente.
+def pending_chunks(chunks, done):
+    done = dict(done)
+    return [(start, end) for start, end in chunks if done.get(start, start) < end]
+
+
+async def _backfill_chunk(backend, history, budget, start_ts, end_ts, job):
+    ticks = []
+    since = start_ts
+    # Cada página es una petición y pasa por el presupuesto por separado
+    while since is not None and since < end_ts:
+        async with budget:
+            page, since = await asyncio.to_thread(history.fetch_page, since, end_ts)
+        ticks.extend(page)
+    # write_ticks hace upsert sobre (symbol_id, ts): repetir un tramo no duplica filas
+    if ticks:
+        await asyncio.to_thread(backend.write_ticks, ticks)
+    await asyncio.to_thread(backend.mark_backfill_chunk, job, start_ts, end_ts)
+    print(f"[{job}] {len(ticks)} ticks entre {start_ts} y {end_ts}")
+    return len(ticks)
+
+
+# Descargar en paralelo una lista de ventanas (history, start_ts, end_ts),
+# respetando el presupuesto del proveedor de cada una. Cada ventana completada
+# se registra como checkpoint bajo job_prefix + history.job.
+async def backfill_windows(backend, windows, budgets, job_prefix=""):
+    tasks = [
+        _backfill_chunk(backend, history, budgets[history.provider], start_ts, end_ts, job_prefix + history.job)
+        for history, start_ts, end_ts in windows
+    ]
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    for error in errors:
+        print(f"Error en el backfill: {error}")
+    total = sum(r for r in results if not isinstance(r, Exception))
+    print(f"Backfill terminado: {total} ticks, {len(errors)} tramos con error (se reintentan en la próxima ejecución)")
+    return total
+
+
+# Descargar los tramos pendientes de cada histórico. Los tramos ya completados
+# hasta su final (checkpoint) se saltan. Ningún tramo pasa de max_window_ms del
+# histórico: CoinGecko devuelve puntos horarios en vez de cada 5 minutos si se
+# le pide más de un día por llamada.
+async def run_backfill(backend, histories, start_ts, end_ts, chunk_ms, budgets):
+    windows = []
+    for history in histories:
+        history_chunk_ms = min(chunk_ms, history.max_window_ms)
+        done = await asyncio.to_thread(backend.backfill_chunks_done, history.job)
+        windows.extend(
+            (history, chunk_start, chunk_end)
+            for chunk_start, chunk_end in pending_chunks(split_range(start_ts, end_ts, history_chunk_ms), done)
+        )
+    return await backfill_windows(backend, windows, budgets)
+
+
+# La retención borra los ticks más antiguos que su regla de ticks, también los
+# del backfill: avisar si el rango pedido empieza antes
+def warn_retention(start_ts, rules=None):
+    keep_ms = (rules if rules is not None else parse_rules()).get("ticks")
+    if keep_ms is not None and start_ts < now_ms() - keep_ms:
+        print(f"Aviso: RETENTION_RULES guarda los ticks {keep_ms / DAY_MS:g} días; los anteriores se "
+              f"borrarán en la próxima pasada de la retención (las velas que no caduquen se conservan)")
+        return True
+    return False
+
+
+# Uso:
+#   python backfill.py --start 2024-01-01 --end 2024-06-01 --coingecko bitcoin,matic-network
+#   python backfill.py --start 2024-01-01 --exchange kraken --symbols BTC/USDT --timeframe 1m
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Carga de histórico de precios")
+    parser.add_argument("--start", required=True, help="fecha ISO o milisegundos desde epoch")
+    parser.add_argument("--end", help="por defecto, ahora")
+    parser.add_argument("--coingecko", default="", help="ids de CoinGecko separados por comas")
+    parser.add_argument("--vs-currency", default="usd")
+    parser.add_argument("--exchange", help="exchange de ccxt, p. ej. kraken")
+    parser.add_argument("--symbols", default="", help="pares del exchange separados por comas")
+    parser.add_argument("--timeframe", default="1m")
+    parser.add_argument("--chunk-days", type=float, default=30, help="como mucho; cada proveedor lo limita a su ventana máxima")
+    parser.add_argument("--coingecko-per-minute", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=2)
+    args = parser.parse_args()
+
+    start_ts = parse_time(args.start)
+    end_ts = parse_time(args.end) if args.end else int(datetime.now(timezone.utc).timestamp() * 1000)
+    warn_retention(start_ts)
+
+    histories = []
+    budgets = {"coingecko": RateBudget(args.coingecko_per_minute, args.concurrency)}
+    universe = load_universe()
+    client = coingecko_client()
+    for coin_id in filter(None, (c.strip() for c in args.coingecko.split(","))):
+        symbol = universe.get(coin_id, coin_id.upper())
+        histories.append(CoinGeckoHistory(coin_id, symbol, args.vs_currency, client))
+
+    if args.exchange:
+        exchange = ccxt_exchange(args.exchange)
+        # rateLimit de ccxt: milisegundos mínimos entre peticiones
+        budgets[exchange.id] = RateBudget(60000 / exchange.rateLimit, args.concurrency)
+        for symbol in filter(None, (s.strip() for s in args.symbols.split(","))):
+            histories.append(CcxtHistory(exchange, symbol, args.timeframe))
+
+    backend = get_backend()
+    backend.init_schema()
+    try:
+        asyncio.run(run_backfill(backend, histories, start_ts, end_ts, int(args.chunk_days * DAY_MS), budgets))
+    finally:
+        backend.close()
+
+
+if __name__ == "__main__":
+    main()
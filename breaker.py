@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+# Circuit breaker de un proveedor externo. Tras `failure_threshold` fallos
+# seguidos se abre y las llamadas fallan al instante sin tocar la red. Pasado
+# `reset_timeout` deja pasar una única llamada de prueba (half-open): si sale
+# bien se cierra; si falla vuelve a abrirse con el doble de espera (backoff
+# exponencial hasta max_reset_timeout).
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_timeout=30, max_reset_timeout=600):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_timeout = reset_timeout
+        self.max_timeout = max_reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.failures_total = 0
+        self.calls_total = 0
+        self.rejected_total = 0
+        self.reset_timeout = reset_timeout
+        self.opened_at = 0.0
+        self.last_value = None
+        self.last_success = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    # Segundos hasta la próxima llamada de prueba (0 si se puede llamar ya)
+    def retry_in(self):
+        with self._lock:
+            if self.state != OPEN:
+                return 0.0
+            return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    # ¿Puede hacerse una llamada ahora? En half-open solo pasa una a la vez.
+    def allow(self):
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == CLOSED or (self.state == HALF_OPEN and not self._probing):
+                self._probing = self.state == HALF_OPEN
+                self.calls_total += 1
+                return True
+            self.rejected_total += 1
+            return False
+
+    def success(self, value=None):
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.reset_timeout = self.base_timeout
+            self._probing = False
+            self.last_value = value
+            self.last_success = time.time()
+
+    def failure(self):
+        with self._lock:
+            self.failures_total += 1
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN:
+                # La prueba ha fallado: otra espera, el doble de larga
+                self.reset_timeout = min(self.max_timeout, self.reset_timeout * 2)
+                self._open()
+            elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._open()
+            self._probing = False
+
+    def _open(self):
+        if self.state != OPEN:
+            print(f"[{self.name}] Circuito abierto tras {self.consecutive_failures} fallos; próxima prueba en {self.reset_timeout:.0f}s")
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+
+    # Ejecutar fn a través del breaker. Con el circuito abierto lanza
+    # CircuitOpenError sin llamar a fn.
+    def call(self, fn, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} no disponible (circuito abierto)")
+        try:
+            value = fn(*args, **kwargs)
+        except Exception:
+            self.failure()
+            raise
+        self.success(value)
+        return value
+
+    # Como call(), pero si el proveedor falla o el circuito está abierto
+    # devuelve el último valor obtenido (o default si aún no hay ninguno)
+    def call_or_last(self, fn, *args, default=None, **kwargs):
+        try:
+            return self.call(fn, *args, **kwargs)
+        except Exception as e:
+            print(f"[{self.name}] Sirviendo el último valor conocido: {e}")
+            return self.last_value if self.last_value is not None else default
+
+
+# Un breaker por proveedor, creado en el primer uso con la configuración de
+# BREAKER_FAILURES, BREAKER_RESET_S y BREAKER_MAX_RESET_S
+class BreakerRegistry:
+    def __init__(self):
+        self.breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            breaker = self.breakers.get(name)
+            if breaker is None:
+                breaker = self.breakers[name] = CircuitBreaker(
+                    name,
+                    failure_threshold=int(os.getenv("BREAKER_FAILURES", 5)),
+                    reset_timeout=float(os.getenv("BREAKER_RESET_S", 30)),
+                    max_reset_timeout=float(os.getenv("BREAKER_MAX_RESET_S", 600)),
+                )
+            return breaker
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.breakers.values())
+
+
+breakers = BreakerRegistry()
@@ -0,0 +1,170 @@
+import os
+import json
+import threading
+from collections import deque
+
+from ingestion import Tick
+
+# Difusión en el proceso de los ticks guardados a los clientes de
+# /stream/prices (Server-Sent Events). Cada tick se serializa una sola vez al
+# publicarse y el mismo mensaje se reparte a todos los suscriptores.
+#
+# Cada suscriptor tiene un buffer acotado (STREAM_BUFFER mensajes): si un
+# cliente lento lo llena, se descartan sus mensajes más antiguos y se le avisa
+# de cuántos perdió, sin frenar la publicación ni al resto de clientes.
+STREAM_BUFFER = int(os.getenv("STREAM_BUFFER", 1000))
+# Cada suscriptor ocupa un hilo del servidor: el límite tiene que quedar por
+# debajo de sus hilos (gunicorn.conf.py lo ajusta a --threads)
+STREAM_MAX_SUBSCRIBERS = int(os.getenv("STREAM_MAX_SUBSCRIBERS", 80))
+
+
+# Aviso de mensajes perdidos (dropped = None si no se sabe cuántos)
+def lag_message(dropped=None):
+    return f"event: lag\ndata: {json.dumps({'dropped': dropped})}\n\n"
+
+
+# Mensaje SSE de un tick; con id (el de la tabla ticks) el navegador lo
+# reenvía como Last-Event-ID al reconectar
+def sse_message(tick, tick_id=None):
+    data = json.dumps({"source": tick.source, "symbol": tick.symbol, "price": tick.price, "ts": tick.ts})
+    prefix = f"id: {tick_id}\n" if tick_id is not None else ""
+    return f"{prefix}event: tick\ndata: {data}\n\n"
+
+
+class Subscription:
+    def __init__(self, symbols=None, maxlen=STREAM_BUFFER):
+        # Solo estos símbolos (None = todos)
+        self.symbols = set(symbols) if symbols else None
+        # Pares (id del tick, mensaje)
+        self.messages = deque(maxlen=maxlen)
+        self.dropped = 0
+        # Último id ya enviado al cliente al reanudar (replay_after): los
+        # mensajes en vivo hasta ese id se descartan
+        self.replayed_id = None
+        self._ready = threading.Condition()
+
+    def wants(self, symbol):
+        return self.symbols is None or symbol in self.symbols
+
+    def push(self, messages):
+        with self._ready:
+            for message in messages:
+                if len(self.messages) == self.messages.maxlen:
+                    self.dropped += 1
+                self.messages.append(message)
+            self._ready.notify()
+
+    # Mensajes pendientes y descartados desde la última llamada; espera como
+    # mucho `timeout` segundos si no hay ninguno
+    def drain(self, timeout=None):
+        with self._ready:
+            if not self.messages:
+                self._ready.wait(timeout)
+            messages = [
+                message for tick_id, message in self.messages
+                if tick_id is None or self.replayed_id is None or tick_id > self.replayed_id
+            ]
+            self.messages.clear()
+            dropped, self.dropped = self.dropped, 0
+        return messages, dropped
+
+
+class Broker:
+    def __init__(self, max_subscribers=STREAM_MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self.subscribers = set()
+        self.published = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    # Nueva suscripción, o None si ya hay max_subscribers
+    def subscribe(self, symbols=None, maxlen=STREAM_BUFFER):
+        subscription = Subscription(symbols, maxlen)
+        with self._lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscribers.discard(subscription)
+            self.dropped += subscription.dropped
+
+    # Publicar ticks, con sus ids si vienen de la tabla. No bloquea: cada
+    # suscriptor recibe los suyos en su buffer.
+    def publish(self, ticks, ids=None):
+        with self._lock:
+            subscribers = list(self.subscribers)
+        if not subscribers or not ticks:
+            return
+        ids = ids or [None] * len(ticks)
+        encoded = [(tick.symbol, (tick_id, sse_message(tick, tick_id))) for tick, tick_id in zip(ticks, ids)]
+        for subscription in subscribers:
+            messages = [message for symbol, message in encoded if subscription.wants(symbol)]
+            if messages:
+                subscription.push(messages)
+        self.published += len(encoded)
+
+
+# Broker del proceso: la ingesta embebida publica aquí cada lote guardado, y
+# los procesos web que no ingieren lo alimentan leyendo la tabla ticks
+tick_broker = Broker()
+
+
+# Mensajes de los ticks posteriores a after_id (el Last-Event-ID del cliente
+# que reconecta), como mucho limit, y si quedaron más fuera. La suscripción ya
+# existe y recibe en vivo: a partir de aquí descarta lo que llegue con un id
+# ya reenviado.
+def replay_after(backend, subscription, after_id, limit=STREAM_BUFFER):
+    rows = backend.ticks_after(after_id, limit + 1)
+    truncated = len(rows) > limit
+    rows = rows[:limit]
+    with subscription._ready:
+        subscription.replayed_id = rows[-1][0] if rows else after_id
+    messages = [
+        sse_message(Tick(source, name, price, ts), tick_id)
+        for tick_id, ts, source, name, price in rows
+        if subscription.wants(name)
+    ]
+    return messages, truncated
+
+
+# Publicar en el broker, con sus ids, los ticks de la tabla con id mayor que
+# after_id (por lotes de `limit`). Devuelve el último id publicado.
+def publish_ticks_after(backend, after_id, broker=tick_broker, limit=5000):
+    while True:
+        rows = backend.ticks_after(after_id, limit=limit)
+        if rows:
+            after_id = rows[-1][0]
+            broker.publish([Tick(source, name, price, ts) for _, ts, source, name, price in rows],
+                           [row[0] for row in rows])
+        if len(rows) < limit:
+            return after_id
+
+
+# Hilo que publica en el broker los ticks nuevos de la base de datos, para los
+# procesos web cuando la ingesta corre en otro proceso (worker.py). Lee por id
+# (clave primaria) desde el último visto, solo mientras hay suscriptores y
+# cuando paused() es falso (p. ej. si este proceso ya publica lo que ingiere).
+def start_tick_tailer(backend, broker=tick_broker, interval=None, paused=None, stop=None):
+    interval = interval if interval is not None else float(os.getenv("STREAM_POLL_INTERVAL", 1))
+    stop = stop or threading.Event()
+
+    def run():
+        last_id = None
+        while not stop.wait(interval):
+            if not broker.subscribers or (paused and paused()):
+                last_id = None
+                continue
+            try:
+                if last_id is None:
+                    last_id = backend.max_tick_id()
+                    continue
+                last_id = publish_ticks_after(backend, last_id, broker)
+            except Exception as e:
+                print(f"Error leyendo ticks nuevos para el stream: {e}")
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
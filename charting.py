@@ -0,0 +1,106 @@
+import os
+import re
+
+import numpy as np
+
+from ingestion import now_ms
+from rollups import RESOLUTIONS
+from retention import parse_rules
+from storage import parse_time
+
+# Series para los gráficos: para un rango [start, end) se elige la resolución
+# más fina (ticks en bruto o una de las velas de rollups.py) que no dé más de
+# OVERSAMPLE veces los puntos pedidos y cuya retención (RETENTION_RULES) aún
+# conserve el inicio del rango, y se reduce con Largest-Triangle-Three-
+# Buckets hasta `points`. Así un año se pinta con los mismos puntos que una
+# hora y la consulta nunca lee más de OVERSAMPLE * points filas por símbolo.
+CHART_POINTS = int(os.getenv("CHART_POINTS", 1000))
+MAX_CHART_POINTS = 10000
+# Segundos que el navegador puede reutilizar una respuesta de /api/chart
+CHART_API_MAX_AGE = int(os.getenv("CHART_API_MAX_AGE", 30))
+OVERSAMPLE = 4
+# Separación supuesta entre ticks en bruto (con WebSocket puede haber uno por segundo)
+RAW_TICK_MS = 1000
+DEFAULT_RANGE_MS = 24 * 60 * 60 * 1000
+
+DURATION_UNITS = {"m": 60 * 1000, "h": 60 * 60 * 1000, "d": 24 * 60 * 60 * 1000, "w": 7 * 24 * 60 * 60 * 1000, "y": 365 * 24 * 60 * 60 * 1000}
+
+
+# Rango [start_ts, end_ts) de los parámetros start/end. start también admite
+# una duración hacia atrás desde end ("90m", "24h", "7d", "1y"); por defecto,
+# las últimas 24 horas; una duración más larga que todo lo anterior a 1970
+# empieza en 0. Sin end, el rango acaba al final del minuto en curso: las
+# peticiones de ese minuto son idénticas y comparten caché y ETag.
+def parse_range(start=None, end=None):
+    end_ts = parse_time(end) if end else now_ms() // 60000 * 60000 + 60000
+    if not start:
+        start_ts = end_ts - DEFAULT_RANGE_MS
+    else:
+        match = re.fullmatch(r"(\d+)([mhdwy])", start.strip())
+        start_ts = max(0, end_ts - int(match.group(1)) * DURATION_UNITS[match.group(2)]) if match else parse_time(start)
+    if start_ts >= end_ts:
+        raise ValueError("El inicio del rango debe ser anterior al final")
+    return start_ts, end_ts
+
+
+# Resolución para un rango: None (ticks en bruto) o una clave de RESOLUTIONS.
+# Una tabla cuya retención ya ha purgado start_ts se salta aunque dé pocos
+# puntos: un rango de hace un mes con ticks de 7 días saldría casi vacío.
+def pick_resolution(start_ts, end_ts, points=CHART_POINTS, rules=None):
+    rules = parse_rules() if rules is None else rules
+    age_ms = now_ms() - start_ts
+
+    def kept(table):
+        return rules.get(table) is None or age_ms <= rules[table]
+
+    span = end_ts - start_ts
+    if span / RAW_TICK_MS <= OVERSAMPLE * points and kept("ticks"):
+        return None
+    for resolution, width in sorted(RESOLUTIONS.items(), key=lambda item: item[1]):
+        if span / width <= OVERSAMPLE * points and kept(f"ohlc_{resolution}"):
+            return resolution
+    return max(RESOLUTIONS, key=RESOLUTIONS.get)
+
+
+# Índices de los puntos que conserva LTTB (Steinarsson, 2013): el primero, el
+# último y, de cada uno de los threshold - 2 grupos intermedios, el que forma
+# el triángulo de mayor área con el punto elegido en el grupo anterior y la
+# media del grupo siguiente.
+def lttb(x, y, threshold):
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    # Relativo al primer ts para no perder precisión con epoch en ms
+    x = np.asarray(x, dtype=np.float64) - x[0]
+    y = np.asarray(y, dtype=np.float64)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+# Serie (ts, precios, resolución) de un símbolo en [start_ts, end_ts) con como
+# mucho `points` puntos. Con velas se usa el cierre de cada intervalo.
+def chart_series(backend, source, name, start_ts, end_ts, points=CHART_POINTS):
+    resolution = pick_resolution(start_ts, end_ts, points)
+    if resolution is None:
+        rows = backend.tick_series(source, name, start_ts, end_ts)
+    else:
+        rows = [(row[0], row[4]) for row in backend.candles(source, name, resolution, start_ts, end_ts)]
+    if not rows:
+        return [], [], resolution
+    ts = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+    prices = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+    keep = lttb(ts, prices, points)
+    return ts[keep].tolist(), prices[keep].tolist(), resolution
@@ -1,31 +1,318 @@
 import sqlite3
+from contextlib import contextmanager
 
-# Conectar a la base de datos (se crea si no existe)
-conn = sqlite3.connect("trading_bot.db")
-cursor = conn.cursor()
-
-# Crear tablas si no existen
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS prices (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    token1 TEXT NOT NULL,
-    token2 TEXT NOT NULL,
-    price1 REAL NOT NULL,
-    price2 REAL NOT NULL,
-    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS trades (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    side TEXT NOT NULL,
-    token1 TEXT NOT NULL,
-    token2 TEXT NOT NULL,
-    price1 REAL NOT NULL,
-    price2 REAL NOT NULL,
-    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-)
-""")
-
-conn.commit()
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos para el VACUUM inicial
+    fcntl = None
+
+from stats import create_stats_schema, rebuild_stats
+from rollups import RESOLUTIONS, create_rollup_schema, rebuild_rollups
+
+DB_NAME = "trading_bot.db"
+
+
+# Tablas originales
+def create_tables(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS prices (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        token1 TEXT NOT NULL,
+        token2 TEXT NOT NULL,
+        price1 REAL NOT NULL,
+        price2 REAL NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS trades (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        side TEXT NOT NULL,
+        token1 TEXT NOT NULL,
+        token2 TEXT NOT NULL,
+        price1 REAL NOT NULL,
+        price2 REAL NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+# Migración 1: ticks en formato largo (una fila por símbolo y instante) con un
+# diccionario de símbolos de enteros. Copia las filas anchas de prices.
+def migration_001_ticks(cursor):
+    cursor.execute("""
+    CREATE TABLE symbols (
+        id INTEGER PRIMARY KEY,
+        source TEXT NOT NULL,
+        name TEXT NOT NULL,
+        UNIQUE (source, name)
+    )
+    """)
+
+    cursor.execute("""
+    CREATE TABLE ticks (
+        id INTEGER PRIMARY KEY,
+        symbol_id INTEGER NOT NULL REFERENCES symbols (id),
+        ts TEXT NOT NULL,
+        price REAL NOT NULL,
+        UNIQUE (symbol_id, ts)
+    )
+    """)
+
+    # Las filas existentes vienen del sondeo de CoinGecko
+    cursor.execute("""
+    INSERT OR IGNORE INTO symbols (source, name)
+    SELECT 'coingecko', token1 FROM prices
+    UNION
+    SELECT 'coingecko', token2 FROM prices
+    """)
+
+    for token, price in (("token1", "price1"), ("token2", "price2")):
+        cursor.execute(f"""
+        INSERT OR IGNORE INTO ticks (symbol_id, ts, price)
+        SELECT s.id, p.timestamp, p.{price}
+        FROM prices p
+        JOIN symbols s ON s.source = 'coingecko' AND s.name = p.{token}
+        ORDER BY p.id
+        """)
+
+
+# Migración 2: ts como entero (milisegundos desde epoch, UTC) en lugar de texto,
+# con índices (symbol_id, ts) y (ts) para que los últimos N y los rangos por
+# símbolo sean búsquedas en índice y no recorridos completos con ordenación.
+def migration_002_epoch_ms(cursor):
+    cursor.execute("""
+    CREATE TABLE ticks_new (
+        id INTEGER PRIMARY KEY,
+        symbol_id INTEGER NOT NULL REFERENCES symbols (id),
+        ts INTEGER NOT NULL,
+        price REAL NOT NULL
+    )
+    """)
+
+    # Rellenar ts a partir del texto 'YYYY-MM-DD HH:MM:SS' (UTC)
+    cursor.execute("""
+    INSERT INTO ticks_new (id, symbol_id, ts, price)
+    SELECT id, symbol_id, CAST(strftime('%s', ts) AS INTEGER) * 1000, price
+    FROM ticks
+    """)
+
+    cursor.execute("DROP TABLE ticks")
+    cursor.execute("ALTER TABLE ticks_new RENAME TO ticks")
+    cursor.execute("CREATE UNIQUE INDEX idx_ticks_symbol_ts ON ticks (symbol_id, ts)")
+    cursor.execute("CREATE INDEX idx_ticks_ts ON ticks (ts)")
+
+
+# Migración 3: estadísticas por símbolo mantenidas por triggers (ver stats.py)
+def migration_003_tick_stats(cursor):
+    create_stats_schema(cursor)
+    rebuild_stats(cursor)
+
+
+# Migración 4: velas OHLC 1m/5m/1h/1d mantenidas por triggers (ver rollups.py)
+def migration_004_rollups(cursor):
+    create_rollup_schema(cursor)
+    rebuild_rollups(cursor)
+
+
+# Migración 5: índices por bucket_ts para purgar velas antiguas por lotes
+def migration_005_ohlc_retention_indexes(cursor):
+    for resolution in RESOLUTIONS:
+        cursor.execute(f"CREATE INDEX idx_ohlc_{resolution}_bucket ON ohlc_{resolution} (bucket_ts)")
+
+
+# Migración 6: checkpoints del backfill histórico (tramos ya descargados)
+def migration_006_backfill_checkpoints(cursor):
+    cursor.execute("""
+    CREATE TABLE backfill_checkpoints (
+        job TEXT NOT NULL,
+        chunk_start INTEGER NOT NULL,
+        chunk_end INTEGER NOT NULL,
+        done_ts INTEGER NOT NULL,
+        PRIMARY KEY (job, chunk_start)
+    )
+    """)
+
+
+# Leases para elegir un único proceso de ingesta entre varios workers
+def migration_007_leases(cursor):
+    cursor.execute("""
+    CREATE TABLE leases (
+        name TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires_ts INTEGER NOT NULL
+    )
+    """)
+
+
+# Velas OHLCV descargadas de los exchanges y cursor incremental por trabajo
+def migration_008_ohlcv(cursor):
+    cursor.execute("""
+    CREATE TABLE ohlcv (
+        symbol_id INTEGER NOT NULL REFERENCES symbols (id),
+        timeframe TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        open REAL NOT NULL,
+        high REAL NOT NULL,
+        low REAL NOT NULL,
+        close REAL NOT NULL,
+        volume REAL,
+        PRIMARY KEY (symbol_id, timeframe, ts)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute("""
+    CREATE TABLE ohlcv_cursors (
+        symbol_id INTEGER NOT NULL REFERENCES symbols (id),
+        timeframe TEXT NOT NULL,
+        since_ts INTEGER NOT NULL,
+        PRIMARY KEY (symbol_id, timeframe)
+    )
+    """)
+    cursor.execute("CREATE INDEX idx_ohlcv_ts ON ohlcv (ts)")
+
+
+# Fotos del libro de órdenes: resúmenes en columnas y niveles en blobs
+# columnares (ver storage.pack_levels)
+def migration_009_order_books(cursor):
+    cursor.execute("""
+    CREATE TABLE order_books (
+        id INTEGER PRIMARY KEY,
+        symbol_id INTEGER NOT NULL REFERENCES symbols (id),
+        ts INTEGER NOT NULL,
+        bid_levels INTEGER NOT NULL,
+        ask_levels INTEGER NOT NULL,
+        best_bid REAL,
+        best_ask REAL,
+        bid_volume REAL NOT NULL,
+        ask_volume REAL NOT NULL,
+        bids BLOB NOT NULL,
+        asks BLOB NOT NULL
+    )
+    """)
+    cursor.execute("CREATE UNIQUE INDEX idx_order_books_symbol_ts ON order_books (symbol_id, ts)")
+    cursor.execute("CREATE INDEX idx_order_books_ts ON order_books (ts)")
+
+
+# Índices (timestamp) de trades y logs para paginarlas por (timestamp, id) en
+# la API (el índice incluye el rowid) y purgarlas por fecha. logs la creaba
+# create_logs.py a mano: se crea aquí si falta.
+def migration_010_trades_logs_indexes(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        message TEXT NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    cursor.execute("CREATE INDEX idx_trades_timestamp ON trades (timestamp)")
+    cursor.execute("CREATE INDEX idx_logs_timestamp ON logs (timestamp)")
+
+
+# Migración 11: ticks.id con AUTOINCREMENT. Sin él SQLite reutiliza el id
+# máximo si la retención borra los ticks más nuevos (o todos), y los cursores
+# por id (/api/ticks/since, Last-Event-ID de /stream/prices) se saltarían los
+# ticks nuevos. Se reconstruye la tabla con sus índices y triggers.
+def migration_011_ticks_autoincrement(cursor):
+    cursor.execute("""
+    CREATE TABLE ticks_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        symbol_id INTEGER NOT NULL REFERENCES symbols (id),
+        ts INTEGER NOT NULL,
+        price REAL NOT NULL
+    )
+    """)
+    cursor.execute("INSERT INTO ticks_new (id, symbol_id, ts, price) SELECT id, symbol_id, ts, price FROM ticks")
+    cursor.execute("DROP TABLE ticks")
+    cursor.execute("ALTER TABLE ticks_new RENAME TO ticks")
+    cursor.execute("CREATE UNIQUE INDEX idx_ticks_symbol_ts ON ticks (symbol_id, ts)")
+    cursor.execute("CREATE INDEX idx_ticks_ts ON ticks (ts)")
+    create_stats_schema(cursor)
+    create_rollup_schema(cursor)
+
+
+# Migraciones en orden; PRAGMA user_version guarda cuántas se han aplicado
+MIGRATIONS = [
+    migration_001_ticks,
+    migration_002_epoch_ms,
+    migration_003_tick_stats,
+    migration_004_rollups,
+    migration_005_ohlc_retention_indexes,
+    migration_006_backfill_checkpoints,
+    migration_007_leases,
+    migration_008_ohlcv,
+    migration_009_order_books,
+    migration_010_trades_logs_indexes,
+    migration_011_ticks_autoincrement,
+]
+
+
+# Cada migración va en una transacción BEGIN IMMEDIATE (toma el bloqueo de
+# escritura al empezar) y relee user_version dentro de ella: si varios procesos
+# arrancan a la vez, solo uno aplica cada migración y los demás la saltan.
+def migrate(conn):
+    for number, migration in enumerate(MIGRATIONS, start=1):
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            if cursor.execute("PRAGMA user_version").fetchone()[0] >= number:
+                cursor.execute("COMMIT")
+                continue
+            migration(cursor)
+            cursor.execute(f"PRAGMA user_version = {number}")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+        print(f"Migración {number} aplicada: {migration.__name__}")
+
+
+# La retención libera páginas con PRAGMA incremental_vacuum, que solo funciona
+# con auto_vacuum = INCREMENTAL. En una base existente el cambio exige un VACUUM
+# completo, que se hace una sola vez.
+def enable_incremental_vacuum(conn):
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+
+
+# Bloqueo exclusivo entre procesos (fichero <ruta>.lock) durante init_db: el
+# VACUUM de enable_incremental_vacuum no puede ir dentro de una transacción,
+# así que el bloqueo de escritura de SQLite no basta para que corra una sola vez
+@contextmanager
+def init_lock(path):
+    if fcntl is None or path == ":memory:":
+        yield
+        return
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+# Crear las tablas si no existen y aplicar las migraciones pendientes
+def init_db(path=DB_NAME):
+    with init_lock(path):
+        # isolation_level=None: las migraciones controlan sus propias transacciones
+        conn = sqlite3.connect(path, isolation_level=None, timeout=60)
+        try:
+            enable_incremental_vacuum(conn)
+            create_tables(conn.cursor())
+            migrate(conn)
+        finally:
+            conn.close()
+
+
+# Uso: python create_db.py  -> crea o migra el esquema del backend de STORAGE_BACKEND
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from backends import get_backend
+
+    load_dotenv()
+    backend = get_backend()
+    try:
+        backend.init_schema()
+    finally:
+        backend.close()
@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+# Gestor de conexiones SQLite compartido por las rutas y la ingesta.
+# - Modo WAL: los lectores no bloquean al escritor ni el escritor a los lectores.
+# - Una conexión de lectura reutilizable por hilo (query_only).
+# - Un único escritor serializado con write_lock: el buffer de ingesta y la
+#   retención escriben por turnos en lugar de competir por el bloqueo de SQLite.
+class ConnectionManager:
+    def __init__(self, path, cache_mb=None, mmap_mb=None, busy_timeout_ms=5000):
+        self.path = path
+        self.cache_mb = cache_mb if cache_mb is not None else int(os.getenv("SQLITE_CACHE_MB", 64))
+        self.mmap_mb = mmap_mb if mmap_mb is not None else int(os.getenv("SQLITE_MMAP_MB", 256))
+        self.busy_timeout_ms = busy_timeout_ms
+        self.write_lock = threading.RLock()
+        self._local = threading.local()
+        self._writer = None
+
+    # Nueva conexión con los pragmas de rendimiento
+    def connect(self, readonly=False):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # Para acceder a columnas por nombre
+        conn.execute("PRAGMA journal_mode = WAL")
+        # En WAL, NORMAL es seguro ante caídas del proceso y evita un fsync por commit
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = -{self.cache_mb * 1024}")
+        conn.execute(f"PRAGMA mmap_size = {self.mmap_mb * 1024 * 1024}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        if readonly:
+            conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    # Conexión de lectura del hilo actual, reutilizada entre peticiones
+    def reader(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self.connect(readonly=True)
+        return conn
+
+    # Transacción de escritura serializada sobre la conexión del escritor
+    @contextmanager
+    def write(self):
+        with self.write_lock:
+            if self._writer is None:
+                self._writer = self.connect()
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    def close(self):
+        with self.write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
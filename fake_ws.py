@@ -0,0 +1,224 @@
+import json
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timezone
+
+import websockets
+
+from stream import KrakenStream, KRAKEN_WS_URL
+
+# Servidor WebSocket local que imita al de Kraken (API v2) reproduciendo
+# mensajes grabados, para probar la ingesta por WebSocket sin conexión:
+# reconexiones, huecos de secuencia, latencia y rendimiento.
+#
+# Una grabación es un fichero JSONL con {"t": segundos desde el inicio, "msg": mensaje}.
+#
+# Uso:
+#   python fake_ws.py record grabacion.jsonl --symbols BTC/USD --seconds 60
+#   python fake_ws.py generate grabacion.jsonl --symbols BTC/USD,ETH/USD --messages 10000 --rate 100
+#   python fake_ws.py serve grabacion.jsonl --port 8765 [--speed 1] [--loop] [--drop-every N --lose K]
+#   python fake_ws.py bench grabacion.jsonl [--speed 1]   -> mensajes/s (a toda velocidad) o latencia
+#                                                         (a velocidad real) del cliente contra el servidor local
+#
+# Con serve, la ingesta apunta al servidor con KRAKEN_WS_URL=ws://localhost:8765.
+
+
+def load_recording(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_recording(path, records):
+    with open(path, "w") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+# Grabar los mensajes reales de Kraken durante `seconds` segundos
+async def record(path, symbols, seconds, channels=("ticker", "trade")):
+    stream = KrakenStream(symbols, url=KRAKEN_WS_URL, channels=channels)
+    records = []
+    async with websockets.connect(stream.url) as ws:
+        for subscription in stream.subscriptions():
+            await ws.send(json.dumps(subscription))
+        start = time.monotonic()
+        while time.monotonic() - start < seconds:
+            try:
+                raw = await asyncio.wait_for(ws.recv(), seconds - (time.monotonic() - start))
+            except asyncio.TimeoutError:
+                break
+            records.append({"t": round(time.monotonic() - start, 6), "msg": json.loads(raw)})
+    save_recording(path, records)
+    print(f"{len(records)} mensajes grabados en {path}")
+
+
+# Generar una grabación sintética: paseo aleatorio de precios, alternando
+# mensajes de ticker y de trade (con trade_id consecutivos por símbolo)
+def generate(path, symbols, messages, rate):
+    prices = {symbol: 100.0 for symbol in symbols}
+    trade_ids = {symbol: 0 for symbol in symbols}
+    records = []
+    for i in range(messages):
+        symbol = symbols[i % len(symbols)]
+        prices[symbol] *= 1 + random.gauss(0, 0.0005)
+        price = round(prices[symbol], 4)
+        if i % 2:
+            trade_ids[symbol] += 1
+            timestamp = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+            msg = {"channel": "trade", "type": "update", "data": [{
+                "symbol": symbol, "side": random.choice(["buy", "sell"]), "price": price,
+                "qty": round(random.uniform(0.01, 2), 4), "ord_type": "market",
+                "trade_id": trade_ids[symbol], "timestamp": timestamp,
+            }]}
+        else:
+            msg = {"channel": "ticker", "type": "update", "data": [{
+                "symbol": symbol, "bid": price - 0.01, "ask": price + 0.01, "last": price,
+                "volume": round(random.uniform(100, 1000), 2),
+            }]}
+        records.append({"t": round(i / rate, 6), "msg": msg})
+    save_recording(path, records)
+    print(f"{messages} mensajes generados en {path}")
+
+
+# Estado compartido entre conexiones: la reproducción continúa donde se quedó
+# la conexión anterior
+class Replay:
+    def __init__(self, records, speed=1.0, loop=False, drop_every=0, lose=0):
+        self.records = records
+        self.speed = speed
+        self.loop = loop
+        self.drop_every = drop_every
+        self.lose = lose
+        self.position = 0
+        self.sent = []
+
+    # Confirmar una suscripción
+    async def _acknowledge(self, ws, raw):
+        msg = json.loads(raw)
+        if msg.get("method") == "subscribe":
+            await ws.send(json.dumps({
+                "method": "subscribe", "success": True, "req_id": msg.get("req_id"), "result": msg.get("params"),
+            }))
+
+    async def _acknowledge_all(self, ws):
+        async for raw in ws:
+            await self._acknowledge(ws, raw)
+
+    async def handler(self, ws):
+        # Esperar la primera suscripción antes de empezar a reproducir
+        await self._acknowledge(ws, await ws.recv())
+        acks = asyncio.create_task(self._acknowledge_all(ws))
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        offset = self.records[self.position]["t"] if self.position < len(self.records) else 0
+        sent_here = 0
+        try:
+            while True:
+                if self.position >= len(self.records):
+                    if not self.loop:
+                        await ws.wait_closed()
+                        return
+                    self.position = 0
+                    start = loop.time()
+                    offset = 0
+                record = self.records[self.position]
+                if self.speed:
+                    delay = (record["t"] - offset) / self.speed - (loop.time() - start)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                self.sent.append(time.perf_counter())
+                await ws.send(json.dumps(record["msg"]))
+                self.position += 1
+                sent_here += 1
+                # Simular un corte: cerrar la conexión y perder `lose` mensajes
+                if self.drop_every and sent_here % self.drop_every == 0:
+                    self.position += self.lose
+                    await ws.close()
+                    return
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            acks.cancel()
+
+
+async def serve(replay, host="localhost", port=8765):
+    async with websockets.serve(replay.handler, host, port):
+        print(f"Servidor WebSocket de prueba en ws://{host}:{port}")
+        await asyncio.Future()
+
+
+# Reproducir la grabación contra un KrakenStream en el mismo proceso y medir
+# la latencia (envío -> ticks entregados) y los mensajes por segundo
+async def bench(records, speed=0.0, port=0):
+    replay = Replay(records, speed=speed)
+    received = []
+    ticks = 0
+    expected = sum(1 for r in records if r["msg"].get("channel") in ("ticker", "trade") and r["msg"].get("data"))
+    done = asyncio.Event()
+
+    async def emit(batch):
+        nonlocal ticks
+        received.append(time.perf_counter())
+        ticks += len(batch)
+        if len(received) >= expected:
+            done.set()
+
+    async with websockets.serve(replay.handler, "localhost", port) as server:
+        port = server.sockets[0].getsockname()[1]
+        symbols = sorted({d["symbol"] for r in records for d in r["msg"].get("data") or []})
+        stream = KrakenStream(symbols, url=f"ws://localhost:{port}")
+        task = asyncio.create_task(stream.run(emit))
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(done.wait(), timeout=max(30.0, len(records) / 100))
+        except asyncio.TimeoutError:
+            print(f"Timeout: {len(received)} de {expected} mensajes recibidos")
+        elapsed = time.perf_counter() - started
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    latencies = sorted((r - s) * 1000 for s, r in zip(replay.sent, received))
+    if latencies:
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"{len(received)} mensajes, {ticks} ticks en {elapsed:.2f}s: "
+              f"{len(received) / elapsed:.0f} mensajes/s, latencia p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+    print(f"Reconexiones: {stream.reconnects}, huecos de secuencia: {stream.sequence_gaps}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor WebSocket de prueba con mensajes de Kraken grabados")
+    parser.add_argument("command", choices=["record", "generate", "serve", "bench"])
+    parser.add_argument("path", help="fichero JSONL de la grabación")
+    parser.add_argument("--symbols", default="BTC/USD")
+    parser.add_argument("--seconds", type=float, default=60)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--rate", type=float, default=100, help="mensajes por segundo al generar")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--speed", type=float, help="1 = tiempo real (por defecto en serve), 0 = lo más rápido posible (por defecto en bench)")
+    parser.add_argument("--loop", action="store_true")
+    parser.add_argument("--drop-every", type=int, default=0, help="cerrar la conexión cada N mensajes")
+    parser.add_argument("--lose", type=int, default=0, help="mensajes perdidos en cada corte")
+    args = parser.parse_args()
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()]
+
+    if args.command == "record":
+        asyncio.run(record(args.path, symbols, args.seconds))
+    elif args.command == "generate":
+        generate(args.path, symbols, args.messages, args.rate)
+    elif args.command == "serve":
+        speed = args.speed if args.speed is not None else 1.0
+        replay = Replay(load_recording(args.path), speed, args.loop, args.drop_every, args.lose)
+        try:
+            asyncio.run(serve(replay, args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+    else:
+        asyncio.run(bench(load_recording(args.path), speed=args.speed or 0.0))
+
+
+if __name__ == "__main__":
+    main()
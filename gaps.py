@@ -0,0 +1,121 @@
+import os
+import asyncio
+import threading
+
+from dotenv import load_dotenv
+import ccxt
+
+from backfill import RateBudget, CoinGeckoHistory, CcxtHistory, split_range, pending_chunks, backfill_windows
+from http_client import coingecko_client, ccxt_exchange
+from ingestion import parse_provider_spec, now_ms
+from universe import load_universe
+
+# Detección de huecos en la serie de ticks y relleno dirigido solo de esas
+# ventanas. Un hueco es un salto entre dos ticks consecutivos de un símbolo
+# mayor que `tolerance` veces la cadencia de sondeo de su fuente (o que dos
+# veces la resolución del histórico: si el proveedor no tiene puntos más finos
+# no tiene sentido pedirlos). Las ventanas rellenadas quedan registradas como
+# checkpoints "gap:<job>", así un hueco que el proveedor no puede cubrir (p. ej.
+# un par que no cotizaba) no se vuelve a pedir en cada pasada.
+JOB_PREFIX = "gap:"
+
+
+class GapHealer:
+    def __init__(self, backend, tolerance=3, coingecko_per_minute=10, vs_currency=None):
+        self.backend = backend
+        self.tolerance = tolerance
+        self.cadence_ms = {name: int(seconds * 1000) for name, seconds in parse_provider_spec().items()}
+        self.vs_currency = vs_currency or os.getenv("COINGECKO_VS_CURRENCY", "usd")
+        # Símbolo -> id de CoinGecko
+        self.coingecko_ids = {symbol: coin_id for coin_id, symbol in load_universe().items()}
+        self.coingecko = coingecko_client()
+        # Peticiones por minuto de cada proveedor
+        self.rates = {"coingecko": coingecko_per_minute}
+        self.exchanges = {}
+
+    def _exchange(self, exchange_id):
+        if exchange_id not in self.exchanges:
+            exchange = ccxt_exchange(exchange_id)
+            self.exchanges[exchange_id] = exchange
+            # rateLimit de ccxt: milisegundos mínimos entre peticiones
+            self.rates[exchange.id] = 60000 / exchange.rateLimit
+        return self.exchanges[exchange_id]
+
+    # Histórico con el que rellenar un símbolo, o None si no se sabe de dónde pedirlo
+    def history_for(self, source, name):
+        if source == "coingecko":
+            coin_id = self.coingecko_ids.get(name)
+            if coin_id is None:
+                return None
+            return CoinGeckoHistory(coin_id, name, self.vs_currency, self.coingecko)
+        if not hasattr(ccxt, source):
+            return None
+        return CcxtHistory(self._exchange(source), name, "1m")
+
+    # Ventanas (history, start_ts, end_ts) pendientes de rellenar en [start_ts, end_ts)
+    def find_windows(self, start_ts, end_ts):
+        windows = []
+        for source, name in self.backend.list_symbols():
+            history = self.history_for(source, name)
+            if history is None:
+                continue
+            cadence = self.cadence_ms.get(source, 60 * 1000)
+            min_gap = max(cadence * self.tolerance, 2 * history.resolution_ms)
+            gaps = self.backend.find_gaps(source, name, min_gap, start_ts, end_ts)
+            if not gaps:
+                continue
+            done = self.backend.backfill_chunks_done(JOB_PREFIX + history.job)
+            for prev_ts, ts in gaps:
+                windows.extend(
+                    (history, window_start, window_end)
+                    for window_start, window_end in pending_chunks(split_range(prev_ts + 1, ts, history.max_window_ms), done)
+                )
+        return windows
+
+    # Buscar y rellenar los huecos de las últimas lookback_ms
+    async def heal(self, lookback_ms):
+        end_ts = now_ms()
+        windows = await asyncio.to_thread(self.find_windows, end_ts - lookback_ms, end_ts)
+        if not windows:
+            return 0
+        print(f"Rellenando {len(windows)} ventanas con huecos")
+        # Presupuestos nuevos en cada pasada: sus semáforos pertenecen al bucle de asyncio.run
+        budgets = {provider: RateBudget(rate) for provider, rate in self.rates.items()}
+        return await backfill_windows(self.backend, windows, budgets, job_prefix=JOB_PREFIX)
+
+
+# Hilo que busca y rellena huecos periódicamente (tras caídas, reinicios o
+# despliegues) hasta que se activa el evento stop
+def start_gap_healer_thread(backend, interval=None, lookback_hours=None, stop=None):
+    interval = interval if interval is not None else float(os.getenv("GAP_CHECK_INTERVAL", 900))
+    lookback_hours = lookback_hours if lookback_hours is not None else float(os.getenv("GAP_LOOKBACK_HOURS", 24))
+    lookback_ms = int(lookback_hours * 60 * 60 * 1000)
+    stop = stop or threading.Event()
+
+    def run():
+        healer = GapHealer(backend)
+        while not stop.is_set():
+            try:
+                asyncio.run(healer.heal(lookback_ms))
+            except Exception as e:
+                print(f"Error rellenando huecos: {e}")
+            stop.wait(interval)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+# Uso: python gaps.py [horas]  -> busca y rellena huecos una vez
+if __name__ == "__main__":
+    import sys
+    from backends import get_backend
+
+    load_dotenv()
+    hours = float(sys.argv[1]) if len(sys.argv) > 1 else float(os.getenv("GAP_LOOKBACK_HOURS", 24))
+    backend = get_backend()
+    backend.init_schema()
+    try:
+        asyncio.run(GapHealer(backend).heal(int(hours * 60 * 60 * 1000)))
+    finally:
+        backend.close()
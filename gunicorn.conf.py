@@ -0,0 +1,35 @@
+import os
+
+from dotenv import load_dotenv
+
+# Configuración que gunicorn carga automáticamente desde el directorio de
+# trabajo. Las migraciones se aplican una sola vez en el proceso maestro, antes
+# de crear los workers, que solo leen.
+
+load_dotenv()
+
+# Cada cliente de /stream/prices ocupa un hilo del worker mientras está
+# conectado: los hilos se reparten entre el streaming y el resto de rutas
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", 100))
+
+# Hilos de cada worker que nunca ocupa el streaming
+STREAM_RESERVED_THREADS = int(os.getenv("STREAM_RESERVED_THREADS", 20))
+
+
+def on_starting(server):
+    from backends import get_backend
+
+    # STREAM_MAX_SUBSCRIBERS por debajo de los hilos del worker (--threads
+    # puede cambiarlos); los workers lo heredan del entorno del maestro
+    limit = max(1, server.cfg.threads - STREAM_RESERVED_THREADS)
+    configured = int(os.getenv("STREAM_MAX_SUBSCRIBERS", limit))
+    if configured > limit:
+        print(f"STREAM_MAX_SUBSCRIBERS={configured} no deja hilos libres con --threads {server.cfg.threads}; se usa {limit}")
+    os.environ["STREAM_MAX_SUBSCRIBERS"] = str(min(configured, limit))
+
+    backend = get_backend()
+    try:
+        backend.init_schema()
+    finally:
+        backend.close()
@@ -0,0 +1,179 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.retry import Retry
+from pycoingecko import CoinGeckoAPI
+import ccxt
+
+from ratelimit import limits, hosts_of
+
+# Capa HTTP común para todas las llamadas a servicios externos (CoinGecko,
+# exchanges de ccxt, Alchemy/web3, CryptoPanic): una sola sesión con
+# conexiones keep-alive reutilizadas por host, timeouts de conexión y lectura
+# por defecto y reintentos con backoff exponencial con jitter limitados por un
+# presupuesto global, para que una caída del proveedor no multiplique el tráfico.
+
+
+# Presupuesto de reintentos: cada petición aporta `ratio` reintentos (más
+# `per_second` por segundo, para no quedarse sin ninguno con poco tráfico) y
+# cada reintento gasta uno. Con ratio=0.2 como mucho una de cada cinco
+# peticiones se reintenta.
+class RetryBudget:
+    def __init__(self, ratio=0.2, per_second=1.0, capacity=20):
+        self.ratio = ratio
+        self.per_second = per_second
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = None
+        self._lock = threading.Lock()
+
+    def _refill(self, amount):
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+    def deposit(self):
+        with self._lock:
+            self._refill(self.ratio)
+
+    def withdraw(self, now):
+        with self._lock:
+            if self._updated is not None:
+                self._refill((now - self._updated) * self.per_second)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+# Retry de urllib3 con jitter en el backoff y sujeto al presupuesto de reintentos.
+# Un Retry-After de un 503 se respeta como mucho max_retry_after segundos:
+# urllib3 duerme lo que diga el servidor, y un valor de horas bloquearía el hilo.
+class BudgetedRetry(Retry):
+    budget = None
+    jitter = 0.5
+    max_retry_after = 10
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.budget = self.budget
+        retry.jitter = self.jitter
+        retry.max_retry_after = self.max_retry_after
+        return retry
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        return min(retry_after, self.max_retry_after) if retry_after is not None else None
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return backoff + random.uniform(0, self.jitter) if backoff else 0
+
+    # Los 429 no se reintentan aquí (urllib3 lo haría si traen Retry-After):
+    # los gestiona el cubo de tokens del proveedor
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        if self.budget is not None and not self.budget.withdraw(time.monotonic()):
+            raise MaxRetryError(_pool, url, error or "presupuesto de reintentos agotado")
+        return retry
+
+
+# Sesión con timeout (conexión, lectura) por defecto en todas las peticiones.
+# Las peticiones a hosts de un proveedor registrado pasan por su cubo de tokens,
+# que además aprende de los 429 y de Retry-After.
+class UpstreamSession(requests.Session):
+    def __init__(self, timeout, budget):
+        super().__init__()
+        self.timeout = timeout
+        self.budget = budget
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        self.budget.deposit()
+        bucket = limits.for_url(url)
+        if bucket is not None:
+            bucket.acquire()
+        response = super().request(method, url, **kwargs)
+        if bucket is not None:
+            bucket.record(response.status_code, response.headers.get("Retry-After"))
+        return response
+
+
+def build_session(connect_timeout=None, read_timeout=None, retries=None, pool_hosts=None, pool_per_host=None):
+    connect_timeout = connect_timeout if connect_timeout is not None else float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05))
+    read_timeout = read_timeout if read_timeout is not None else float(os.getenv("HTTP_READ_TIMEOUT", 10))
+    retries = retries if retries is not None else int(os.getenv("HTTP_RETRIES", 3))
+    # Número de hosts distintos con pool propio y conexiones keep-alive por host
+    pool_hosts = pool_hosts if pool_hosts is not None else int(os.getenv("HTTP_POOL_HOSTS", 10))
+    pool_per_host = pool_per_host if pool_per_host is not None else int(os.getenv("HTTP_POOL_PER_HOST", 10))
+
+    budget = RetryBudget(ratio=float(os.getenv("HTTP_RETRY_BUDGET", 0.2)))
+    retry = BudgetedRetry(
+        total=retries,
+        # Un socket colgado ya ha consumido un timeout de lectura entero: como
+        # mucho se reintenta una vez
+        read=1,
+        backoff_factor=0.5,
+        status_forcelist=[500, 502, 503, 504],
+        # Solo métodos idempotentes (por defecto GET, HEAD, PUT, DELETE, OPTIONS, TRACE)
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    retry.budget = budget
+    retry.max_retry_after = float(os.getenv("HTTP_MAX_RETRY_AFTER", 10))
+    # pool_block: con pool_per_host conexiones en uso, la siguiente petición
+    # espera una libre en vez de abrir otra que se cierra al terminar
+    adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_per_host, max_retries=retry, pool_block=True)
+
+    session = UpstreamSession((connect_timeout, read_timeout), budget)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+# Sesión compartida por todo el proceso (se crea en el primer uso)
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = build_session()
+        return _session
+
+
+# Cliente de CoinGecko sobre la sesión compartida. Con COINGECKO_API_KEY usa
+# la API de pago y con COINGECKO_DEMO_API_KEY la pública con clave demo; la
+# clave viaja como parámetro en cada URL.
+def coingecko_client():
+    client = CoinGeckoAPI(
+        api_key=os.getenv("COINGECKO_API_KEY", ""),
+        demo_api_key=os.getenv("COINGECKO_DEMO_API_KEY", ""),
+    )
+    client.session = get_session()
+    client.request_timeout = client.session.timeout
+    limits.register("coingecko", hosts_of(client.api_base_url))
+    return client
+
+
+# Exchange de ccxt sobre la sesión compartida. ccxt pasa su propio timeout
+# (en milisegundos) en cada petición.
+def ccxt_exchange(exchange_id, **config):
+    session = get_session()
+    params = {"enableRateLimit": True, "session": session, "timeout": int(session.timeout[1] * 1000)}
+    params.update(config)
+    exchange = getattr(ccxt, exchange_id)(params)
+    # Sin límite propio en RATE_LIMITS, el del exchange (rateLimit: ms entre peticiones)
+    limits.register(exchange.id, hosts_of(exchange.urls.get("api")), default_per_minute=60000 / exchange.rateLimit)
+    return exchange
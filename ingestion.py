@@ -0,0 +1,267 @@
+import os
+import time
+import asyncio
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from http_client import coingecko_client, ccxt_exchange
+from ratelimit import limits
+from breaker import breakers
+from universe import load_universe, chunk_ids
+
+# Un tick es una observación de precio de un proveedor
+# ts está en milisegundos desde epoch (UTC)
+Tick = namedtuple("Tick", ["source", "symbol", "price", "ts"])
+
+# Foto del libro de órdenes: bids y asks son listas [[precio, cantidad], ...]
+# ordenadas desde el mejor nivel
+OrderBook = namedtuple("OrderBook", ["source", "symbol", "ts", "bids", "asks"])
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+# Últimos precios conocidos por símbolo. El motor de ingesta los actualiza en
+# cada sondeo, de modo que las rutas leen de aquí en lugar de llamar a la API.
+class LatestPrices:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ticks = {}
+
+    def update(self, ticks):
+        with self._lock:
+            for tick in ticks:
+                current = self._ticks.get(tick.symbol)
+                if current is None or tick.ts >= current.ts:
+                    self._ticks[tick.symbol] = tick
+
+    def get(self, symbol):
+        with self._lock:
+            return self._ticks.get(symbol)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._ticks)
+
+
+latest_prices = LatestPrices()
+
+
+# Proveedor de precios de CoinGecko para todo el universo configurado, en el
+# menor número de llamadas a get_price que permite la longitud de la URL
+class CoinGeckoProvider:
+    def __init__(self, interval=60, timeout=20, client=None, universe=None, vs_currency="usd"):
+        self.name = "coingecko"
+        self.interval = interval
+        self.timeout = timeout
+        self.client = client or coingecko_client()
+        self.vs_currency = vs_currency
+        # Mapa id de CoinGecko -> símbolo
+        self.ids = universe or load_universe()
+        self.chunks = chunk_ids(
+            list(self.ids),
+            vs_currencies=vs_currency,
+            base_url=self.client.api_base_url,
+            extra_params=self.client.extra_params,
+        )
+
+    # Peticiones HTTP de cada sondeo (una por tramo de ids)
+    @property
+    def requests_per_fetch(self):
+        return len(self.chunks)
+
+    def fetch(self):
+        ticks = []
+        for chunk in self.chunks:
+            prices = self.client.get_price(ids=",".join(chunk), vs_currencies=self.vs_currency)
+            ts = now_ms()
+            ticks.extend(
+                Tick(self.name, self.ids[coin_id], prices[coin_id][self.vs_currency], ts)
+                for coin_id in chunk
+                if self.vs_currency in prices.get(coin_id, {})
+            )
+        return ticks
+
+
+# Tickers de varios símbolos de un exchange: una sola llamada a fetch_tickers
+# si el exchange la admite, o una fetch_ticker por símbolo si no. Los símbolos
+# que el exchange no lista se ignoran (los mercados se cargan una vez).
+def fetch_exchange_ticks(exchange, symbols):
+    exchange.load_markets()
+    symbols = [symbol for symbol in symbols if symbol in exchange.markets]
+    if not symbols:
+        return []
+    if exchange.has.get("fetchTickers"):
+        tickers = exchange.fetch_tickers(symbols)
+    else:
+        tickers = {symbol: exchange.fetch_ticker(symbol) for symbol in symbols}
+    ts = now_ms()
+    return [
+        Tick(exchange.id, symbol, tickers[symbol]["last"], tickers[symbol].get("timestamp") or ts)
+        for symbol in symbols
+        if symbol in tickers and tickers[symbol].get("last") is not None
+    ]
+
+
+# Proveedor de tickers de un exchange de ccxt (kraken, binance, ...)
+class CcxtProvider:
+    def __init__(self, exchange_id="kraken", symbols=None, interval=60, timeout=20):
+        self.name = exchange_id
+        self.interval = interval
+        self.timeout = timeout
+        self.exchange = ccxt_exchange(exchange_id)
+        self.symbols = symbols or ["MATIC/USDT", "USDC/USDT"]
+
+    @property
+    def requests_per_fetch(self):
+        return 1 if self.exchange.has.get("fetchTickers") else len(self.symbols)
+
+    def fetch(self):
+        return fetch_exchange_ticks(self.exchange, self.symbols)
+
+
+# Proveedores e intervalos (segundos) de INGEST_PROVIDERS, p. ej. "coingecko:60,kraken:30"
+def parse_provider_spec(spec=None):
+    spec = spec or os.getenv("INGEST_PROVIDERS", "coingecko:60,kraken:60")
+    intervals = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, interval = item.partition(":")
+        intervals[name] = float(interval) if interval else 60
+    return intervals
+
+
+# Construir los proveedores a partir de INGEST_PROVIDERS
+def build_providers(spec=None):
+    ccxt_symbols = [s.strip() for s in os.getenv("CCXT_SYMBOLS", "MATIC/USDT,USDC/USDT").split(",") if s.strip()]
+    providers = []
+    for name, interval in parse_provider_spec(spec).items():
+        if name == "coingecko":
+            providers.append(CoinGeckoProvider(interval=interval, vs_currency=os.getenv("COINGECKO_VS_CURRENCY", "usd")))
+        else:
+            providers.append(CcxtProvider(name, symbols=ccxt_symbols, interval=interval))
+    return providers
+
+
+# Motor de ingesta: cada proveedor se sondea en su propia tarea con su propia
+# cadencia y publica sus ticks en una cola compartida. Un consumidor único
+# actualiza la caché de últimos precios y entrega los lotes al sink, de modo
+# que un proveedor lento no bloquea al resto. El intervalo de cada proveedor
+# es el mínimo deseado: se alarga si su cubo de tokens no da para tantas
+# peticiones o si el proveedor ha respondido 429 con Retry-After. Un proveedor
+# caído abre su circuit breaker y no se vuelve a sondear hasta la siguiente
+# prueba (backoff exponencial). Los streams (WebSocket, ver stream.py)
+# publican en la misma cola según llegan los mensajes.
+# Cada proveedor tiene su propio hilo para fetch() y el sink otro: un fetch
+# colgado (el timeout deja de esperarlo pero el hilo sigue) solo bloquea a su
+# proveedor, que no vuelve a sondear hasta que ese fetch termine.
+class IngestionEngine:
+    def __init__(self, providers, sink, queue_size=1000, latest=latest_prices, limiter=limits, breakers=breakers, streams=()):
+        self.providers = providers
+        self.streams = list(streams)
+        self.sink = sink
+        self.latest = latest
+        self.limiter = limiter
+        self.breakers = breakers
+        self.intervals = {}
+        self.queue_size = queue_size
+        self.queue = None
+        self._stop = None
+        self._loop = None
+
+    # Intervalo hasta el próximo sondeo según el presupuesto del proveedor
+    def _interval(self, provider):
+        interval = provider.interval
+        bucket = self.limiter.get(provider.name)
+        if bucket is not None:
+            interval = max(interval, bucket.interval_for(provider.requests_per_fetch))
+        previous = self.intervals.get(provider.name, provider.interval)
+        if abs(interval - previous) > 0.1 * previous:
+            print(f"[{provider.name}] Intervalo de sondeo ajustado a {interval:.1f}s")
+        self.intervals[provider.name] = interval
+        return interval
+
+    async def _poll(self, provider, executor):
+        loop = asyncio.get_running_loop()
+        breaker = self.breakers.get(provider.name)
+        pending = None
+        while not self._stop.is_set():
+            started = loop.time()
+            if pending is not None and not pending.done():
+                print(f"[{provider.name}] El fetch anterior sigue en curso: se omite este sondeo")
+            elif breaker.allow():
+                # Las librerías de los proveedores son bloqueantes: se ejecutan en el
+                # hilo del proveedor y se limitan con un timeout para que una llamada
+                # colgada no detenga el bucle de eventos. shield: al vencer el timeout
+                # se deja de esperar pero el fetch sigue marcado como pendiente.
+                pending = loop.run_in_executor(executor, provider.fetch)
+                # Recoger la excepción de un fetch abandonado para que no se avise al recolectarlo
+                pending.add_done_callback(lambda future: future.cancelled() or future.exception())
+                try:
+                    ticks = await asyncio.wait_for(asyncio.shield(pending), provider.timeout)
+                except asyncio.TimeoutError:
+                    breaker.failure()
+                    print(f"[{provider.name}] Timeout tras {provider.timeout}s")
+                except Exception as e:
+                    breaker.failure()
+                    print(f"[{provider.name}] Error fetching prices: {e}")
+                else:
+                    breaker.success()
+                    if ticks:
+                        await self.queue.put(ticks)
+
+            interval = max(self._interval(provider), breaker.retry_in())
+            delay = max(0.0, interval - (loop.time() - started))
+            try:
+                await asyncio.wait_for(self._stop.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _consume(self, executor):
+        loop = asyncio.get_running_loop()
+        while True:
+            ticks = await self.queue.get()
+            self.latest.update(ticks)
+            try:
+                await loop.run_in_executor(executor, self.sink, ticks)
+            except Exception as e:
+                print(f"Error storing prices: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self._stop = asyncio.Event()
+        executors = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"fetch-{p.name}") for p in self.providers]
+        sink_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sink")
+        consumer = asyncio.create_task(self._consume(sink_executor))
+        pollers = [asyncio.create_task(self._poll(p, executor)) for p, executor in zip(self.providers, executors)]
+        streams = [asyncio.create_task(s.run(self.queue.put)) for s in self.streams]
+        try:
+            await self._stop.wait()
+            await asyncio.gather(*pollers)
+            for task in streams:
+                task.cancel()
+            await asyncio.gather(*streams, return_exceptions=True)
+            # Vaciar lo que quede en la cola antes de salir
+            await self.queue.join()
+        finally:
+            consumer.cancel()
+            # Sin esperar a los fetch colgados: sus hilos acaban cuando vuelva la llamada
+            for executor in executors + [sink_executor]:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+
+    # Ejecutar el motor en un hilo de fondo con su propio bucle de eventos
+    def start_in_thread(self):
+        thread = threading.Thread(target=lambda: asyncio.run(self.run()), daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,85 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from breaker import breakers, CLOSED, HALF_OPEN, OPEN
+from ratelimit import limits
+from stream import active_streams
+from broker import tick_broker
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# Métricas del proceso en formato de texto de Prometheus: estado de los
+# circuit breakers, ritmo de los cubos de tokens de cada proveedor y
+# contadores de los WebSockets y de los clientes de /stream/prices
+def render_metrics():
+    lines = [
+        "# HELP upstream_breaker_state Estado del circuit breaker (0 cerrado, 1 half-open, 2 abierto)",
+        "# TYPE upstream_breaker_state gauge",
+    ]
+    snapshot = breakers.snapshot()
+    for breaker in snapshot:
+        lines.append(f'upstream_breaker_state{{provider="{breaker.name}"}} {STATE_VALUES[breaker.state]}')
+    for metric, attr, kind, description in (
+        ("upstream_breaker_consecutive_failures", "consecutive_failures", "gauge", "Fallos seguidos"),
+        ("upstream_breaker_failures_total", "failures_total", "counter", "Llamadas fallidas"),
+        ("upstream_breaker_calls_total", "calls_total", "counter", "Llamadas permitidas por el breaker"),
+        ("upstream_breaker_rejected_total", "rejected_total", "counter", "Llamadas rechazadas con el circuito abierto"),
+    ):
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for breaker in snapshot:
+            lines.append(f'{metric}{{provider="{breaker.name}"}} {getattr(breaker, attr)}')
+
+    lines.append("# HELP upstream_rate_per_minute Ritmo actual del cubo de tokens")
+    lines.append("# TYPE upstream_rate_per_minute gauge")
+    for name, bucket in limits.buckets.items():
+        lines.append(f'upstream_rate_per_minute{{provider="{name}"}} {bucket.rate * 60:.3f}')
+    lines.append("# HELP upstream_throttled_total Respuestas 429 recibidas")
+    lines.append("# TYPE upstream_throttled_total counter")
+    for name, bucket in limits.buckets.items():
+        lines.append(f'upstream_throttled_total{{provider="{name}"}} {bucket.throttled}')
+
+    for metric, attr, description in (
+        ("upstream_stream_messages_total", "messages", "Mensajes recibidos por WebSocket"),
+        ("upstream_stream_reconnects_total", "reconnects", "Reconexiones del WebSocket"),
+        ("upstream_stream_sequence_gaps_total", "sequence_gaps", "Huecos en la secuencia de trades"),
+    ):
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} counter")
+        for stream in active_streams:
+            lines.append(f'{metric}{{provider="{stream.name}"}} {getattr(stream, attr)}')
+
+    for metric, value, kind, description in (
+        ("sse_subscribers", len(tick_broker.subscribers), "gauge", "Clientes conectados a /stream/prices"),
+        ("sse_published_total", tick_broker.published, "counter", "Ticks publicados en el broker"),
+        ("sse_dropped_total", tick_broker.dropped, "counter", "Mensajes descartados a clientes lentos (desconectados)"),
+    ):
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+# Servidor /metrics para procesos sin Flask (worker.py)
+def start_metrics_server(port, host="0.0.0.0"):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,98 @@
+import os
+import threading
+
+from breaker import breakers
+from http_client import ccxt_exchange
+from ingestion import now_ms
+
+# Descarga incremental de velas OHLCV de los exchanges (fetch_ohlcv) a la tabla
+# ohlcv. Cada (exchange, símbolo, timeframe) guarda un cursor con la apertura
+# de su última vela: cada sondeo pide solo desde ahí (la última vela se vuelve
+# a pedir porque pudo guardarse aún abierta) y las velas repetidas se
+# sobrescriben, así que cada sondeo es una petición pequeña por símbolo.
+MAX_BARS = 1000
+
+
+class OhlcvJob:
+    def __init__(self, exchange, symbol, timeframe="1m", initial_bars=500):
+        self.exchange = exchange
+        self.source = exchange.id
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.timeframe_ms = exchange.parse_timeframe(timeframe) * 1000
+        # Velas hacia atrás en la primera descarga, sin cursor todavía
+        self.initial_bars = initial_bars
+        self.next_due = 0
+        self.listed = True
+
+    def poll(self, backend):
+        # load_markets solo va a la red la primera vez (ccxt guarda los mercados)
+        self.exchange.load_markets()
+        if self.symbol not in self.exchange.markets:
+            if self.listed:
+                print(f"[{self.source}] {self.symbol} no cotiza: se omiten sus velas")
+            self.listed = False
+            return 0
+        self.listed = True
+        now = now_ms()
+        since = backend.ohlcv_cursor(self.source, self.symbol, self.timeframe)
+        if since is None:
+            since = now - now % self.timeframe_ms - self.initial_bars * self.timeframe_ms
+        limit = min(MAX_BARS, (now - since) // self.timeframe_ms + 1)
+        bars = self.exchange.fetch_ohlcv(self.symbol, self.timeframe, since=since, limit=limit)
+        bars = [bar for bar in bars if bar[0] >= since]
+        if bars:
+            backend.write_ohlcv(self.source, self.symbol, self.timeframe, bars)
+        return len(bars)
+
+
+# Trabajos de OHLCV_EXCHANGES x CCXT_SYMBOLS x OHLCV_TIMEFRAMES
+def build_ohlcv_jobs():
+    exchange_ids = [e.strip() for e in os.getenv("OHLCV_EXCHANGES", "kraken").split(",") if e.strip()]
+    symbols = [s.strip() for s in os.getenv("CCXT_SYMBOLS", "MATIC/USDT,USDC/USDT").split(",") if s.strip()]
+    timeframes = [t.strip() for t in os.getenv("OHLCV_TIMEFRAMES", "1m").split(",") if t.strip()]
+    jobs = []
+    for exchange_id in exchange_ids:
+        exchange = ccxt_exchange(exchange_id)
+        if not exchange.has.get("fetchOHLCV"):
+            print(f"[{exchange_id}] No ofrece fetch_ohlcv: se omiten sus velas")
+            continue
+        jobs.extend(OhlcvJob(exchange, symbol, timeframe) for symbol in symbols for timeframe in timeframes)
+    return jobs
+
+
+# Hilo que sondea cada trabajo una vez por vela (como mucho cada max_interval
+# segundos para timeframes largos, para ir cerrando la vela en curso), hasta
+# que se activa el evento stop. Usa un circuit breaker por exchange propio de
+# las velas ("<exchange>:ohlcv"); con el circuito abierto el trabajo se
+# aplaza a su siguiente turno.
+def start_ohlcv_thread(backend, jobs=None, stop=None, max_interval=None):
+    jobs = build_ohlcv_jobs() if jobs is None else jobs
+    stop = stop or threading.Event()
+    max_interval = max_interval if max_interval is not None else float(os.getenv("OHLCV_MAX_INTERVAL", 300))
+
+    def run():
+        while not stop.is_set():
+            now = now_ms()
+            for job in jobs:
+                if job.next_due > now:
+                    continue
+                job.next_due = now + min(job.timeframe_ms, max_interval * 1000)
+                breaker = breakers.get(f"{job.source}:ohlcv")
+                if not breaker.allow():
+                    continue
+                try:
+                    count = job.poll(backend)
+                except Exception as e:
+                    breaker.failure()
+                    print(f"[{job.source}] Error descargando velas {job.symbol} {job.timeframe}: {e}")
+                else:
+                    breaker.success()
+                    if count:
+                        print(f"[{job.source}] {count} velas {job.symbol} {job.timeframe}")
+            due = min((job.next_due for job in jobs), default=now + 60000)
+            stop.wait(max(1.0, (due - now_ms()) / 1000))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,70 @@
+import os
+import threading
+
+import ccxt
+
+from breaker import breakers
+from http_client import ccxt_exchange
+from ingestion import OrderBook, now_ms
+
+# Captura periódica del libro de órdenes (fetch_order_book) de ORDERBOOK_SYMBOLS
+# en ORDERBOOK_EXCHANGES hasta ORDERBOOK_DEPTH niveles por lado. Cada ronda se
+# guarda en una sola transacción.
+
+
+# Libros de los símbolos que cotizan en el exchange. Un símbolo rechazado
+# (BadSymbol) se salta sin perder los demás ni contar como fallo del exchange.
+def fetch_books(exchange, symbols, depth):
+    exchange.load_markets()
+    books = []
+    for symbol in symbols:
+        if symbol not in exchange.markets:
+            continue
+        try:
+            book = exchange.fetch_order_book(symbol, limit=depth)
+        except ccxt.BadSymbol as e:
+            print(f"[{exchange.id}] {symbol} sin libro de órdenes: {e}")
+            continue
+        books.append(OrderBook(
+            exchange.id, symbol, book.get("timestamp") or now_ms(),
+            [level[:2] for level in book["bids"][:depth]],
+            [level[:2] for level in book["asks"][:depth]],
+        ))
+    return books
+
+
+# Hilo de captura hasta que se activa el evento stop. Cada exchange tiene su
+# propio circuit breaker para el libro de órdenes, separado del de la ingesta
+# de tickers: los fallos de uno no cortan el otro.
+def start_order_book_thread(backend, stop=None, interval=None, depth=None):
+    exchange_ids = [e.strip() for e in os.getenv("ORDERBOOK_EXCHANGES", "kraken").split(",") if e.strip()]
+    symbols = [s.strip() for s in os.getenv("ORDERBOOK_SYMBOLS", os.getenv("CCXT_SYMBOLS", "MATIC/USDT,USDC/USDT")).split(",") if s.strip()]
+    interval = interval if interval is not None else float(os.getenv("ORDERBOOK_INTERVAL", 10))
+    depth = depth if depth is not None else int(os.getenv("ORDERBOOK_DEPTH", 20))
+    stop = stop or threading.Event()
+
+    def run():
+        exchanges = [ccxt_exchange(exchange_id) for exchange_id in exchange_ids]
+        while not stop.is_set():
+            books = []
+            for exchange in exchanges:
+                breaker = breakers.get(f"{exchange.id}:orderbook")
+                if not breaker.allow():
+                    continue
+                try:
+                    books.extend(fetch_books(exchange, symbols, depth))
+                except Exception as e:
+                    breaker.failure()
+                    print(f"[{exchange.id}] Error capturando el libro de órdenes: {e}")
+                else:
+                    breaker.success()
+            if books:
+                try:
+                    backend.write_order_books(books)
+                except Exception as e:
+                    print(f"Error guardando el libro de órdenes: {e}")
+            stop.wait(interval)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
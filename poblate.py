@@ -1,49 +1,48 @@
-import ccxt
-import psycopg2
 import os
+import asyncio
 from dotenv import load_dotenv
+from http_client import ccxt_exchange
+from backends import get_backend
+from ingestion import fetch_exchange_ticks
 
 # Cargar variables de entorno desde el archivo .env
 load_dotenv()
 
-# Configuración de PostgreSQL
-def get_db_connection():
-    return psycopg2.connect(
-        host=os.getenv('DB_HOST'),
-        database=os.getenv('DB_NAME'),
-        user=os.getenv('DB_USER'),
-        password=os.getenv('DB_PASSWORD'),
-        port=os.getenv('DB_PORT', 5432)
-    )
-
-# Crear instancia de ccxt para Binance
-exchange = ccxt.kraken()
-
+# Backend de almacenamiento: PostgreSQL (pool de conexiones y COPY) salvo que
+# STORAGE_BACKEND indique otro
+backend = get_backend(os.getenv('STORAGE_BACKEND', 'postgres'))
+backend.init_schema()
 
-# Función para obtener precios
-def get_prices():
-    try:
-        # Obtener el precio de MATIC/USDT y USDC/USDT desde Binance
-        matic_price = exchange.fetch_ticker('MATIC/USDT')['last']
-        usdc_price = exchange.fetch_ticker('USDC/USDT')['last']
+# Exchanges de ccxt y símbolos a consultar en cada uno (con rate limit propio por exchange)
+exchange_ids = [e.strip() for e in os.getenv('POBLATE_EXCHANGES', 'kraken').split(',') if e.strip()]
+symbols = [s.strip() for s in os.getenv('CCXT_SYMBOLS', 'MATIC/USDT,USDC/USDT').split(',') if s.strip()]
+exchanges = [ccxt_exchange(exchange_id) for exchange_id in exchange_ids]
 
-        # Conectar a la base de datos
-        conn = get_db_connection()
-        cursor = conn.cursor()
 
-        # Insertar precios en la base de datos
-        cursor.execute("""
-            INSERT INTO prices (token1, token2, price1, price2)
-            VALUES (%s, %s, %s, %s)
-        """, ('MATIC', 'USDC', matic_price, usdc_price))
-        conn.commit()
-
-        print(f"Datos insertados: MATIC={matic_price}, USDC={usdc_price}")
-        cursor.close()
-        conn.close()
+# Función para obtener precios: todos los exchanges a la vez, cada uno con una
+# sola llamada a fetch_tickers si la admite
+async def get_prices():
+    results = await asyncio.gather(
+        *(asyncio.to_thread(fetch_exchange_ticks, exchange, symbols) for exchange in exchanges),
+        return_exceptions=True,
+    )
+    ticks = []
+    for exchange, result in zip(exchanges, results):
+        if isinstance(result, Exception):
+            print(f"Error al obtener precios de {exchange.id}: {result}")
+        else:
+            ticks.extend(result)
+    return ticks
 
-    except Exception as e:
-        print(f"Error al obtener o insertar datos: {e}")
 
 # Llamar a la función para poblar la base de datos
-get_prices()
+try:
+    ticks = asyncio.run(get_prices())
+    # Todos los ticks en un solo lote (una transacción)
+    if ticks:
+        backend.write_ticks(ticks)
+    print(f"Datos insertados: {len(ticks)} ticks de {len(exchanges)} exchanges")
+except Exception as e:
+    print(f"Error al obtener o insertar datos: {e}")
+finally:
+    backend.close()
@@ -0,0 +1,126 @@
+import os
+import time
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+# Límites por defecto en peticiones por minuto. Los exchanges de ccxt sin
+# entrada en RATE_LIMITS usan su propio rateLimit.
+DEFAULT_LIMITS = "coingecko:10"
+
+
+# Cubo de tokens de un proveedor. Las peticiones reservan un token y esperan
+# si no lo hay. El ritmo se adapta al proveedor (AIMD): cada 429 lo reduce a la
+# mitad y pausa el cubo lo que indique Retry-After; cada respuesta correcta lo
+# vuelve a subir poco a poco hasta el máximo configurado.
+class TokenBucket:
+    def __init__(self, per_minute, burst=None, min_fraction=1 / 16):
+        self.max_rate = per_minute / 60.0
+        self.min_rate = self.max_rate * min_fraction
+        self.rate = self.max_rate
+        # Por defecto se permite una ráfaga de 10 segundos de peticiones
+        self.capacity = burst or max(1.0, self.max_rate * 10)
+        self.tokens = self.capacity
+        self.paused_until = 0.0
+        self.throttled = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    # Reservar un token; devuelve los segundos que hay que esperar para usarlo
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            return max(wait, self.paused_until - now)
+
+    def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    # Ajustar el ritmo según la respuesta del proveedor
+    def record(self, status, retry_after=None):
+        with self._lock:
+            now = time.monotonic()
+            if status == 429:
+                self.throttled += 1
+                self.rate = max(self.min_rate, self.rate / 2)
+                pause = parse_retry_after(retry_after)
+                self.paused_until = max(self.paused_until, now + (pause if pause is not None else 1 / self.rate))
+                self.tokens = min(self.tokens, 0.0)
+            elif status < 400:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    # Intervalo mínimo entre sondeos de un trabajo que hace `requests` peticiones
+    # por sondeo, sin superar el ritmo actual ni la pausa de un 429
+    def interval_for(self, requests):
+        with self._lock:
+            return max(requests / self.rate, self.paused_until - time.monotonic())
+
+
+# Segundos de un Retry-After (número de segundos o fecha HTTP), o None
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+# Hosts de una URL o de la estructura de URLs de un exchange de ccxt
+def hosts_of(urls):
+    if isinstance(urls, str):
+        host = urlparse(urls).hostname
+        return {host} if host else set()
+    values = urls.values() if isinstance(urls, dict) else urls or []
+    hosts = set()
+    for value in values:
+        hosts |= hosts_of(value)
+    return hosts
+
+
+# Registro central de cubos por proveedor, compartido por la ingesta, el
+# backfill y el relleno de huecos del proceso. La sesión HTTP común localiza el
+# cubo por el host de cada petición.
+class RateLimiter:
+    def __init__(self, spec=None):
+        spec = spec if spec is not None else os.getenv("RATE_LIMITS", DEFAULT_LIMITS)
+        self.limits = {}
+        for item in spec.split(","):
+            name, _, per_minute = item.strip().partition(":")
+            if name and per_minute:
+                self.limits[name] = float(per_minute)
+        self.buckets = {}
+        self.hosts = {}
+        self._lock = threading.Lock()
+
+    # Registrar (una sola vez) el cubo de un proveedor y los hosts que usa
+    def register(self, provider, hosts, default_per_minute=60):
+        with self._lock:
+            bucket = self.buckets.get(provider)
+            if bucket is None:
+                bucket = self.buckets[provider] = TokenBucket(self.limits.get(provider, default_per_minute))
+            for host in hosts:
+                self.hosts[host] = bucket
+            return bucket
+
+    def get(self, provider):
+        return self.buckets.get(provider)
+
+    def for_url(self, url):
+        return self.hosts.get(urlparse(url).hostname)
+
+
+limits = RateLimiter()
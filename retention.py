@@ -0,0 +1,147 @@
+import os
+import sys
+import time
+import contextlib
+import threading
+
+from storage import format_ts
+from rollups import RESOLUTIONS
+from stats import remove_from_stats, refresh_stats_bounds
+
+# Reglas por defecto: ticks en bruto 7 días, velas de 1m 90 días, de 5m un año;
+# las velas de 1h y 1d se guardan para siempre. Las velas no se recalculan al
+# purgar ticks: siguen reflejando toda la historia capturada. tick_stats, en
+# cambio, describe los ticks guardados: cada lote purgado se descuenta (igual
+# que daría rebuild_stats sobre los que quedan).
+# La regla de ticks también borra los cargados con backfill.py (avisa al
+# pedir un rango más antiguo): para conservarlos, "ticks:forever" o las velas.
+# Los checkpoints del backfill se borran 90 días después de completarse (por
+# done_ts): repetir un backfill más antiguo vuelve a descargar esos tramos.
+DEFAULT_RULES = "ticks:7d,prices:7d,ohlc_1m:90d,ohlc_5m:365d,logs:30d,order_books:30d,backfill_checkpoints:90d"
+
+UNITS_MS = {"m": 60 * 1000, "h": 60 * 60 * 1000, "d": 24 * 60 * 60 * 1000}
+
+# Tabla -> (columna de tiempo, clave para borrar por lotes, ts en milisegundos)
+TABLES = {
+    "ticks": ("ts", "id", True),
+    "prices": ("timestamp", "id", False),
+    "trades": ("timestamp", "id", False),
+    "logs": ("timestamp", "id", False),
+}
+TABLES["order_books"] = ("ts", "id", True)
+TABLES["ohlcv"] = ("ts", "symbol_id, timeframe, ts", True)
+TABLES["backfill_checkpoints"] = ("done_ts", "job, chunk_start", True)
+for _resolution in RESOLUTIONS:
+    TABLES[f"ohlc_{_resolution}"] = ("bucket_ts", "symbol_id, bucket_ts", True)
+
+
+# Reglas "tabla:duración" separadas por comas, p. ej. "ticks:7d,ohlc_1m:90d";
+# "forever" (o no mencionar la tabla) significa no borrar nunca
+def parse_rules(spec=None):
+    spec = spec if spec is not None else os.getenv("RETENTION_RULES", DEFAULT_RULES)
+    rules = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        table, _, keep = item.partition(":")
+        if table not in TABLES:
+            raise ValueError(f"Tabla sin política de retención: {table}")
+        if keep == "forever":
+            continue
+        rules[table] = int(keep[:-1]) * UNITS_MS[keep[-1]]
+    return rules
+
+
+def _delete_batch(conn, table, cutoff, batch_size, lock, touched):
+    column, key, _ = TABLES[table]
+    with lock, conn:
+        if table == "ticks":
+            # Los ticks borrados se descuentan de tick_stats en la misma transacción
+            removed = conn.execute("""
+                DELETE FROM ticks
+                WHERE id IN (SELECT id FROM ticks WHERE ts < ? LIMIT ?)
+                RETURNING symbol_id, price
+            """, (cutoff, batch_size)).fetchall()
+            remove_from_stats(conn.cursor(), removed)
+            touched.update(symbol_id for symbol_id, _ in removed)
+            return len(removed)
+        cursor = conn.execute(f"""
+            DELETE FROM {table}
+            WHERE ({key}) IN (SELECT {key} FROM {table} WHERE {column} < ? LIMIT ?)
+        """, (cutoff, batch_size))
+    return cursor.rowcount
+
+
+# Aplicar las reglas una vez. Cada lote es una transacción corta seguida de una
+# pausa, para que el escritor de la ingesta nunca espere mucho por el bloqueo.
+# lock es el bloqueo de escritura compartido (ConnectionManager.write_lock).
+def apply_retention(conn, rules=None, batch_size=5000, pause=0.05, vacuum_pages=1000, lock=None):
+    rules = parse_rules() if rules is None else rules
+    lock = lock or contextlib.nullcontext()
+    now = int(time.time() * 1000)
+    deleted = {}
+    for table, keep_ms in rules.items():
+        exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        if not exists:
+            continue
+        cutoff = now - keep_ms
+        if not TABLES[table][2]:
+            cutoff = format_ts(cutoff)
+
+        deleted[table] = 0
+        touched = set()
+        while True:
+            count = _delete_batch(conn, table, cutoff, batch_size, lock, touched)
+            deleted[table] += count
+            if count < batch_size:
+                break
+            time.sleep(pause)
+        # min/max de tick_stats solo se pueden recalcular: una vez por símbolo
+        # al acabar (entre lotes pueden quedar holgados, como tras un upsert)
+        for symbol_id in touched:
+            with lock, conn:
+                refresh_stats_bounds(conn.cursor(), [symbol_id])
+
+    # Devolver al sistema las páginas libres, también por lotes
+    # (requiere auto_vacuum = INCREMENTAL, que activa init_db)
+    incremental = conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    if incremental and any(deleted.values()):
+        while conn.execute("PRAGMA freelist_count").fetchone()[0] > 0:
+            # executescript ejecuta el pragma hasta el final; con execute()
+            # solo se liberaría una página por llamada
+            with lock:
+                conn.executescript(f"PRAGMA incremental_vacuum({vacuum_pages})")
+            time.sleep(pause)
+    return deleted
+
+
+# Hilo que aplica la retención periódicamente con backend.apply_retention
+# (SQLite o PostgreSQL). Termina al activarse el evento stop.
+def start_retention_thread(backend, interval=3600, rules=None, stop=None):
+    rules = parse_rules() if rules is None else rules
+    stop = stop or threading.Event()
+
+    def run():
+        while not stop.is_set():
+            try:
+                deleted = backend.apply_retention(rules)
+                if any(deleted.values()):
+                    print(f"Retención aplicada: {deleted}")
+            except Exception as e:
+                print(f"Error aplicando la retención: {e}")
+            stop.wait(interval)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+# Uso: python retention.py [ruta.db]  -> aplica las reglas una vez (sin ruta,
+# en el backend de STORAGE_BACKEND)
+if __name__ == "__main__":
+    from backends import SQLiteBackend, get_backend
+
+    backend = SQLiteBackend(sys.argv[1]) if len(sys.argv) > 1 else get_backend()
+    print(backend.apply_retention())
+    backend.close()
@@ -0,0 +1,137 @@
+import sys
+import sqlite3
+
+# Velas OHLC por símbolo a varias resoluciones (tabla ohlc_<resolución>).
+# Igual que tick_stats, se mantienen con triggers sobre ticks: cada tick
+# actualiza la vela de su intervalo en todas las resoluciones dentro de la
+# misma transacción del escritor. open_ts/close_ts permiten aceptar ticks
+# tardíos: un tick anterior al open actual pasa a ser el open, y uno posterior
+# al close, el close.
+RESOLUTIONS = {
+    "1m": 60 * 1000,
+    "5m": 5 * 60 * 1000,
+    "1h": 60 * 60 * 1000,
+    "1d": 24 * 60 * 60 * 1000,
+}
+
+
+def _table(resolution):
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Resolución desconocida: {resolution}")
+    return f"ohlc_{resolution}"
+
+
+def create_rollup_schema(cursor):
+    for resolution, width in RESOLUTIONS.items():
+        table = _table(resolution)
+        cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            symbol_id INTEGER NOT NULL REFERENCES symbols (id),
+            bucket_ts INTEGER NOT NULL,
+            open REAL NOT NULL,
+            high REAL NOT NULL,
+            low REAL NOT NULL,
+            close REAL NOT NULL,
+            open_ts INTEGER NOT NULL,
+            close_ts INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (symbol_id, bucket_ts)
+        ) WITHOUT ROWID
+        """)
+
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ticks_{table}_insert AFTER INSERT ON ticks
+        BEGIN
+            INSERT INTO {table} (symbol_id, bucket_ts, open, high, low, close, open_ts, close_ts, count)
+            VALUES (NEW.symbol_id, NEW.ts - NEW.ts % {width},
+                    NEW.price, NEW.price, NEW.price, NEW.price, NEW.ts, NEW.ts, 1)
+            ON CONFLICT (symbol_id, bucket_ts) DO UPDATE SET
+                open = CASE WHEN NEW.ts < open_ts THEN NEW.price ELSE open END,
+                open_ts = MIN(open_ts, NEW.ts),
+                close = CASE WHEN NEW.ts >= close_ts THEN NEW.price ELSE close END,
+                close_ts = MAX(close_ts, NEW.ts),
+                high = MAX(high, NEW.price),
+                low = MIN(low, NEW.price),
+                count = count + 1;
+        END
+        """)
+
+        # Corrección del precio de un tick ya guardado
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ticks_{table}_update AFTER UPDATE OF price ON ticks
+        BEGIN
+            UPDATE {table} SET
+                open = CASE WHEN open_ts = NEW.ts THEN NEW.price ELSE open END,
+                close = CASE WHEN close_ts = NEW.ts THEN NEW.price ELSE close END,
+                high = MAX(high, NEW.price),
+                low = MIN(low, NEW.price)
+            WHERE symbol_id = NEW.symbol_id AND bucket_ts = NEW.ts - NEW.ts % {width};
+        END
+        """)
+
+
+# Reconstruir las velas desde los ticks en bruto, en [start_ts, end_ts).
+# Por defecto desde el primer intervalo de 1d que empieza en o después del
+# primer tick guardado: el día en que cae ese tick puede haber perdido parte de
+# sus ticks con la retención, así que sus velas (y las anteriores) no se tocan.
+def rebuild_rollups(cursor, start_ts=None, end_ts=None, resolutions=None):
+    if start_ts is None:
+        first_ts = cursor.execute("SELECT MIN(ts) FROM ticks").fetchone()[0]
+        if first_ts is None:
+            return
+        width = max(RESOLUTIONS.values())
+        start_ts = first_ts + (-first_ts) % width
+    if end_ts is None:
+        end_ts = cursor.execute("SELECT MAX(ts) FROM ticks").fetchone()[0] + 1
+    if start_ts >= end_ts:
+        return
+
+    for resolution in resolutions or RESOLUTIONS:
+        table = _table(resolution)
+        width = RESOLUTIONS[resolution]
+        # Extender el rango a intervalos completos
+        bucket_start = start_ts - start_ts % width
+        bucket_end = end_ts - end_ts % width + (width if end_ts % width else 0)
+
+        cursor.execute(f"DELETE FROM {table} WHERE bucket_ts >= ? AND bucket_ts < ?", (bucket_start, bucket_end))
+        cursor.execute(f"""
+            INSERT INTO {table} (symbol_id, bucket_ts, open, high, low, close, open_ts, close_ts, count)
+            SELECT b.symbol_id, b.bucket_ts, o.price, b.high, b.low, c.price, b.open_ts, b.close_ts, b.count
+            FROM (
+                SELECT symbol_id, ts - ts % {width} AS bucket_ts,
+                       MIN(ts) AS open_ts, MAX(ts) AS close_ts,
+                       MAX(price) AS high, MIN(price) AS low, COUNT(*) AS count
+                FROM ticks
+                WHERE ts >= ? AND ts < ?
+                GROUP BY symbol_id, bucket_ts
+            ) b
+            JOIN ticks o ON o.symbol_id = b.symbol_id AND o.ts = b.open_ts
+            JOIN ticks c ON c.symbol_id = b.symbol_id AND c.ts = b.close_ts
+        """, (bucket_start, bucket_end))
+
+
+# Velas de un símbolo en [start_ts, end_ts) en orden cronológico
+def candles(conn, source, name, resolution, start_ts, end_ts):
+    return conn.execute(f"""
+        SELECT bucket_ts, open, high, low, close, count
+        FROM {_table(resolution)}
+        WHERE symbol_id = (SELECT id FROM symbols WHERE source = ? AND name = ?)
+          AND bucket_ts >= ? AND bucket_ts < ?
+        ORDER BY bucket_ts
+    """, (source, name, start_ts, end_ts)).fetchall()
+
+
+# Uso: python rollups.py [ruta.db] [start_ts] [end_ts]  -> reconstruye las velas
+if __name__ == "__main__":
+    from create_db import DB_NAME
+
+    args = sys.argv[1:]
+    conn = sqlite3.connect(args[0] if args else DB_NAME)
+    start = int(args[1]) if len(args) > 1 else None
+    end = int(args[2]) if len(args) > 2 else None
+    with conn:
+        rebuild_rollups(conn.cursor(), start, end)
+    for resolution in RESOLUTIONS:
+        count = conn.execute(f"SELECT COUNT(*) FROM {_table(resolution)}").fetchone()[0]
+        print(f"{_table(resolution)}: {count} velas")
+    conn.close()
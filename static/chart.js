@@ -0,0 +1,85 @@
+// Página de gráficos: el HTML, este script y Plotly se sirven estáticos y el
+// navegador los cachea; cada vista solo pide los datos a /api/chart con los
+// mismos parámetros que la URL (symbol, source, start, end, points).
+(function () {
+    const form = document.getElementById("chart-form");
+    const status = document.getElementById("chart-status");
+
+    function fillForm(params) {
+        for (const input of form.elements) {
+            if (input.name) {
+                input.value = params.get(input.name) || "";
+            }
+        }
+    }
+
+    let live = null;
+
+    // Con el rango abierto (sin end) se añaden los ticks nuevos de
+    // /stream/prices a las series ya pintadas
+    function follow(params, data) {
+        if (live) {
+            live.close();
+            live = null;
+        }
+        if (params.get("end")) {
+            return;
+        }
+        const traces = new Map(data.series.map((serie, index) => [serie.symbol, index]));
+        const query = new URLSearchParams();
+        query.set("symbol", data.series.map((serie) => serie.symbol).join(","));
+        live = new EventSource("/stream/prices?" + query.toString());
+        live.addEventListener("tick", (event) => {
+            const tick = JSON.parse(event.data);
+            if (tick.source === data.source && traces.has(tick.symbol)) {
+                Plotly.extendTraces("chart", { x: [[new Date(tick.ts)]], y: [[tick.price]] }, [traces.get(tick.symbol)]);
+            }
+        });
+    }
+
+    async function load() {
+        const params = new URLSearchParams(window.location.search);
+        fillForm(params);
+        status.textContent = "Cargando...";
+        try {
+            const response = await fetch("/api/chart?" + params.toString());
+            const data = await response.json();
+            if (!response.ok) {
+                throw new Error(data.error || response.statusText);
+            }
+            // Datos en columnas: ts (ms desde epoch) y price por símbolo
+            const traces = data.series.map((serie) => ({
+                x: serie.ts.map((ts) => new Date(ts)),
+                y: serie.price,
+                mode: "lines",
+                name: "Precio " + serie.symbol,
+            }));
+            const layout = {
+                title: "Gráfico de Precios (" + data.resolution + ")",
+                xaxis: { title: "Fecha", type: "date" },
+                yaxis: { title: "Precio" },
+            };
+            Plotly.react("chart", traces, layout, { responsive: true });
+            status.textContent = "";
+            follow(params, data);
+        } catch (error) {
+            status.textContent = "Error: " + error.message;
+        }
+    }
+
+    // Cambiar el rango sin recargar la página: solo se piden datos nuevos
+    form.addEventListener("submit", (event) => {
+        event.preventDefault();
+        const params = new URLSearchParams();
+        for (const input of form.elements) {
+            if (input.name && input.value.trim()) {
+                params.set(input.name, input.value.trim());
+            }
+        }
+        history.pushState(null, "", "/chart?" + params.toString());
+        load();
+    });
+    window.addEventListener("popstate", load);
+
+    load();
+})();
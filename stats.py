@@ -0,0 +1,146 @@
+import sys
+import math
+import sqlite3
+
+# Estadísticas por símbolo mantenidas por triggers sobre ticks: cada INSERT
+# actualiza count/sum/min/max y la media y M2 de Welford en la misma
+# transacción, así el panel las lee en tiempo constante.
+#
+# Un UPDATE de precio (upsert de un tick repetido) reemplaza el valor en la
+# media y M2; min/max solo se amplían, por lo que tras correcciones pueden
+# quedar holgados hasta el próximo rebuild_stats() o la próxima purga.
+#
+# La retención descuenta los ticks que purga (remove_from_stats): tick_stats
+# describe siempre los ticks guardados, como rebuild_stats().
+STATS_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS tick_stats (
+        symbol_id INTEGER PRIMARY KEY REFERENCES symbols (id),
+        count INTEGER NOT NULL,
+        sum REAL NOT NULL,
+        min REAL NOT NULL,
+        max REAL NOT NULL,
+        mean REAL NOT NULL,
+        m2 REAL NOT NULL,
+        last_ts INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_ticks_stats_insert AFTER INSERT ON ticks
+    BEGIN
+        INSERT INTO tick_stats (symbol_id, count, sum, min, max, mean, m2, last_ts)
+        VALUES (NEW.symbol_id, 1, NEW.price, NEW.price, NEW.price, NEW.price, 0, NEW.ts)
+        ON CONFLICT (symbol_id) DO UPDATE SET
+            count = count + 1,
+            sum = sum + NEW.price,
+            min = MIN(min, NEW.price),
+            max = MAX(max, NEW.price),
+            mean = mean + (NEW.price - mean) / (count + 1),
+            m2 = m2 + (NEW.price - mean) * (NEW.price - (mean + (NEW.price - mean) / (count + 1))),
+            last_ts = MAX(last_ts, NEW.ts);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_ticks_stats_update AFTER UPDATE OF price ON ticks
+    BEGIN
+        UPDATE tick_stats SET
+            sum = sum + NEW.price - OLD.price,
+            min = MIN(min, NEW.price),
+            max = MAX(max, NEW.price),
+            mean = mean + (NEW.price - OLD.price) / count,
+            m2 = m2 + (NEW.price - OLD.price)
+                * (NEW.price - (mean + (NEW.price - OLD.price) / count) + OLD.price - mean)
+        WHERE symbol_id = NEW.symbol_id;
+    END
+    """,
+]
+
+
+def create_stats_schema(cursor):
+    for statement in STATS_SCHEMA:
+        cursor.execute(statement)
+
+
+# Recalcular tick_stats desde cero a partir de ticks (recuperación)
+def rebuild_stats(cursor):
+    cursor.execute("DELETE FROM tick_stats")
+    cursor.execute("""
+        INSERT INTO tick_stats (symbol_id, count, sum, min, max, mean, m2, last_ts)
+        SELECT t.symbol_id, COUNT(*), SUM(t.price), MIN(t.price), MAX(t.price),
+               a.mean, SUM((t.price - a.mean) * (t.price - a.mean)), MAX(t.ts)
+        FROM ticks t
+        JOIN (SELECT symbol_id, AVG(price) AS mean FROM ticks GROUP BY symbol_id) a
+            ON a.symbol_id = t.symbol_id
+        GROUP BY t.symbol_id
+    """)
+
+
+# Descontar de tick_stats los ticks borrados (pares (symbol_id, price)), en la
+# transacción del borrado: count y sum se restan y la media y M2 se separan
+# con la fórmula de Chan a la inversa (todo - borrados = restantes). Un
+# símbolo sin ticks restantes pierde su fila. min/max y last_ts no se pueden
+# restar: los recalcula refresh_stats_bounds.
+def remove_from_stats(cursor, removed):
+    groups = {}
+    for symbol_id, price in removed:
+        groups.setdefault(symbol_id, []).append(price)
+    for symbol_id, prices in groups.items():
+        row = cursor.execute("SELECT count, sum, mean, m2 FROM tick_stats WHERE symbol_id = ?", (symbol_id,)).fetchone()
+        if row is None:
+            continue
+        count, total, mean, m2 = row
+        removed_count = len(prices)
+        remaining = count - removed_count
+        if remaining <= 0:
+            cursor.execute("DELETE FROM tick_stats WHERE symbol_id = ?", (symbol_id,))
+            continue
+        removed_mean = sum(prices) / removed_count
+        removed_m2 = sum((price - removed_mean) ** 2 for price in prices)
+        remaining_mean = (count * mean - removed_count * removed_mean) / remaining
+        remaining_m2 = m2 - removed_m2 - (removed_mean - remaining_mean) ** 2 * removed_count * remaining / count
+        cursor.execute("""
+            UPDATE tick_stats SET count = ?, sum = ?, mean = ?, m2 = ?
+            WHERE symbol_id = ?
+        """, (remaining, total - sum(prices), remaining_mean, max(0.0, remaining_m2), symbol_id))
+
+
+# Recalcular min, max y last_ts de unos símbolos desde sus ticks (tras purgar)
+def refresh_stats_bounds(cursor, symbol_ids):
+    for symbol_id in symbol_ids:
+        cursor.execute("""
+            UPDATE tick_stats SET (min, max, last_ts) = (
+                SELECT MIN(price), MAX(price), MAX(ts) FROM ticks WHERE symbol_id = ?
+            )
+            WHERE symbol_id = ? AND EXISTS (SELECT 1 FROM ticks WHERE symbol_id = ?)
+        """, (symbol_id, symbol_id, symbol_id))
+
+
+# Número total de ticks sin recorrer la tabla ticks
+def total_ticks(conn):
+    return conn.execute("SELECT COALESCE(SUM(count), 0) FROM tick_stats").fetchone()[0]
+
+
+# Mínimo, máximo, promedio y desviación estándar de un símbolo
+def symbol_stats(conn, source, name):
+    row = conn.execute("""
+        SELECT st.min, st.max, st.mean, st.m2, st.count
+        FROM tick_stats st
+        JOIN symbols s ON s.id = st.symbol_id
+        WHERE s.source = ? AND s.name = ?
+    """, (source, name)).fetchone()
+    if row is None:
+        return (None, None, None, None)
+    minimum, maximum, mean, m2, count = row
+    stddev = math.sqrt(m2 / (count - 1)) if count > 1 else 0.0
+    return (minimum, maximum, mean, stddev)
+
+
+# Uso: python stats.py [ruta.db]  -> reconstruye tick_stats
+if __name__ == "__main__":
+    from create_db import DB_NAME
+
+    conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else DB_NAME)
+    with conn:
+        rebuild_stats(conn.cursor())
+    print(f"tick_stats reconstruida: {total_ticks(conn)} ticks")
+    conn.close()
@@ -0,0 +1,480 @@
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+# Los ts se guardan como enteros en milisegundos desde epoch (UTC)
+def ts_to_datetime(ts_ms):
+    return datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc)
+
+
+def format_ts(ts_ms):
+    return ts_to_datetime(ts_ms).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# Último milisegundo del año 9999, el mayor instante que format_ts sabe
+# representar (y muy por debajo del límite de un INTEGER de 64 bits)
+MAX_TS = 253402300799999
+
+
+# Mayor id de fila (INTEGER de SQLite, BIGINT de PostgreSQL)
+MAX_ID = 2 ** 63 - 1
+
+
+# ValueError si ts (ms desde epoch) cae fuera de [0, MAX_TS]
+def check_ts(ts):
+    if not 0 <= ts <= MAX_TS:
+        raise ValueError(f"Instante fuera de rango: {ts}")
+    return ts
+
+
+# ValueError si un id de fila (p. ej. de un cursor) no cabe en la columna
+def check_id(row_id):
+    if not 0 <= row_id <= MAX_ID:
+        raise ValueError(f"Id fuera de rango: {row_id}")
+    return row_id
+
+
+# Instante en milisegundos desde epoch a partir de ms o de una fecha ISO 8601
+# (sin zona se entiende UTC)
+def parse_time(value):
+    value = value.strip()
+    if value.isdigit():
+        return check_ts(int(value))
+    moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return check_ts(int(moment.timestamp() * 1000))
+
+
+# Diccionario de símbolos: (fuente, nombre) -> id entero de la tabla symbols.
+# Se cachea en memoria para no consultar la tabla en cada tick.
+class SymbolDictionary:
+    def __init__(self):
+        self._ids = {}
+
+    def get_id(self, cursor, source, name):
+        key = (source, name)
+        symbol_id = self._ids.get(key)
+        if symbol_id is None:
+            cursor.execute("INSERT OR IGNORE INTO symbols (source, name) VALUES (?, ?)", key)
+            cursor.execute("SELECT id FROM symbols WHERE source = ? AND name = ?", key)
+            symbol_id = cursor.fetchone()[0]
+            self._ids[key] = symbol_id
+        return symbol_id
+
+    def clear(self):
+        self._ids.clear()
+
+
+symbols = SymbolDictionary()
+
+
+# Escribir un lote de ticks; pensado como función write del WriteBehindBuffer
+def write_ticks(cursor, ticks):
+    try:
+        rows = [
+            (symbols.get_id(cursor, tick.source, tick.symbol), int(tick.ts), tick.price)
+            for tick in ticks
+        ]
+        cursor.executemany("""
+            INSERT INTO ticks (symbol_id, ts, price)
+            VALUES (?, ?, ?)
+            ON CONFLICT (symbol_id, ts) DO UPDATE SET price = excluded.price
+            WHERE price <> excluded.price
+        """, rows)
+    except Exception:
+        # Si la transacción se deshace, los ids recién cacheados pueden no existir
+        symbols.clear()
+        raise
+
+
+# Últimos n ticks de todos los símbolos (usa el índice (ts))
+def latest_ticks(conn, limit=10):
+    return conn.execute("""
+        SELECT t.ts, s.source, s.name, t.price
+        FROM ticks t
+        JOIN symbols s ON s.id = t.symbol_id
+        ORDER BY t.ts DESC
+        LIMIT ?
+    """, (limit,)).fetchall()
+
+
+# Último tick de un símbolo en cualquier fuente (ts, source, name, price).
+# Primero los ids del nombre en symbols y, por cada uno, su último tick con
+# una búsqueda en el índice (symbol_id, ts): recorrer ticks por ts buscando el
+# nombre leería toda la tabla si el símbolo lleva tiempo sin ticks.
+def latest_tick(conn, name):
+    return conn.execute("""
+        SELECT t.ts, s.source, s.name, t.price
+        FROM symbols s
+        JOIN ticks t ON t.id = (
+            SELECT id FROM ticks WHERE symbol_id = s.id ORDER BY ts DESC LIMIT 1
+        )
+        WHERE s.name = ?
+        ORDER BY t.ts DESC
+        LIMIT 1
+    """, (name,)).fetchone()
+
+
+# Últimos n ticks de un símbolo en orden cronológico (usa el índice (symbol_id, ts))
+def symbol_series(conn, source, name, limit=100):
+    rows = conn.execute("""
+        SELECT t.ts, t.price
+        FROM ticks t
+        WHERE t.symbol_id = (SELECT id FROM symbols WHERE source = ? AND name = ?)
+        ORDER BY t.ts DESC
+        LIMIT ?
+    """, (source, name, limit)).fetchall()
+    return rows[::-1]
+
+
+# Ticks posteriores a un id (id, ts, source, name, price) en orden de id:
+# recorre la clave primaria desde after_id
+def ticks_after(conn, after_id, limit=1000):
+    return conn.execute("""
+        SELECT t.id, t.ts, s.source, s.name, t.price
+        FROM ticks t
+        JOIN symbols s ON s.id = t.symbol_id
+        WHERE t.id > ?
+        ORDER BY t.id
+        LIMIT ?
+    """, (after_id, limit)).fetchall()
+
+
+# Cláusulas de ticks_since: la condición de cursor y filtros y el orden. Con
+# after_id solo, se recorre la clave primaria; con after_ts, el índice (ts)
+# (que en SQLite incluye el rowid, así que (ts, id) sale ya ordenado). Con
+# ambos, el cursor es el par (ts, id) del último tick visto.
+def since_clauses(after_id, after_ts, source, names, placeholder):
+    where, params = [], []
+    if after_ts is not None:
+        if after_id is not None:
+            where.append(f"(t.ts, t.id) > ({placeholder}, {placeholder})")
+            params += [after_ts, after_id]
+        else:
+            where.append(f"t.ts > {placeholder}")
+            params.append(after_ts)
+        order = "t.ts, t.id"
+    else:
+        where.append(f"t.id > {placeholder}")
+        params.append(after_id or 0)
+        order = "t.id"
+    if source:
+        where.append(f"s.source = {placeholder}")
+        params.append(source)
+    if names:
+        where.append(f"s.name IN ({', '.join([placeholder] * len(names))})")
+        params += list(names)
+    return " AND ".join(where), params, order
+
+
+# Ticks más nuevos que un cursor (id, ts, source, name, price), como mucho limit
+def ticks_since(conn, after_id=None, after_ts=None, source=None, names=None, limit=1000):
+    where, params, order = since_clauses(after_id, after_ts, source, names, "?")
+    return conn.execute(f"""
+        SELECT t.id, t.ts, s.source, s.name, t.price
+        FROM ticks t
+        JOIN symbols s ON s.id = t.symbol_id
+        WHERE {where}
+        ORDER BY {order}
+        LIMIT ?
+    """, params + [limit]).fetchall()
+
+
+# Conjuntos de la API paginada (/api/prices, /api/trades, /api/logs): tablas,
+# columna de tiempo e id del orden (y del cursor), campos seleccionables
+# (None = el tiempo en ms) y columnas de los filtros por símbolo y fuente.
+# En trades y logs el tiempo es un DATETIME de texto: se compara tal cual para
+# usar su índice y solo se convierte a ms al devolverlo.
+PAGE_DATASETS = {
+    "prices": {
+        "from": "ticks t JOIN symbols s ON s.id = t.symbol_id",
+        "time": "t.ts", "id": "t.id", "ms": True,
+        "fields": {"id": "t.id", "ts": "t.ts", "source": "s.source", "symbol": "s.name", "price": "t.price"},
+        "symbol": ("s.name",), "source": "s.source", "symbol_id": "t.symbol_id",
+    },
+    "trades": {
+        "from": "trades", "time": "timestamp", "id": "id", "ms": False,
+        "fields": {"id": "id", "ts": None, "side": "side", "token1": "token1", "token2": "token2",
+                   "price1": "price1", "price2": "price2"},
+        "symbol": ("token1", "token2"), "source": None,
+    },
+    "logs": {
+        "from": "logs", "time": "timestamp", "id": "id", "ms": False,
+        "fields": {"id": "id", "ts": None, "message": "message"},
+        "symbol": (), "source": None,
+    },
+}
+
+
+def sqlite_ms(column):
+    return f"CAST(strftime('%s', {column}) AS INTEGER) * 1000"
+
+
+# Consulta de una página por keyset sobre (tiempo, id): las filas siguientes
+# al cursor `after` = (ts en ms, id) de la última fila de la página anterior,
+# en orden ascendente o descendente. Con el índice sobre el tiempo cada página
+# cuesta lo mismo que la primera, a diferencia de OFFSET. Cada fila trae los
+# campos pedidos y, al final, su ts en ms y su id para el siguiente cursor.
+# ms_expr y db_time convierten entre ms y la columna de tiempo de cada motor.
+# symbol_ids son los ids de symbols ya resueltos para names/source (ver
+# symbol_ids_query): si es uno solo se filtra por symbol_id, y la página sale
+# del índice (symbol_id, ts) en vez de recorrer el de ts de todos los símbolos
+# (lento con un símbolo poco frecuente); si no hay ninguno, no hay filas.
+def keyset_page_query(dataset, fields=None, names=None, source=None, start_ts=None, end_ts=None,
+                      after=None, descending=False, limit=1000, placeholder="?", ms_expr=sqlite_ms, db_time=format_ts,
+                      symbol_ids=None):
+    spec = PAGE_DATASETS[dataset]
+    fields = fields or list(spec["fields"])
+    unknown = [field for field in fields if field not in spec["fields"]]
+    if unknown:
+        raise ValueError(f"Campos desconocidos en {dataset}: {', '.join(unknown)} (disponibles: {', '.join(spec['fields'])})")
+    time_column = spec["time"]
+    time_ms = time_column if spec["ms"] else ms_expr(time_column)
+    to_db = (lambda ms: ms) if spec["ms"] else db_time
+    columns = [spec["fields"][field] or time_ms for field in fields] + [time_ms, spec["id"]]
+
+    where, params = [], []
+    if symbol_ids is not None and len(symbol_ids) <= 1:
+        if not symbol_ids:
+            where.append("1 = 0")
+        else:
+            where.append(f"{spec['symbol_id']} = {placeholder}")
+            params.append(symbol_ids[0])
+        names = source = None
+    if names:
+        if not spec["symbol"]:
+            raise ValueError(f"{dataset} no admite filtro por símbolo")
+        marks = ", ".join([placeholder] * len(names))
+        where.append("(" + " OR ".join(f"{column} IN ({marks})" for column in spec["symbol"]) + ")")
+        params += list(names) * len(spec["symbol"])
+    if source:
+        if not spec["source"]:
+            raise ValueError(f"{dataset} no admite filtro por fuente")
+        where.append(f"{spec['source']} = {placeholder}")
+        params.append(source)
+    if start_ts is not None:
+        where.append(f"{time_column} >= {placeholder}")
+        params.append(to_db(start_ts))
+    if end_ts is not None:
+        where.append(f"{time_column} < {placeholder}")
+        params.append(to_db(end_ts))
+    if after is not None:
+        where.append(f"({time_column}, {spec['id']}) {'<' if descending else '>'} ({placeholder}, {placeholder})")
+        params += [to_db(after[0]), after[1]]
+    direction = "DESC" if descending else "ASC"
+    sql = f"""
+        SELECT {', '.join(columns)}
+        FROM {spec['from']}
+        WHERE {' AND '.join(where) or '1 = 1'}
+        ORDER BY {time_column} {direction}, {spec['id']} {direction}
+        LIMIT {placeholder}
+    """
+    return sql, params + [limit]
+
+
+# Ids de symbols con alguno de esos nombres (y de esa fuente, si se da)
+def symbol_ids_query(names, source=None, placeholder="?"):
+    sql = f"SELECT id FROM symbols WHERE name IN ({', '.join([placeholder] * len(names))})"
+    params = list(names)
+    if source:
+        sql += f" AND source = {placeholder}"
+        params.append(source)
+    return sql, params
+
+
+def keyset_page(conn, dataset, fields=None, names=None, source=None, start_ts=None, end_ts=None,
+                after=None, descending=False, limit=1000):
+    symbol_ids = None
+    if names and "symbol_id" in PAGE_DATASETS[dataset]:
+        symbol_ids = [row[0] for row in conn.execute(*symbol_ids_query(names, source))]
+    sql, params = keyset_page_query(dataset, fields, names, source, start_ts, end_ts, after, descending, limit,
+                                    symbol_ids=symbol_ids)
+    return conn.execute(sql, params).fetchall()
+
+
+def max_tick_id(conn):
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM ticks").fetchone()[0]
+
+
+# Ticks de un símbolo en [start_ts, end_ts) en orden cronológico (índice (symbol_id, ts))
+def tick_series(conn, source, name, start_ts, end_ts):
+    return conn.execute("""
+        SELECT t.ts, t.price
+        FROM ticks t
+        WHERE t.symbol_id = (SELECT id FROM symbols WHERE source = ? AND name = ?)
+          AND t.ts >= ? AND t.ts < ?
+        ORDER BY t.ts
+    """, (source, name, start_ts, end_ts)).fetchall()
+
+
+# Todos los símbolos conocidos como (fuente, nombre)
+def list_symbols(conn):
+    return [tuple(row) for row in conn.execute("SELECT source, name FROM symbols ORDER BY source, name")]
+
+
+# Huecos de un símbolo en [start_ts, end_ts): pares (ts anterior, ts siguiente)
+# de ticks consecutivos separados más de min_gap_ms. El recorrido empieza en el
+# último tick anterior a start_ts, así también sale un hueco que empezó antes
+# del rango (prev_ts < start_ts). Recorre el índice (symbol_id, ts).
+FIND_GAPS_SQL = """
+    WITH symbol AS (SELECT id FROM symbols WHERE source = {p} AND name = {p})
+    SELECT prev_ts, ts
+    FROM (
+        SELECT ts, LAG(ts) OVER (ORDER BY ts) AS prev_ts
+        FROM ticks
+        WHERE symbol_id = (SELECT id FROM symbol)
+          AND ts >= COALESCE(
+              (SELECT MAX(ts) FROM ticks WHERE symbol_id = (SELECT id FROM symbol) AND ts < {p}), {p})
+          AND ts < {p}
+    ) AS series
+    WHERE ts - prev_ts > {p}
+    ORDER BY prev_ts
+"""
+
+
+def find_gaps(conn, source, name, min_gap_ms, start_ts, end_ts):
+    return conn.execute(FIND_GAPS_SQL.format(p="?"), (source, name, start_ts, start_ts, end_ts, min_gap_ms)).fetchall()
+
+
+# Escribir velas OHLCV de un exchange [[ts, open, high, low, close, volume], ...]
+# y avanzar el cursor del trabajo en la misma transacción. Las velas repetidas
+# se sobrescriben: la última vela de cada petición puede estar aún abierta.
+def write_ohlcv(cursor, source, name, timeframe, bars):
+    try:
+        symbol_id = symbols.get_id(cursor, source, name)
+        cursor.executemany("""
+            INSERT INTO ohlcv (symbol_id, timeframe, ts, open, high, low, close, volume)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (symbol_id, timeframe, ts) DO UPDATE SET
+                open = excluded.open, high = excluded.high, low = excluded.low,
+                close = excluded.close, volume = excluded.volume
+        """, [(symbol_id, timeframe, int(bar[0]), *bar[1:6]) for bar in bars])
+        cursor.execute("""
+            INSERT INTO ohlcv_cursors (symbol_id, timeframe, since_ts) VALUES (?, ?, ?)
+            ON CONFLICT (symbol_id, timeframe) DO UPDATE SET since_ts = MAX(since_ts, excluded.since_ts)
+        """, (symbol_id, timeframe, max(int(bar[0]) for bar in bars)))
+    except Exception:
+        symbols.clear()
+        raise
+
+
+# Apertura de la última vela guardada de un trabajo (desde donde seguir), o None
+def ohlcv_cursor(conn, source, name, timeframe):
+    row = conn.execute("""
+        SELECT c.since_ts
+        FROM ohlcv_cursors c
+        JOIN symbols s ON s.id = c.symbol_id
+        WHERE s.source = ? AND s.name = ? AND c.timeframe = ?
+    """, (source, name, timeframe)).fetchone()
+    return row[0] if row else None
+
+
+# Velas de un exchange en [start_ts, end_ts) en orden cronológico
+def ohlcv_series(conn, source, name, timeframe, start_ts, end_ts):
+    return conn.execute("""
+        SELECT ts, open, high, low, close, volume
+        FROM ohlcv
+        WHERE symbol_id = (SELECT id FROM symbols WHERE source = ? AND name = ?)
+          AND timeframe = ? AND ts >= ? AND ts < ?
+        ORDER BY ts
+    """, (source, name, timeframe, start_ts, end_ts)).fetchall()
+
+
+# Niveles de un lado del libro en un blob columnar: primero los precios y
+# después las cantidades, ambos float64 (16 bytes por nivel)
+def pack_levels(levels):
+    levels = np.asarray(levels, dtype=np.float64).reshape(-1, 2)
+    return levels[:, 0].astype("<f8").tobytes() + levels[:, 1].astype("<f8").tobytes()
+
+
+# Inversa de pack_levels: (precios, cantidades) como arrays de numpy
+def unpack_levels(blob):
+    count = len(blob) // 16
+    return np.frombuffer(blob, "<f8", count), np.frombuffer(blob, "<f8", count, offset=8 * count)
+
+
+# Fila de order_books de una foto: los resúmenes (mejor bid/ask y volumen de
+# cada lado) van en columnas para que spread, profundidad e imbalance se
+# consulten sin leer los blobs
+def order_book_row(symbol_id, book):
+    return (
+        symbol_id, int(book.ts), len(book.bids), len(book.asks),
+        book.bids[0][0] if book.bids else None, book.asks[0][0] if book.asks else None,
+        float(sum(level[1] for level in book.bids)), float(sum(level[1] for level in book.asks)),
+        pack_levels(book.bids), pack_levels(book.asks),
+    )
+
+
+def write_order_books(cursor, books):
+    try:
+        cursor.executemany("""
+            INSERT INTO order_books (symbol_id, ts, bid_levels, ask_levels, best_bid, best_ask,
+                                     bid_volume, ask_volume, bids, asks)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (symbol_id, ts) DO NOTHING
+        """, [order_book_row(symbols.get_id(cursor, book.source, book.symbol), book) for book in books])
+    except Exception:
+        symbols.clear()
+        raise
+
+
+# Spread, mid, volumen de cada lado e imbalance ((bid - ask) / (bid + ask)) de
+# las fotos de un símbolo en [start_ts, end_ts), sin tocar los blobs
+def order_book_metrics(conn, source, name, start_ts, end_ts):
+    return conn.execute("""
+        SELECT ts, best_ask - best_bid AS spread, (best_ask + best_bid) / 2 AS mid,
+               bid_volume, ask_volume,
+               (bid_volume - ask_volume) / NULLIF(bid_volume + ask_volume, 0) AS imbalance
+        FROM order_books
+        WHERE symbol_id = (SELECT id FROM symbols WHERE source = ? AND name = ?)
+          AND ts >= ? AND ts < ?
+        ORDER BY ts
+    """, (source, name, start_ts, end_ts)).fetchall()
+
+
+# Última foto de un símbolo en o antes de ts: (ts, (precios, cantidades) bids, ídem asks)
+def order_book_at(conn, source, name, ts):
+    row = conn.execute("""
+        SELECT ts, bids, asks
+        FROM order_books
+        WHERE symbol_id = (SELECT id FROM symbols WHERE source = ? AND name = ?) AND ts <= ?
+        ORDER BY ts DESC
+        LIMIT 1
+    """, (source, name, ts)).fetchone()
+    if row is None:
+        return None
+    return row[0], unpack_levels(row[1]), unpack_levels(row[2])
+
+
+# Tramos ya completados de un trabajo de backfill: (chunk_start, chunk_end)
+def backfill_chunks_done(conn, job):
+    return conn.execute("SELECT chunk_start, chunk_end FROM backfill_checkpoints WHERE job = ?", (job,)).fetchall()
+
+
+def mark_backfill_chunk(cursor, job, chunk_start, chunk_end):
+    cursor.execute("""
+        INSERT INTO backfill_checkpoints (job, chunk_start, chunk_end, done_ts)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (job, chunk_start) DO UPDATE SET chunk_end = excluded.chunk_end, done_ts = excluded.done_ts
+    """, (job, chunk_start, chunk_end, int(time.time() * 1000)))
+
+
+# Lease con nombre (p. ej. "ingest"): lo obtiene owner si está libre, caducado
+# o ya era suyo, y en ese caso lo renueva hasta now + ttl_ms. Devuelve si owner
+# lo tiene tras la llamada.
+def acquire_lease(cursor, name, owner, ttl_ms):
+    now = int(time.time() * 1000)
+    cursor.execute("""
+        INSERT INTO leases (name, owner, expires_ts) VALUES (?, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET owner = excluded.owner, expires_ts = excluded.expires_ts
+        WHERE leases.owner = excluded.owner OR leases.expires_ts < ?
+    """, (name, owner, now + ttl_ms, now))
+    row = cursor.execute("SELECT owner FROM leases WHERE name = ?", (name,)).fetchone()
+    return row is not None and row[0] == owner
+
+
+def release_lease(cursor, name, owner):
+    cursor.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
@@ -0,0 +1,127 @@
+import os
+import json
+import random
+import asyncio
+from datetime import datetime
+
+import websockets
+
+from ingestion import Tick, now_ms
+
+KRAKEN_WS_URL = "wss://ws.kraken.com/v2"
+
+# Streams activos del proceso (para /metrics)
+active_streams = []
+
+
+# Milisegundos desde epoch de un timestamp ISO 8601 (p. ej. "2024-05-01T10:00:00.123456Z")
+def parse_iso_ms(value):
+    return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() * 1000)
+
+
+# Ingesta por WebSocket de los canales ticker y trade de Kraken (API v2). Los
+# ticks van a la misma cola que los de los sondeos REST, con la misma fuente
+# ("kraken") y los mismos símbolos, así que alimentan las mismas series.
+# - Reconexión automática con backoff exponencial con jitter, y se vuelve a
+#   suscribir en cada conexión. Si no llega nada en idle_timeout segundos se
+#   da la conexión por muerta.
+# - Secuencia: los trade_id de cada símbolo son consecutivos. Los repetidos
+#   (la foto de los últimos trades que Kraken envía al suscribirse) se
+#   descartan, y un salto se cuenta y se avisa como hueco. Esos trades no se
+#   recuperan: gaps.py solo rellena huecos de tiempo mayores que su umbral en
+#   las series, no trades sueltos.
+# Necesita Python 3.11 (asyncio.timeout).
+class KrakenStream:
+    def __init__(self, symbols, url=None, channels=("ticker", "trade"), idle_timeout=30, max_backoff=60):
+        self.name = "kraken"
+        self.symbols = list(symbols)
+        self.url = url or os.getenv("KRAKEN_WS_URL", KRAKEN_WS_URL)
+        self.channels = list(channels)
+        self.idle_timeout = idle_timeout
+        self.max_backoff = max_backoff
+        self.last_trade_id = {}
+        self.messages = 0
+        self.reconnects = 0
+        self.sequence_gaps = 0
+
+    def subscriptions(self):
+        return [
+            {"method": "subscribe", "params": {"channel": channel, "symbol": self.symbols}, "req_id": req_id}
+            for req_id, channel in enumerate(self.channels, start=1)
+        ]
+
+    def _trade_ticks(self, data):
+        ticks = []
+        for trade in data:
+            symbol = trade["symbol"]
+            trade_id = trade.get("trade_id")
+            last = self.last_trade_id.get(symbol)
+            if trade_id is not None and last is not None:
+                if trade_id <= last:
+                    continue
+                if trade_id > last + 1:
+                    self.sequence_gaps += 1
+                    print(f"[{self.name}] Hueco de secuencia en {symbol}: trades {last + 1}-{trade_id - 1} perdidos")
+            if trade_id is not None:
+                self.last_trade_id[symbol] = trade_id
+            ticks.append(Tick(self.name, symbol, float(trade["price"]), parse_iso_ms(trade["timestamp"])))
+        return ticks
+
+    # Ticks de un mensaje (lista vacía para confirmaciones, heartbeats, etc.)
+    def parse(self, message):
+        channel = message.get("channel")
+        data = message.get("data") or []
+        if channel == "ticker":
+            # El canal ticker no trae timestamp: se usa el de recepción
+            ts = now_ms()
+            return [Tick(self.name, item["symbol"], float(item["last"]), ts) for item in data if item.get("last") is not None]
+        if channel == "trade":
+            return self._trade_ticks(data)
+        if message.get("method") == "subscribe" and not message.get("success", True):
+            print(f"[{self.name}] Suscripción rechazada: {message.get('error')}")
+        return []
+
+    # Recibir mensajes indefinidamente y entregar sus ticks a emit (corrutina);
+    # termina cuando se cancela la tarea
+    async def run(self, emit):
+        backoff = 1.0
+        while True:
+            try:
+                async with websockets.connect(self.url, ping_interval=20, max_size=2 ** 22) as ws:
+                    for subscription in self.subscriptions():
+                        await ws.send(json.dumps(subscription))
+                    print(f"[{self.name}] WebSocket conectado a {self.url}")
+                    while True:
+                        # asyncio.timeout y no wait_for: wait_for puede tragarse la
+                        # cancelación de la tarea si el mensaje llega a la vez
+                        async with asyncio.timeout(self.idle_timeout):
+                            raw = await ws.recv()
+                        self.messages += 1
+                        ticks = self.parse(json.loads(raw))
+                        if ticks:
+                            backoff = 1.0
+                            await emit(ticks)
+            except TimeoutError:
+                print(f"[{self.name}] Sin mensajes en {self.idle_timeout}s: reconectando")
+            except (OSError, websockets.WebSocketException) as e:
+                print(f"[{self.name}] WebSocket desconectado: {e}")
+            except Exception as e:
+                print(f"[{self.name}] Error en el WebSocket: {e}")
+            self.reconnects += 1
+            await asyncio.sleep(backoff * random.uniform(0.5, 1.0))
+            backoff = min(self.max_backoff, backoff * 2)
+
+
+# Streams de INGEST_STREAMS (de momento solo "kraken"), con los símbolos de
+# STREAM_SYMBOLS o, si no, de CCXT_SYMBOLS
+def build_streams(spec=None):
+    spec = spec if spec is not None else os.getenv("INGEST_STREAMS", "")
+    symbols = [s.strip() for s in os.getenv("STREAM_SYMBOLS", os.getenv("CCXT_SYMBOLS", "MATIC/USDT,USDC/USDT")).split(",") if s.strip()]
+    channels = [c.strip() for c in os.getenv("STREAM_CHANNELS", "ticker,trade").split(",") if c.strip()]
+    streams = []
+    for name in filter(None, (s.strip() for s in spec.split(","))):
+        if name != "kraken":
+            raise ValueError(f"Stream desconocido: {name}")
+        streams.append(KrakenStream(symbols, channels=channels))
+    active_streams[:] = streams
+    return streams
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos del proyecto están en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "test.db")
+
+
+# Backend SQLite con el esquema ya migrado
+@pytest.fixture
+def backend(db_path):
+    from backends import SQLiteBackend
+    from storage import symbols
+
+    # La caché de ids de símbolos es del proceso: cada base de pruebas empieza vacía
+    symbols.clear()
+    backend = SQLiteBackend(db_path)
+    backend.init_schema()
+    yield backend
+    backend.close()
@@ -0,0 +1,111 @@
+import asyncio
+
+from backfill import CcxtHistory, RateBudget, run_backfill, warn_retention
+from ingestion import Tick, now_ms
+
+HOUR_MS = 60 * 60 * 1000
+
+
+# Histórico falso con un tick por hora; falla en los tramos de fail_at
+class FakeHistory:
+    provider = "fake"
+    source = "fake"
+    symbol = "BTC"
+    job = "fake:BTC"
+    max_window_ms = 24 * HOUR_MS
+
+    def __init__(self, fail_at=()):
+        self.fail_at = set(fail_at)
+        self.calls = []
+
+    def fetch_page(self, start_ts, end_ts):
+        self.calls.append((start_ts, end_ts))
+        if start_ts in self.fail_at:
+            raise RuntimeError("caído")
+        return [Tick(self.source, self.symbol, 1.0, ts) for ts in range(start_ts, end_ts, HOUR_MS)], None
+
+
+def backfill(backend, history, end_ts, chunk_ms=4 * HOUR_MS):
+    return asyncio.run(run_backfill(backend, [history], 0, end_ts, chunk_ms, {"fake": RateBudget(60000, 4)}))
+
+
+def test_resume_skips_completed_chunks(backend):
+    assert backfill(backend, FakeHistory(fail_at={4 * HOUR_MS}), 12 * HOUR_MS) == 8
+    history = FakeHistory()
+    assert backfill(backend, history, 12 * HOUR_MS) == 4
+    assert history.calls == [(4 * HOUR_MS, 8 * HOUR_MS)]
+    assert [tuple(row) for row in backend.tick_series("fake", "BTC", 0, 12 * HOUR_MS)] == [(ts, 1.0) for ts in range(0, 12 * HOUR_MS, HOUR_MS)]
+
+
+def test_shorter_checkpoint_is_not_complete(backend):
+    # El último tramo acabó en 10h; al ampliar el rango a 12h hay que repetirlo
+    backfill(backend, FakeHistory(), 10 * HOUR_MS)
+    history = FakeHistory()
+    backfill(backend, history, 12 * HOUR_MS)
+    assert history.calls == [(8 * HOUR_MS, 12 * HOUR_MS)]
+
+
+def test_chunks_are_clamped_to_the_history_window(backend):
+    history = FakeHistory()
+    backfill(backend, history, 48 * HOUR_MS, chunk_ms=30 * 24 * HOUR_MS)
+    assert sorted(history.calls) == [(0, 24 * HOUR_MS), (24 * HOUR_MS, 48 * HOUR_MS)]
+
+
+class FakeExchange:
+    id = "fake"
+
+    def __init__(self):
+        self.pages = 0
+
+    def parse_timeframe(self, timeframe):
+        return 60
+
+    def fetch_ohlcv(self, symbol, timeframe, since, limit):
+        self.pages += 1
+        return [[ts, 1.0, 1.0, 1.0, 1.0, 0.0] for ts in range(since, since + limit * 60000, 60000)]
+
+
+# Exchange que ignora since y devuelve siempre las velas más recientes
+class StuckExchange(FakeExchange):
+    def fetch_ohlcv(self, symbol, timeframe, since, limit):
+        self.pages += 1
+        assert self.pages < 10, "la paginación no avanza"
+        return [[ts, 1.0, 1.0, 1.0, 1.0, 0.0] for ts in range(0, 5 * 60000, 60000)]
+
+
+class CountingBudget(RateBudget):
+    def __init__(self):
+        super().__init__(60000, 4)
+        self.acquired = 0
+
+    async def __aenter__(self):
+        self.acquired += 1
+        await super().__aenter__()
+
+
+def test_ccxt_budget_is_taken_per_page(backend):
+    exchange = FakeExchange()
+    history = CcxtHistory(exchange, "BTC/USDT")
+    budget = CountingBudget()
+    # Ventana de 2500 velas de 1m en un solo tramo: tres páginas de 1000
+    history.max_window_ms = 2500 * 60000
+    asyncio.run(run_backfill(backend, [history], 0, 2500 * 60000, 2500 * 60000, {"fake": budget}))
+    assert exchange.pages == 3
+    assert budget.acquired == 3
+
+
+def test_warns_when_range_is_older_than_tick_retention():
+    rules = {"ticks": 7 * 24 * HOUR_MS}
+    assert warn_retention(now_ms() - 30 * 24 * HOUR_MS, rules)
+    assert not warn_retention(now_ms() - 24 * HOUR_MS, rules)
+    assert not warn_retention(0, {})
+
+
+def test_ccxt_stops_when_since_is_ignored(backend):
+    exchange = StuckExchange()
+    history = CcxtHistory(exchange, "BTC/USDT")
+    # La primera página avanza hasta la última vela; la segunda repite las
+    # mismas velas (todas anteriores a since) y corta la paginación
+    asyncio.run(run_backfill(backend, [history], 0, 60 * 60000, 60 * 60000, {"fake": RateBudget(60000, 4)}))
+    assert exchange.pages == 2
+    assert history.fetch_page(10 * 60000, 60 * 60000) == ([], None)
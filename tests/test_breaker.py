@@ -0,0 +1,56 @@
+import pytest
+
+import breaker as breaker_module
+from breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(breaker_module.time, "monotonic", lambda: now[0])
+    return now
+
+
+def fail():
+    raise RuntimeError("caído")
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("fake", failure_threshold=3, reset_timeout=10)
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            breaker.call(fail)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 1)
+    assert breaker.rejected_total == 1
+    assert breaker.retry_in() == pytest.approx(10)
+
+
+def test_half_open_lets_one_probe_and_backs_off(clock):
+    breaker = CircuitBreaker("fake", failure_threshold=1, reset_timeout=10, max_reset_timeout=25)
+    breaker.failure()
+    clock[0] += 10
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Solo una prueba a la vez
+    assert not breaker.allow()
+    breaker.failure()
+    assert breaker.state == OPEN and breaker.reset_timeout == 20
+    clock[0] += 20
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.reset_timeout == 25
+    clock[0] += 25
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED and breaker.reset_timeout == 10
+
+
+def test_call_or_last_serves_the_last_value(clock):
+    breaker = CircuitBreaker("fake", failure_threshold=1, reset_timeout=10)
+    assert breaker.call_or_last(fail, default="nada") == "nada"
+    clock[0] += 10
+    assert breaker.call_or_last(lambda: 42) == 42
+    assert breaker.call_or_last(fail) == 42
+    # Abierto: no se llama a la función
+    assert breaker.call_or_last(lambda: 1 / 0) == 42
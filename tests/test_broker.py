@@ -0,0 +1,58 @@
+from broker import Broker, Subscription, publish_ticks_after, replay_after
+from ingestion import Tick
+
+
+def tick_ids(messages):
+    return [int(message.split("\n")[0][len("id: "):]) for message in messages]
+
+
+def test_slow_subscriber_keeps_the_newest_messages():
+    broker = Broker()
+    subscription = broker.subscribe(maxlen=3)
+    broker.publish([Tick("fake", "BTC", float(i), i) for i in range(5)], list(range(1, 6)))
+    messages, dropped = subscription.drain(0)
+    assert tick_ids(messages) == [3, 4, 5]
+    assert dropped == 2
+    # Los descartados se cuentan una sola vez
+    assert subscription.drain(0) == ([], 0)
+
+
+def test_drops_are_added_to_the_broker_on_unsubscribe():
+    broker = Broker()
+    subscription = broker.subscribe(maxlen=1)
+    broker.publish([Tick("fake", "BTC", 1.0, 1), Tick("fake", "BTC", 2.0, 2)])
+    broker.unsubscribe(subscription)
+    assert broker.dropped == 1
+    assert broker.subscribers == set()
+
+
+def test_subscriber_limit_and_symbol_filter():
+    broker = Broker(max_subscribers=1)
+    subscription = broker.subscribe(["ETH"])
+    assert broker.subscribe() is None
+    broker.publish([Tick("fake", "BTC", 1.0, 1), Tick("fake", "ETH", 2.0, 2)], [1, 2])
+    assert tick_ids(subscription.drain(0)[0]) == [2]
+
+
+def test_replay_does_not_repeat_live_ticks(backend):
+    backend.write_ticks([Tick("fake", "BTC", float(i), 1000 * i) for i in range(6)])
+    broker = Broker()
+    subscription = broker.subscribe()
+    # Entre subscribe() y la relectura llegan en vivo ticks que la relectura
+    # también devuelve
+    publish_ticks_after(backend, 3, broker)
+    missed, truncated = replay_after(backend, subscription, 2, limit=10)
+    assert tick_ids(missed) == [3, 4, 5, 6] and not truncated
+    assert subscription.drain(0) == ([], 0)
+
+    backend.write_ticks([Tick("fake", "BTC", 6.0, 6000)])
+    publish_ticks_after(backend, 6, broker)
+    assert tick_ids(subscription.drain(0)[0]) == [7]
+
+
+def test_truncated_replay_is_reported(backend):
+    backend.write_ticks([Tick("fake", "BTC", float(i), 1000 * i) for i in range(6)])
+    subscription = Subscription()
+    missed, truncated = replay_after(backend, subscription, 0, limit=4)
+    assert tick_ids(missed) == [1, 2, 3, 4] and truncated
+    assert subscription.replayed_id == 4
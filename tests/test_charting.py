@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from charting import lttb, parse_range, pick_resolution
+from ingestion import now_ms
+
+MINUTE_MS = 60 * 1000
+DAY_MS = 24 * 60 * MINUTE_MS
+RULES = {"ticks": 7 * DAY_MS, "ohlc_1m": 90 * DAY_MS, "ohlc_5m": 365 * DAY_MS}
+
+
+def test_short_recent_range_uses_raw_ticks():
+    end = now_ms()
+    assert pick_resolution(end - 60 * MINUTE_MS, end, rules=RULES) is None
+
+
+def test_short_range_older_than_tick_retention_uses_candles():
+    end = now_ms() - 30 * DAY_MS
+    assert pick_resolution(end - 60 * MINUTE_MS, end, rules=RULES) == "1m"
+    end = now_ms() - 200 * DAY_MS
+    assert pick_resolution(end - 60 * MINUTE_MS, end, rules=RULES) == "5m"
+    end = now_ms() - 400 * DAY_MS
+    assert pick_resolution(end - 60 * MINUTE_MS, end, rules=RULES) == "1h"
+
+
+def test_long_range_uses_a_coarse_resolution():
+    end = now_ms()
+    assert pick_resolution(end - 365 * DAY_MS, end, points=1000, rules={}) == "1d"
+    assert pick_resolution(end - 7 * DAY_MS, end, points=1000, rules={}) == "5m"
+
+
+def test_lttb_keeps_ends_and_spikes():
+    x = np.arange(1000, dtype=np.int64) * 1000 + 1_700_000_000_000
+    y = np.zeros(1000)
+    y[437] = 50.0
+    y[801] = -20.0
+    keep = lttb(x, y, 50)
+    assert len(keep) == 50
+    assert keep[0] == 0 and keep[-1] == 999
+    assert np.all(np.diff(keep) > 0)
+    assert {437, 801} <= set(keep.tolist())
+
+
+def test_lttb_returns_everything_below_threshold():
+    assert lttb(np.arange(10), np.arange(10.0), 20).tolist() == list(range(10))
+
+
+def test_parse_range_accepts_ms_dates_and_durations():
+    assert parse_range("1000", "2000") == (1000, 2000)
+    assert parse_range("2024-01-01", "2024-01-02T00:00:00Z") == (1704067200000, 1704153600000)
+    assert parse_range("1h", "7200000") == (3600000, 7200000)
+    # Una duración anterior a 1970 empieza en 0
+    assert parse_range("100y", "7200000") == (0, 7200000)
+
+
+@pytest.mark.parametrize("start, end", [
+    ("0", "99999999999999999999"),
+    ("99999999999999999999", None),
+    ("-5", "1000"),
+    ("ayer", "1000"),
+])
+def test_parse_range_rejects_out_of_range_values(start, end):
+    with pytest.raises(ValueError):
+        parse_range(start, end)
@@ -0,0 +1,71 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from db import ConnectionManager
+
+
+@pytest.fixture
+def db(db_path):
+    manager = ConnectionManager(db_path)
+    with manager.write() as conn:
+        conn.execute("CREATE TABLE counter (id INTEGER PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute("INSERT INTO counter (id, value) VALUES (1, 0)")
+    yield manager
+    manager.close()
+
+
+def read_value(db):
+    return db.reader().execute("SELECT value FROM counter WHERE id = 1").fetchone()[0]
+
+
+def test_reader_is_not_blocked_by_an_open_write(db):
+    result = []
+    with db.write() as conn:
+        conn.execute("UPDATE counter SET value = 42 WHERE id = 1")
+        # Con la transacción de escritura abierta, otro hilo lee el último commit
+        reader = threading.Thread(target=lambda: result.append(read_value(db)))
+        started = time.monotonic()
+        reader.start()
+        reader.join(2)
+        assert time.monotonic() - started < 1
+    assert result == [0]
+    assert read_value(db) == 42
+
+
+def test_writes_from_several_threads_are_serialized(db):
+    active, overlaps = [0], []
+
+    def increment():
+        for _ in range(5):
+            with db.write() as conn:
+                active[0] += 1
+                overlaps.append(active[0])
+                value = conn.execute("SELECT value FROM counter WHERE id = 1").fetchone()[0]
+                time.sleep(0.001)
+                conn.execute("UPDATE counter SET value = ? WHERE id = 1", (value + 1,))
+                active[0] -= 1
+
+    threads = [threading.Thread(target=increment) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Sin escrituras perdidas ni dos transacciones a la vez
+    assert read_value(db) == 40
+    assert max(overlaps) == 1
+
+
+def test_reader_connection_is_read_only(db):
+    with pytest.raises(sqlite3.OperationalError):
+        db.reader().execute("UPDATE counter SET value = 1 WHERE id = 1")
+
+
+def test_failed_write_is_rolled_back(db):
+    with pytest.raises(RuntimeError):
+        with db.write() as conn:
+            conn.execute("UPDATE counter SET value = 7 WHERE id = 1")
+            raise RuntimeError("fallo a mitad")
+    assert read_value(db) == 0
@@ -0,0 +1,50 @@
+from gaps import JOB_PREFIX, GapHealer
+from ingestion import Tick
+
+MINUTE_MS = 60 * 1000
+HOUR_MS = 60 * MINUTE_MS
+
+
+class FakeHistory:
+    provider = "fake"
+    source = "fake"
+    symbol = "BTC"
+    job = "fake:BTC:1m"
+    resolution_ms = MINUTE_MS
+    max_window_ms = 24 * HOUR_MS
+
+
+def healer_for(backend):
+    healer = GapHealer(backend)
+    healer.history_for = lambda source, name: FakeHistory()
+    return healer
+
+
+def write_minutes(backend, start_ts, end_ts):
+    backend.write_ticks([Tick("fake", "BTC", 1.0, ts) for ts in range(start_ts, end_ts, MINUTE_MS)])
+
+
+def test_gap_inside_the_range(backend):
+    write_minutes(backend, 0, 2 * HOUR_MS)
+    write_minutes(backend, 3 * HOUR_MS, 4 * HOUR_MS)
+    windows = healer_for(backend).find_windows(HOUR_MS, 4 * HOUR_MS)
+    assert [(start, end) for _, start, end in windows] == [(2 * HOUR_MS - MINUTE_MS + 1, 3 * HOUR_MS)]
+
+
+def test_gap_that_started_before_the_range(backend):
+    # Sin ticks entre 1h y 5h: con el rango empezando a las 3h el hueco
+    # empieza en el último tick anterior al rango
+    write_minutes(backend, 0, HOUR_MS)
+    write_minutes(backend, 5 * HOUR_MS, 6 * HOUR_MS)
+    assert [tuple(row) for row in backend.find_gaps("fake", "BTC", 3 * MINUTE_MS, 3 * HOUR_MS, 6 * HOUR_MS)] == [(HOUR_MS - MINUTE_MS, 5 * HOUR_MS)]
+    windows = healer_for(backend).find_windows(3 * HOUR_MS, 6 * HOUR_MS)
+    assert [(start, end) for _, start, end in windows] == [(HOUR_MS - MINUTE_MS + 1, 5 * HOUR_MS)]
+
+
+def test_checkpointed_windows_are_skipped(backend):
+    write_minutes(backend, 0, HOUR_MS)
+    write_minutes(backend, 2 * HOUR_MS, 3 * HOUR_MS)
+    healer = healer_for(backend)
+    [(history, start, end)] = healer.find_windows(0, 3 * HOUR_MS)
+    backend.mark_backfill_chunk(JOB_PREFIX + history.job, start, end)
+    assert healer.find_windows(0, 3 * HOUR_MS) == []
@@ -0,0 +1,57 @@
+import pytest
+from urllib3.exceptions import MaxRetryError
+from urllib3.response import HTTPResponse
+
+from http_client import BudgetedRetry, RetryBudget, build_session
+
+
+def test_budget_allows_a_ratio_of_retries():
+    budget = RetryBudget(ratio=0.5, per_second=0, capacity=2)
+    assert budget.withdraw(0) and budget.withdraw(0)
+    assert not budget.withdraw(0)
+    # Dos peticiones aportan un reintento
+    budget.deposit()
+    budget.deposit()
+    assert budget.withdraw(0)
+    assert not budget.withdraw(0)
+
+
+def test_budget_refills_with_time_up_to_capacity():
+    budget = RetryBudget(ratio=0, per_second=1, capacity=2)
+    assert budget.withdraw(0) and budget.withdraw(0) and not budget.withdraw(0)
+    assert budget.withdraw(100) and budget.withdraw(100)
+    assert not budget.withdraw(100)
+
+
+def retry_policy(tokens):
+    retry = BudgetedRetry(total=3, status_forcelist=[503], backoff_factor=0, respect_retry_after_header=True)
+    retry.budget = RetryBudget(ratio=0, per_second=0, capacity=tokens)
+    return retry
+
+
+def test_429_is_not_retried():
+    retry = retry_policy(10)
+    assert not retry.is_retry("GET", 429, has_retry_after=True)
+    assert retry.is_retry("GET", 503)
+
+
+def test_exhausted_budget_raises():
+    retry = retry_policy(1)
+    response = HTTPResponse(status=503)
+    retry = retry.increment("GET", "/", response=response)
+    assert retry.budget is not None
+    with pytest.raises(MaxRetryError):
+        retry.increment("GET", "/", response=response)
+
+
+def test_retry_after_is_capped():
+    retry = retry_policy(1)
+    retry.max_retry_after = 5
+    assert retry.new().get_retry_after(HTTPResponse(status=503, headers={"Retry-After": "3600"})) == 5
+    assert retry.get_retry_after(HTTPResponse(status=503, headers={"Retry-After": "2"})) == 2
+
+
+def test_session_pool_blocks_instead_of_overflowing():
+    adapter = build_session(pool_per_host=2).get_adapter("https://api.coingecko.com")
+    assert adapter.poolmanager.connection_pool_kw["block"] is True
+    assert adapter.poolmanager.connection_pool_kw["maxsize"] == 2
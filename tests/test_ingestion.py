@@ -0,0 +1,56 @@
+import time
+import threading
+
+from breaker import BreakerRegistry
+from ingestion import IngestionEngine, LatestPrices, Tick
+from ratelimit import RateLimiter
+
+
+class HungProvider:
+    requests_per_fetch = 1
+
+    def __init__(self, name, release):
+        self.name = name
+        self.interval = 0.5
+        self.timeout = 0.2
+        self.release = release
+        self.calls = 0
+
+    def fetch(self):
+        self.calls += 1
+        self.release.wait(30)
+        return []
+
+
+class FastProvider:
+    name = "fast"
+    interval = 0.5
+    timeout = 1
+    requests_per_fetch = 1
+
+    def fetch(self):
+        return [Tick("fast", "BTC", 1.0, int(time.time() * 1000))]
+
+
+def run_engine(providers, sink, seconds):
+    engine = IngestionEngine(providers, sink, latest=LatestPrices(), limiter=RateLimiter(""), breakers=BreakerRegistry())
+    thread = engine.start_in_thread()
+    time.sleep(seconds)
+    engine.stop()
+    thread.join(5)
+    return thread
+
+
+def test_hung_providers_do_not_starve_the_others():
+    release = threading.Event()
+    hung = [HungProvider(f"hung{i}", release) for i in range(3)]
+    stored = []
+    try:
+        thread = run_engine(hung + [FastProvider()], stored.extend, 3)
+    finally:
+        release.set()
+    assert not thread.is_alive()
+    # Un sondeo cada 0.5s durante 3s
+    assert len(stored) >= 4
+    # Mientras su fetch sigue colgado el proveedor no vuelve a sondear
+    assert all(provider.calls == 1 for provider in hung)
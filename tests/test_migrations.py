@@ -0,0 +1,71 @@
+import sqlite3
+import multiprocessing
+
+from create_db import MIGRATIONS, create_tables, init_db
+
+
+def user_version(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_fresh_db_applies_every_migration(db_path):
+    init_db(db_path)
+    assert user_version(db_path) == len(MIGRATIONS)
+    conn = sqlite3.connect(db_path)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert {"symbols", "ticks", "tick_stats", "ohlc_1m", "leases", "ohlcv", "order_books", "logs"} <= tables
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    conn.close()
+
+
+def test_init_db_is_idempotent(db_path):
+    init_db(db_path)
+    init_db(db_path)
+    assert user_version(db_path) == len(MIGRATIONS)
+
+
+def test_legacy_prices_are_migrated_to_ticks(db_path):
+    # Base anterior a las migraciones: solo la tabla ancha prices
+    conn = sqlite3.connect(db_path)
+    create_tables(conn.cursor())
+    conn.executemany(
+        "INSERT INTO prices (token1, token2, price1, price2, timestamp) VALUES (?, ?, ?, ?, ?)",
+        [("MATIC", "USDC", 0.5, 1.0, "2024-01-01 00:00:00"), ("MATIC", "USDC", 0.6, 1.001, "2024-01-01 00:01:00")],
+    )
+    conn.commit()
+    conn.close()
+
+    init_db(db_path)
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("""
+        SELECT s.name, t.ts, t.price FROM ticks t JOIN symbols s ON s.id = t.symbol_id ORDER BY s.name, t.ts
+    """).fetchall()
+    assert rows == [
+        ("MATIC", 1704067200000, 0.5), ("MATIC", 1704067260000, 0.6),
+        ("USDC", 1704067200000, 1.0), ("USDC", 1704067260000, 1.001),
+    ]
+    # Estadísticas y velas calculadas a partir de los ticks migrados
+    assert conn.execute("SELECT SUM(count) FROM tick_stats").fetchone()[0] == 4
+    assert conn.execute("""
+        SELECT open, close, count FROM ohlc_1h o JOIN symbols s ON s.id = o.symbol_id WHERE s.name = 'MATIC'
+    """).fetchone() == (0.5, 0.6, 2)
+    conn.close()
+
+
+def _init(path):
+    init_db(path)
+
+
+def test_concurrent_init_on_fresh_db(db_path):
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_init, args=(db_path,)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+    assert [process.exitcode for process in processes] == [0, 0, 0, 0]
+    assert user_version(db_path) == len(MIGRATIONS)
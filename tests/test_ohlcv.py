@@ -0,0 +1,53 @@
+import threading
+
+from breaker import breakers
+from ohlcv import OhlcvJob, start_ohlcv_thread
+
+MINUTE_MS = 60 * 1000
+
+
+class FakeExchange:
+    id = "fakeohlcv"
+
+    def __init__(self):
+        self.markets = {}
+        self.requests = 0
+
+    def parse_timeframe(self, timeframe):
+        return 60
+
+    def load_markets(self):
+        self.markets = {"BTC/USDT": {}}
+
+    def fetch_ohlcv(self, symbol, timeframe, since, limit):
+        self.requests += 1
+        return [[since + i * MINUTE_MS, 1.0, 2.0, 0.5, 1.5, 10.0] for i in range(limit)]
+
+
+def test_unlisted_symbol_is_not_requested(backend):
+    exchange = FakeExchange()
+    assert OhlcvJob(exchange, "MATIC/USDT").poll(backend) == 0
+    assert exchange.requests == 0
+    assert OhlcvJob(exchange, "BTC/USDT", initial_bars=3).poll(backend) == 4
+    assert backend.ohlcv_cursor("fakeohlcv", "BTC/USDT", "1m") is not None
+
+
+def test_rejected_job_waits_for_its_next_turn(backend):
+    exchange = FakeExchange()
+    job = OhlcvJob(exchange, "BTC/USDT")
+    breaker = breakers.get("fakeohlcv:ohlcv")
+    for _ in range(breaker.failure_threshold):
+        breaker.failure()
+    assert not breaker.allow()
+    # El breaker de la ingesta de tickers del exchange no se toca
+    assert breakers.get("fakeohlcv").allow()
+    stop = threading.Event()
+    thread = start_ohlcv_thread(backend, jobs=[job], stop=stop)
+    try:
+        # Con el circuito abierto el trabajo se aplaza en vez de reintentarse en cada vuelta
+        stop.wait(0.5)
+        assert job.next_due > 0
+        assert exchange.requests == 0
+    finally:
+        stop.set()
+        thread.join(5)
@@ -0,0 +1,44 @@
+import ccxt
+
+from ingestion import OrderBook
+from orderbook import fetch_books
+from storage import pack_levels, unpack_levels
+
+
+class FakeExchange:
+    id = "fake"
+
+    def __init__(self):
+        self.markets = {}
+        self.requested = []
+
+    def load_markets(self):
+        self.markets = {"BTC/USDT": {}, "ETH/USDT": {}}
+
+    def fetch_order_book(self, symbol, limit=None):
+        self.requested.append(symbol)
+        if symbol == "ETH/USDT":
+            raise ccxt.BadSymbol("fake does not have market symbol ETH/USDT")
+        return {"timestamp": 1000, "bids": [[99.0, 1.0, 0], [98.0, 2.0, 0]], "asks": [[101.0, 3.0, 0]]}
+
+
+def test_unlisted_and_rejected_symbols_are_skipped():
+    exchange = FakeExchange()
+    books = fetch_books(exchange, ["MATIC/USDT", "ETH/USDT", "BTC/USDT"], depth=1)
+    assert exchange.requested == ["ETH/USDT", "BTC/USDT"]
+    assert [(book.symbol, book.ts, book.bids, book.asks) for book in books] == [("BTC/USDT", 1000, [[99.0, 1.0]], [[101.0, 3.0]])]
+
+
+def test_levels_round_trip_with_float64_sizes():
+    levels = [[100.5, 123456.789012], [100.0, 0.00000123]]
+    prices, sizes = unpack_levels(pack_levels(levels))
+    assert prices.tolist() == [100.5, 100.0]
+    assert sizes.tolist() == [123456.789012, 0.00000123]
+
+
+def test_order_book_at_reads_levels(backend):
+    backend.write_order_books([OrderBook("fake", "BTC/USDT", 1000, [[99.0, 1.25], [98.0, 2.0]], [[101.0, 3.0]])])
+    ts, (bid_prices, bid_sizes), (ask_prices, ask_sizes) = backend.order_book_at("fake", "BTC/USDT", 2000)
+    assert ts == 1000
+    assert bid_prices.tolist() == [99.0, 98.0] and bid_sizes.tolist() == [1.25, 2.0]
+    assert ask_prices.tolist() == [101.0] and ask_sizes.tolist() == [3.0]
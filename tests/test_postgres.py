@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+
+import pytest
+
+from ingestion import Tick
+
+# Pruebas del backend PostgreSQL: solo con un servidor de pruebas, p. ej.
+# TEST_POSTGRES_DSN="host=localhost dbname=tradingbot_test user=postgres"
+DSN = os.getenv("TEST_POSTGRES_DSN")
+pytestmark = pytest.mark.skipif(not DSN, reason="TEST_POSTGRES_DSN no definido")
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+@pytest.fixture
+def pg():
+    from backends import PostgresBackend
+
+    backend = PostgresBackend(minconn=1, maxconn=2, dsn=DSN)
+    backend.init_schema()
+    yield backend
+    tables = ["ticks", "tick_stats", "ohlcv", "ohlcv_cursors", "order_books", "backfill_checkpoints", "leases", "symbols"]
+    backend._run(lambda cursor: cursor.execute(
+        f"TRUNCATE {', '.join(tables + [f'ohlc_{r}' for r in ('1m', '5m', '1h', '1d')])} CASCADE"
+    ))
+    backend.close()
+
+
+def test_more_threads_than_connections_wait_for_the_pool(pg):
+    errors = []
+
+    def query():
+        try:
+            pg._query("SELECT pg_sleep(0.05)")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=query) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+
+def stats_row(pg, name):
+    return pg._query("""
+        SELECT st.count, st.sum, st.mean, st.m2
+        FROM tick_stats st JOIN symbols s ON s.id = st.symbol_id
+        WHERE s.name = %s
+    """, (name,))[0]
+
+
+def test_repeated_tick_replaces_price_like_sqlite(pg):
+    pg.write_ticks([Tick("fake", "BTC", price, ts) for ts, price in ((0, 1.0), (1000, 2.0), (2000, 3.0))])
+    # Repetido con otro precio (se corrige), con el mismo (se ignora) y uno nuevo
+    pg.write_ticks([Tick("fake", "BTC", 5.0, 2000), Tick("fake", "BTC", 1.0, 0), Tick("fake", "BTC", 4.0, 3000)])
+    prices = [1.0, 2.0, 5.0, 4.0]
+    assert [row[1] for row in pg.tick_series("fake", "BTC", 0, 4000)] == prices
+    count, total, mean, m2 = stats_row(pg, "BTC")
+    expected_mean = sum(prices) / len(prices)
+    assert (count, total) == (4, sum(prices))
+    assert mean == pytest.approx(expected_mean)
+    assert m2 == pytest.approx(sum((p - expected_mean) ** 2 for p in prices))
+    # Vela de 1m: open del primer tick, close del último y high con la corrección
+    assert pg.candles("fake", "BTC", "1m", 0, 60000) == [(0, 1.0, 5.0, 1.0, 4.0, 4)]
+
+
+def test_legacy_prices_are_migrated_to_ticks(pg):
+    def create_prices(cursor):
+        cursor.execute("""
+            CREATE TABLE prices (
+                id SERIAL PRIMARY KEY,
+                timestamp TIMESTAMP NOT NULL,
+                token1 VARCHAR(10) NOT NULL,
+                price1 NUMERIC NOT NULL,
+                token2 VARCHAR(10) NOT NULL,
+                price2 NUMERIC NOT NULL
+            )
+        """)
+        cursor.execute("""
+            INSERT INTO prices (timestamp, token1, price1, token2, price2)
+            VALUES ('2024-01-01 00:00:00', 'MATIC', 0.5, 'USDC', 1.0),
+                   ('2024-01-01 00:01:00', 'MATIC', 0.6, 'USDC', 1.001)
+        """)
+        cursor.execute("DELETE FROM schema_migrations")
+
+    pg._run(create_prices)
+    try:
+        pg.init_schema()
+        pg.init_schema()
+        ts = 1704067200000
+        assert [tuple(row) for row in pg.tick_series("coingecko", "MATIC", 0, ts + 120000)] == [(ts, 0.5), (ts + 60000, 0.6)]
+        assert stats_row(pg, "USDC")[0] == 2
+    finally:
+        pg._run(lambda cursor: cursor.execute("DROP TABLE prices"))
+
+
+def test_latest_tick_picks_the_newest_source(pg):
+    pg.write_ticks([Tick("coingecko", "BTC", 100.0, 1000), Tick("kraken", "BTC", 101.0, 2000), Tick("kraken", "ETH", 5.0, 3000)])
+    assert tuple(pg.latest_tick("BTC")) == (2000, "kraken", "BTC", 101.0)
+    assert pg.latest_tick("DOGE") is None
+
+
+def test_keyset_pages_and_since_cursor(pg):
+    pg.write_ticks([Tick("fake", name, float(i), 1000 * (i // 2)) for i, name in enumerate(["BTC", "ETH"] * 4)])
+    full = [tuple(row) for row in pg.keyset_page("prices", limit=100)]
+    rows, after = [], None
+    while True:
+        page = pg.keyset_page("prices", after=after, limit=3, descending=True)
+        rows += [tuple(row) for row in page]
+        if len(page) < 3:
+            break
+        after = (page[-1][-2], page[-1][-1])
+    assert rows == full[::-1]
+    assert [row[3] for row in pg.keyset_page("prices", names=["BTC"], source="fake", limit=100)] == ["BTC"] * 4
+    assert pg.keyset_page("prices", names=["DOGE"]) == []
+    last_id = full[3][0]
+    assert [row[0] for row in pg.ticks_since(after_id=last_id, after_ts=full[3][1], limit=100)] == [row[0] for row in full[4:]]
+
+
+def test_retention_keeps_tick_stats_equal_to_the_remaining_ticks(pg):
+    now = int(time.time() * 1000)
+    ticks = [Tick("fake", "BTC", 100.0 + (i % 17) * (3.0 if i < 50 else 1.0), now - 10 * DAY_MS + i * (DAY_MS // 30)) for i in range(300)]
+    ticks += [Tick("fake", "ETH", 5.0 + i, now - 9 * DAY_MS + i) for i in range(10)]
+    pg.write_ticks(ticks)
+
+    deleted = pg.apply_retention({"ticks": 7 * DAY_MS, "order_books": DAY_MS}, batch_size=37, pause=0)
+    assert 0 < deleted["ticks"] < 310 and deleted["order_books"] == 0
+    purged = pg._query("SELECT symbol_id, count, sum, min, max, mean, m2, last_ts FROM tick_stats")
+    expected = pg._query("""
+        SELECT symbol_id, COUNT(*), SUM(price), MIN(price), MAX(price), AVG(price), VAR_POP(price) * COUNT(*), MAX(ts)
+        FROM ticks GROUP BY symbol_id
+    """)
+    assert len(purged) == len(expected) == 1
+    assert purged[0] == pytest.approx(expected[0])
+
+
+def test_tick_writers_take_ids_and_commit_one_at_a_time(pg):
+    from backends import PG_TICKS_LOCK
+
+    # Otro escritor a mitad de transacción con el bloqueo de ticks
+    conn = pg.pool.getconn()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (PG_TICKS_LOCK,))
+        writer = threading.Thread(target=pg.write_ticks, args=([Tick("fake", "BTC", 1.0, 1000)],))
+        writer.start()
+        writer.join(0.3)
+        assert writer.is_alive()
+        conn.commit()
+        writer.join(5)
+        assert not writer.is_alive()
+    finally:
+        pg.pool.putconn(conn)
+    assert len(pg.ticks_after(0)) == 1
+
+
+def test_find_gaps_starts_at_the_last_tick_before_the_range(pg):
+    pg.write_ticks([Tick("fake", "BTC", 1.0, ts) for ts in (0, 60000, 600000, 660000)])
+    assert pg.find_gaps("fake", "BTC", 120000, 300000, 700000) == [(60000, 600000)]
@@ -0,0 +1,63 @@
+import email.utils
+import time
+
+import pytest
+
+import ratelimit
+from ratelimit import RateLimiter, TokenBucket, parse_retry_after
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_burst_then_steady_rate(clock):
+    bucket = TokenBucket(60, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # Sin tokens: una petición por segundo
+    assert bucket.reserve() == pytest.approx(1.0)
+    assert bucket.reserve() == pytest.approx(2.0)
+    clock[0] += 10
+    assert bucket.reserve() == 0.0
+
+
+def test_429_halves_the_rate_and_pauses(clock):
+    bucket = TokenBucket(60)
+    bucket.record(429, retry_after="5")
+    assert bucket.rate == pytest.approx(0.5)
+    assert bucket.throttled == 1
+    assert bucket.reserve() == pytest.approx(5.0)
+    assert bucket.interval_for(2) == pytest.approx(5.0)
+    clock[0] += 10
+    assert bucket.interval_for(2) == pytest.approx(4.0)
+    # Cada respuesta correcta recupera max_rate / 20 hasta el máximo
+    for _ in range(30):
+        bucket.record(200)
+    assert bucket.rate == pytest.approx(1.0)
+
+
+def test_rate_never_drops_below_the_minimum(clock):
+    bucket = TokenBucket(60)
+    for _ in range(10):
+        bucket.record(429)
+    assert bucket.rate == pytest.approx(1 / 16)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("12") == 12.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("mañana") is None
+    date = email.utils.formatdate(time.time() + 60, usegmt=True)
+    assert 55 < parse_retry_after(date) <= 60
+
+
+def test_limiter_registers_buckets_by_provider_and_host():
+    limiter = RateLimiter("coingecko:30")
+    bucket = limiter.register("coingecko", {"api.coingecko.com"})
+    assert limiter.get("coingecko") is bucket
+    assert bucket.max_rate == pytest.approx(0.5)
+    assert limiter.for_url("https://api.coingecko.com/api/v3/ping") is bucket
+    assert limiter.register("kraken", set(), default_per_minute=60).max_rate == pytest.approx(1.0)
@@ -0,0 +1,54 @@
+import sqlite3
+import time
+
+import pytest
+
+from ingestion import Tick
+from retention import apply_retention, parse_rules
+from stats import rebuild_stats
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def tick_stats(conn):
+    return {row[0]: row[1:] for row in conn.execute(
+        "SELECT symbol_id, count, sum, min, max, mean, m2, last_ts FROM tick_stats ORDER BY symbol_id"
+    )}
+
+
+def test_purge_keeps_tick_stats_equal_to_a_rebuild(backend, db_path):
+    now = int(time.time() * 1000)
+    ticks = []
+    for i in range(300):
+        # BTC: ticks antiguos y recientes, con el mínimo y el máximo entre los antiguos
+        ts = now - 10 * DAY_MS + i * (DAY_MS // 30)
+        ticks.append(Tick("fake", "BTC", 100.0 + (i % 17) * (3.0 if i < 50 else 1.0), ts))
+    # ETH: solo ticks antiguos, desaparece de tick_stats
+    ticks += [Tick("fake", "ETH", 5.0 + i, now - 9 * DAY_MS + i) for i in range(10)]
+    backend.write_ticks(ticks)
+
+    conn = sqlite3.connect(db_path)
+    deleted = apply_retention(conn, {"ticks": 7 * DAY_MS}, batch_size=37, pause=0)
+    assert 0 < deleted["ticks"] < 310
+    purged = tick_stats(conn)
+    with conn:
+        rebuild_stats(conn.cursor())
+    rebuilt = tick_stats(conn)
+    conn.close()
+
+    assert purged.keys() == rebuilt.keys() and len(rebuilt) == 1
+    for symbol_id, row in rebuilt.items():
+        assert purged[symbol_id] == pytest.approx(row)
+
+
+def test_old_backfill_checkpoints_are_pruned(backend, db_path):
+    now = int(time.time() * 1000)
+    backend.mark_backfill_chunk("job", 0, DAY_MS)
+    backend.mark_backfill_chunk("job", DAY_MS, 2 * DAY_MS)
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("UPDATE backfill_checkpoints SET done_ts = ? WHERE chunk_start = 0", (now - 100 * DAY_MS,))
+    deleted = apply_retention(conn, parse_rules("backfill_checkpoints:90d"), pause=0)
+    conn.close()
+    assert deleted["backfill_checkpoints"] == 1
+    assert [tuple(row) for row in backend.backfill_chunks_done("job")] == [(DAY_MS, 2 * DAY_MS)]
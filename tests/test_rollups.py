@@ -0,0 +1,58 @@
+import sqlite3
+
+from ingestion import Tick
+from rollups import rebuild_rollups
+
+MINUTE_MS = 60 * 1000
+
+
+def candles(db_path, resolution):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(
+            f"SELECT symbol_id, bucket_ts, open, high, low, close, open_ts, close_ts, count FROM ohlc_{resolution} ORDER BY 1, 2"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def test_late_ticks_become_open_or_close(backend, db_path):
+    backend.write_ticks([Tick("fake", "BTC", 10.0, 20000), Tick("fake", "BTC", 11.0, 30000)])
+    # Tardío anterior al open y posterior al close, en otro lote
+    backend.write_ticks([Tick("fake", "BTC", 9.0, 5000), Tick("fake", "BTC", 12.0, 50000)])
+    assert candles(db_path, "1m") == [(1, 0, 9.0, 12.0, 9.0, 12.0, 5000, 50000, 4)]
+
+
+def test_updated_price_corrects_the_candle(backend, db_path):
+    backend.write_ticks([Tick("fake", "BTC", price, ts) for ts, price in ((0, 1.0), (10000, 2.0), (20000, 3.0))])
+    backend.write_ticks([Tick("fake", "BTC", 5.0, 20000), Tick("fake", "BTC", 0.5, 0)])
+    assert candles(db_path, "1m") == [(1, 0, 0.5, 5.0, 0.5, 5.0, 0, 20000, 3)]
+
+
+def test_triggers_match_a_rebuild(backend, db_path):
+    ticks = [Tick("fake", "BTC", 100.0 + (i * 7) % 13, i * 17000) for i in range(200)]
+    # Escritos desordenados y en varios lotes
+    backend.write_ticks(ticks[100:])
+    backend.write_ticks(ticks[:100][::-1])
+    incremental = {resolution: candles(db_path, resolution) for resolution in ("1m", "5m", "1h", "1d")}
+    conn = sqlite3.connect(db_path)
+    with conn:
+        rebuild_rollups(conn.cursor())
+    conn.close()
+    for resolution, rows in incremental.items():
+        assert rows == candles(db_path, resolution)
+
+
+def test_default_rebuild_keeps_partly_purged_buckets(backend, db_path):
+    day_ms = 24 * 60 * MINUTE_MS
+    backend.write_ticks([Tick("fake", "BTC", 100.0 + i, i * 6 * 60 * MINUTE_MS) for i in range(8)])
+    before = {resolution: candles(db_path, resolution) for resolution in ("1m", "1h", "1d")}
+    conn = sqlite3.connect(db_path)
+    with conn:
+        # La retención se ha llevado la primera mitad del primer día
+        conn.execute("DELETE FROM ticks WHERE ts < ?", (day_ms // 2,))
+        rebuild_rollups(conn.cursor())
+    conn.close()
+    # Las velas del primer día no se rehacen con solo la mitad de sus ticks
+    for resolution, rows in before.items():
+        assert candles(db_path, resolution) == rows
@@ -0,0 +1,50 @@
+import math
+import sqlite3
+
+import pytest
+
+from ingestion import Tick
+from stats import rebuild_stats
+
+
+def stats_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {row[0]: row[1:] for row in conn.execute(
+            "SELECT symbol_id, count, sum, min, max, mean, m2, last_ts FROM tick_stats"
+        )}
+    finally:
+        conn.close()
+
+
+def rebuilt_rows(db_path):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        rebuild_stats(conn.cursor())
+    conn.close()
+    return stats_rows(db_path)
+
+
+def test_triggers_match_a_rebuild_with_late_ticks(backend, db_path):
+    backend.write_ticks([Tick("fake", "BTC", price, ts) for ts, price in ((3000, 10.0), (4000, 12.5), (5000, 11.0))])
+    # Ticks tardíos (anteriores al último guardado) en lotes posteriores
+    backend.write_ticks([Tick("fake", "BTC", 9.0, 1000), Tick("fake", "ETH", 2.0, 2000)])
+    backend.write_ticks([Tick("fake", "BTC", 14.0, 2000)])
+    incremental = stats_rows(db_path)
+    assert incremental[1][0] == 5 and incremental[1][-1] == 5000
+    rebuilt = rebuilt_rows(db_path)
+    for symbol_id, row in rebuilt.items():
+        assert incremental[symbol_id] == pytest.approx(row)
+
+
+def test_updated_price_replaces_the_value(backend, db_path):
+    backend.write_ticks([Tick("fake", "BTC", price, ts) for ts, price in ((1000, 1.0), (2000, 2.0), (3000, 3.0))])
+    # Mismo (símbolo, ts) con otro precio: upsert
+    backend.write_ticks([Tick("fake", "BTC", 6.0, 2000)])
+    count, total, _, maximum, mean, m2, _ = stats_rows(db_path)[1]
+    prices = [1.0, 6.0, 3.0]
+    assert count == 3 and total == sum(prices) and maximum == 6.0
+    assert mean == pytest.approx(sum(prices) / 3)
+    assert m2 == pytest.approx(sum((p - mean) ** 2 for p in prices))
+    minimum, maximum, mean, stddev = backend.symbol_stats("fake", "BTC")
+    assert stddev == pytest.approx(math.sqrt(m2 / 2))
@@ -0,0 +1,113 @@
+import pytest
+
+from ingestion import Tick
+from storage import check_id, check_ts, keyset_page_query
+
+
+def test_latest_tick_picks_the_newest_source(backend):
+    backend.write_ticks([
+        Tick("coingecko", "BTC", 100.0, 1000),
+        Tick("kraken", "BTC", 101.0, 2000),
+        Tick("kraken", "BTC", 99.0, 500),
+        Tick("kraken", "ETH", 5.0, 3000),
+    ])
+    assert tuple(backend.latest_tick("BTC")) == (2000, "kraken", "BTC", 101.0)
+    assert backend.latest_tick("DOGE") is None
+
+
+def write_sample(backend):
+    # Varios ticks con el mismo ts: el cursor necesita el id para desempatar
+    backend.write_ticks([
+        Tick(source, name, float(i), 1000 * (i // 3))
+        for i, (source, name) in enumerate([("coingecko", "BTC"), ("coingecko", "ETH"), ("kraken", "BTC")] * 4)
+    ])
+
+
+def all_pages(backend, dataset, limit, **filters):
+    rows, after = [], None
+    while True:
+        page = backend.keyset_page(dataset, after=after, limit=limit, **filters)
+        rows += [tuple(row) for row in page]
+        if len(page) < limit:
+            return rows
+        # Las dos últimas columnas son el cursor (ts en ms, id)
+        after = (page[-1][-2], page[-1][-1])
+
+
+def test_keyset_pages_cover_every_row_once(backend):
+    write_sample(backend)
+    full = [tuple(row) for row in backend.keyset_page("prices", limit=100)]
+    assert len(full) == 12
+    assert [row[-2:] for row in full] == sorted(row[-2:] for row in full)
+    assert all_pages(backend, "prices", 5) == full
+    assert all_pages(backend, "prices", 5, descending=True) == full[::-1]
+
+
+def test_keyset_filters_and_fields(backend):
+    write_sample(backend)
+    rows = all_pages(backend, "prices", 2, fields=["symbol", "price"], names=["BTC"], source="kraken", start_ts=1000, end_ts=3000)
+    assert [row[:2] for row in rows] == [("BTC", 5.0), ("BTC", 8.0)]
+
+
+def test_keyset_single_symbol_uses_the_symbol_index(backend):
+    write_sample(backend)
+    # BTC está en dos fuentes (dos ids): se filtra por nombre
+    assert len(all_pages(backend, "prices", 2, names=["BTC"])) == 8
+    assert all_pages(backend, "prices", 2, names=["DOGE"]) == []
+    rows = all_pages(backend, "prices", 2, names=["BTC"], source="kraken", descending=True)
+    assert [row[1:4] for row in rows] == [(3000, "kraken", "BTC"), (2000, "kraken", "BTC"), (1000, "kraken", "BTC"), (0, "kraken", "BTC")]
+
+    sql, params = keyset_page_query("prices", after=(1000, 3), symbol_ids=[1])
+    plan = " ".join(row[3] for row in backend.db.reader().execute("EXPLAIN QUERY PLAN " + sql, params))
+    assert "idx_ticks_symbol_ts" in plan and "TEMP B-TREE" not in plan
+
+
+def test_cursor_values_are_range_checked():
+    assert check_ts(0) == 0 and check_id(2 ** 63 - 1) == 2 ** 63 - 1
+    with pytest.raises(ValueError):
+        check_ts(99999999999999999999)
+    with pytest.raises(ValueError):
+        check_id(2 ** 63)
+
+
+def test_keyset_trades_use_the_datetime_column(backend, db_path):
+    import sqlite3
+
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO trades (side, token1, token2, price1, price2, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+            [("buy", "MATIC", "USDC", 0.5, 1.0, "2024-01-01 00:00:00"),
+             ("sell", "MATIC", "USDC", 0.6, 1.0, "2024-01-01 00:00:00"),
+             ("buy", "WETH", "USDC", 2000.0, 1.0, "2024-01-01 00:01:00")],
+        )
+    conn.close()
+    rows = all_pages(backend, "trades", 1, fields=["side", "ts"], descending=True)
+    assert [(row[0], row[1]) for row in rows] == [("buy", 1704067260000), ("sell", 1704067200000), ("buy", 1704067200000)]
+    assert len(all_pages(backend, "trades", 1, names=["WETH"])) == 1
+
+
+def test_ticks_since_cursor(backend):
+    write_sample(backend)
+    rows = backend.ticks_since(after_id=4, limit=100)
+    assert [row[0] for row in rows] == list(range(5, 13))
+    # Cursor (ts, id): solo los posteriores al último visto, sin repetir el empate
+    rows = backend.ticks_since(after_id=5, after_ts=1000, names=["BTC"], limit=100)
+    assert [(row[0], row[1], row[2]) for row in rows] == [(6, 1000, "kraken"), (7, 2000, "coingecko"), (9, 2000, "kraken"), (10, 3000, "coingecko"), (12, 3000, "kraken")]
+    assert [row[0] for row in backend.ticks_since(after_ts=2000, source="coingecko", limit=1)] == [10]
+
+
+def test_tick_ids_are_not_reused_after_a_purge(backend, db_path):
+    import sqlite3
+
+    write_sample(backend)
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute("DELETE FROM ticks")
+    conn.close()
+    backend.write_ticks([Tick("kraken", "BTC", 1.0, 5000)])
+    rows = backend.ticks_since(after_id=12, limit=100)
+    assert [row[0] for row in rows] == [13]
+    # Los triggers de tick_stats y de las velas siguen en la tabla reconstruida
+    assert backend.symbol_stats("kraken", "BTC")[0] is not None
+    assert backend.candles("kraken", "BTC", "1m", 0, 60000)[-1][-1] >= 1
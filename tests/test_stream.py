@@ -0,0 +1,44 @@
+import asyncio
+
+import websockets
+
+from fake_ws import Replay
+from stream import KrakenStream
+
+
+def trade(trade_id):
+    return {"t": 0, "msg": {"channel": "trade", "type": "update", "data": [{
+        "symbol": "BTC/USD", "side": "buy", "price": 100.0 + trade_id, "qty": 1.0, "ord_type": "market",
+        "trade_id": trade_id, "timestamp": "2024-05-01T10:00:00.000000Z",
+    }]}}
+
+
+async def run_against(replay, until):
+    received = []
+    done = asyncio.Event()
+
+    async def emit(ticks):
+        received.extend(ticks)
+        if received[-1].price >= until:
+            done.set()
+
+    async with websockets.serve(replay.handler, "localhost", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        stream = KrakenStream(["BTC/USD"], url=f"ws://localhost:{port}", channels=("trade",))
+        task = asyncio.create_task(stream.run(emit))
+        try:
+            await asyncio.wait_for(done.wait(), 10)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    return stream, received
+
+
+def test_reconnects_and_counts_sequence_gaps():
+    # Cada 5 mensajes el servidor corta y se pierden 2 trades: 1-5, 8-12, 15
+    replay = Replay([trade(trade_id) for trade_id in range(1, 16)], speed=0, drop_every=5, lose=2)
+    stream, received = asyncio.run(run_against(replay, until=115.0))
+    assert [tick.price - 100.0 for tick in received] == [1, 2, 3, 4, 5, 8, 9, 10, 11, 12, 15]
+    assert stream.reconnects == 2
+    assert stream.sequence_gaps == 2
+    assert stream.last_trade_id == {"BTC/USD": 15}
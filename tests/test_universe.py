@@ -0,0 +1,48 @@
+import requests
+from pycoingecko import CoinGeckoAPI
+from requests.adapters import BaseAdapter
+
+from ingestion import CoinGeckoProvider
+from universe import chunk_ids, price_url
+
+
+# Adaptador que guarda la URL de cada petición y responde {} sin salir a la red
+class RecordingAdapter(BaseAdapter):
+    def __init__(self):
+        super().__init__()
+        self.urls = []
+
+    def send(self, request, **kwargs):
+        self.urls.append(request.url)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b"{}"
+        response.url = request.url
+        return response
+
+    def close(self):
+        pass
+
+
+def test_chunks_fit_the_real_url():
+    adapter = RecordingAdapter()
+    client = CoinGeckoAPI(demo_api_key="CG-" + "x" * 40)
+    client.session = requests.Session()
+    client.session.mount("https://", adapter)
+    universe = {f"coin-{i:03d}": f"C{i}" for i in range(200)}
+
+    provider = CoinGeckoProvider(client=client, universe=universe)
+    provider.fetch()
+
+    assert len(adapter.urls) == len(provider.chunks) > 1
+    assert all(len(url) <= 2000 for url in adapter.urls)
+    assert all("x_cg_demo_api_key=" in url and "%2C" in url for url in adapter.urls)
+    # Cada tramo va lleno: con el primer id del siguiente ya no cabría
+    for chunk, following in zip(provider.chunks, provider.chunks[1:]):
+        assert len(price_url(chunk + following[:1], extra_params=client.extra_params)) > 2000
+
+
+def test_single_chunk_when_the_url_fits():
+    ids = ["bitcoin", "usd-coin", "matic-network"]
+    assert chunk_ids(ids, max_url_length=len(price_url(ids))) == [ids]
+    assert chunk_ids(ids, max_url_length=len(price_url(ids)) - 1) == [ids[:2], ids[2:]]
@@ -0,0 +1,39 @@
+from broker import tick_broker
+from ingestion import Tick
+from worker import IngestionWorker
+
+
+def test_written_ticks_are_published_with_their_ids(backend):
+    worker = IngestionWorker(backend)
+    # Sin suscriptores no se relee nada
+    worker._write([Tick("fake", "BTC", 1.0, 1000)])
+    subscription = tick_broker.subscribe()
+    try:
+        worker._write([Tick("fake", "BTC", 2.0, 2000), Tick("fake", "ETH", 3.0, 2000)])
+        worker._write([Tick("fake", "BTC", 4.0, 3000)])
+        messages, dropped = subscription.drain(timeout=0)
+    finally:
+        tick_broker.unsubscribe(subscription)
+    assert dropped == 0
+    assert [message.split("\n")[0] for message in messages] == ["id: 2", "id: 3", "id: 4"]
+    assert '"price": 4.0' in messages[-1]
+
+
+def test_expired_lease_is_taken_over(backend, monkeypatch):
+    import storage
+
+    clock = [1_000_000.0]
+    monkeypatch.setattr(storage.time, "time", lambda: clock[0])
+    assert backend.acquire_lease("ingest", "a", 30000)
+    assert not backend.acquire_lease("ingest", "b", 30000)
+    # El líder renueva antes de que caduque
+    clock[0] += 20
+    assert backend.acquire_lease("ingest", "a", 30000)
+    clock[0] += 20
+    assert not backend.acquire_lease("ingest", "b", 30000)
+    # Sin renovar durante más del ttl, otro proceso toma el relevo
+    clock[0] += 31
+    assert backend.acquire_lease("ingest", "b", 30000)
+    assert not backend.acquire_lease("ingest", "a", 30000)
+    backend.release_lease("ingest", "b")
+    assert backend.acquire_lease("ingest", "a", 30000)
@@ -0,0 +1,95 @@
+import queue
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from write_buffer import WriteBehindBuffer
+
+
+class Recorder:
+    def __init__(self, failures=0, gate=None):
+        self.batches = []
+        self.failures = failures
+        self.gate = gate
+        self.calls = 0
+
+    def __call__(self, batch):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.failures:
+            self.failures -= 1
+            raise sqlite3.OperationalError("database is locked")
+        self.batches.append(list(batch))
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_flushes_every_max_rows():
+    write = Recorder()
+    buffer = WriteBehindBuffer(write, max_rows=3, max_delay_ms=60000).start()
+    buffer.put_many(range(7))
+    assert wait_for(lambda: len(write.batches) == 2)
+    assert write.batches == [[0, 1, 2], [3, 4, 5]]
+    buffer.close(5)
+    assert write.batches[-1] == [6]
+
+
+def test_flushes_after_max_delay():
+    write = Recorder()
+    buffer = WriteBehindBuffer(write, max_rows=100, max_delay_ms=200).start()
+    buffer.put("a")
+    time.sleep(0.05)
+    assert write.batches == []
+    assert wait_for(lambda: write.batches == [["a"]])
+    buffer.close(5)
+
+
+def test_full_queue_blocks_producers():
+    gate = threading.Event()
+    write = Recorder(gate=gate)
+    buffer = WriteBehindBuffer(write, max_rows=1, max_delay_ms=0, max_queue=2).start()
+    buffer.put(0)
+    # El escritor está ocupado con el primero: caben dos más y el siguiente espera
+    assert wait_for(lambda: write.calls == 1)
+    buffer.put_many([1, 2], timeout=0.1)
+    with pytest.raises(queue.Full):
+        buffer.put(3, timeout=0.1)
+    gate.set()
+    buffer.close(5)
+    assert [row for batch in write.batches for row in batch] == [0, 1, 2]
+
+
+def test_close_flushes_what_is_left():
+    write = Recorder()
+    buffer = WriteBehindBuffer(write, max_rows=100, max_delay_ms=60000).start()
+    buffer.put_many(["a", "b"])
+    buffer.close(5)
+    assert write.batches == [["a", "b"]]
+    with pytest.raises(RuntimeError):
+        buffer.put("c")
+
+
+def test_locked_database_is_retried():
+    write = Recorder(failures=2)
+    buffer = WriteBehindBuffer(write, max_rows=2, max_delay_ms=60000, retry_delay_ms=1).start()
+    buffer.put_many(["a", "b"])
+    buffer.close(5)
+    assert write.batches == [["a", "b"]]
+    assert write.calls == 3 and buffer.lost_rows == 0
+
+
+def test_batch_is_dropped_after_max_attempts():
+    write = Recorder(failures=3)
+    buffer = WriteBehindBuffer(write, max_rows=2, max_delay_ms=60000, max_attempts=3, retry_delay_ms=1).start()
+    buffer.put_many(["a", "b", "c"])
+    buffer.close(5)
+    assert write.batches == [["c"]]
+    assert buffer.lost_rows == 2
@@ -0,0 +1,63 @@
+import os
+from urllib.parse import quote_plus
+
+import requests
+
+# Universo por defecto: id de CoinGecko -> símbolo
+DEFAULT_UNIVERSE = "matic-network:MATIC,usd-coin:USDC,bitcoin:BTC"
+
+# URL base de la API pública de CoinGecko (la de pycoingecko sin clave de pago)
+COINGECKO_API_URL = "https://api.coingecko.com/api/v3/"
+
+
+def _parse_entries(entries):
+    universe = {}
+    for entry in entries:
+        entry = entry.strip()
+        if not entry or entry.startswith("#"):
+            continue
+        coin_id, _, symbol = entry.partition(":")
+        coin_id = coin_id.strip()
+        universe[coin_id] = (symbol.strip() or coin_id).upper()
+    return universe
+
+
+# Cargar el universo de tokens a seguir.
+# COINGECKO_IDS admite "id:SIMBOLO" separados por comas; para cientos de ids es
+# más cómodo COINGECKO_IDS_FILE, un fichero con una entrada por línea.
+def load_universe():
+    path = os.getenv("COINGECKO_IDS_FILE")
+    if path:
+        with open(path) as f:
+            return _parse_entries(f)
+    return _parse_entries(os.getenv("COINGECKO_IDS", DEFAULT_UNIVERSE).split(","))
+
+
+# URL de get_price para unos ids tal como la envía pycoingecko: los mismos
+# parámetros en el mismo orden, más la clave de API (extra_params del cliente)
+def price_url(ids, vs_currencies="usd", base_url=COINGECKO_API_URL, extra_params=None):
+    params = {"ids": ",".join(ids), "vs_currencies": vs_currencies}
+    params.update(extra_params or {})
+    return requests.Request("GET", f"{base_url}simple/price", params=params).prepare().url
+
+
+# Repartir los ids en el menor número de grupos cuya URL de get_price no supere
+# max_url_length caracteres
+def chunk_ids(ids, max_url_length=None, vs_currencies="usd", base_url=COINGECKO_API_URL, extra_params=None):
+    if max_url_length is None:
+        max_url_length = int(os.getenv("COINGECKO_MAX_URL_LENGTH", 2000))
+    budget = max_url_length - len(price_url([], vs_currencies, base_url, extra_params))
+
+    chunks, current, length = [], [], 0
+    for coin_id in ids:
+        # La coma que separa este id del anterior va codificada como %2C
+        extra = len(quote_plus(coin_id)) + (3 if current else 0)
+        if current and length + extra > budget:
+            chunks.append(current)
+            current, length = [], 0
+            extra = len(quote_plus(coin_id))
+        current.append(coin_id)
+        length += extra
+    if current:
+        chunks.append(current)
+    return chunks
@@ -0,0 +1,159 @@
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+from backends import get_backend
+from ingestion import IngestionEngine, build_providers
+from stream import build_streams
+from broker import tick_broker, publish_ticks_after
+from write_buffer import WriteBehindBuffer
+from retention import start_retention_thread
+from gaps import start_gap_healer_thread
+from ohlcv import start_ohlcv_thread
+from orderbook import start_order_book_thread
+from metrics import start_metrics_server
+
+LEASE_NAME = "ingest"
+
+
+# Proceso de ingesta con elección de líder. Varios procesos pueden ejecutarlo
+# (réplicas, workers de gunicorn con INGEST_EMBEDDED=1), pero solo el que tiene
+# el lease "ingest" en la base de datos sondea a los proveedores y escribe: el
+# resto espera y toma el relevo si el líder deja de renovarlo durante
+# INGEST_LEASE_TTL segundos. El lease se renueva cada ttl/3.
+class IngestionWorker:
+    def __init__(self, backend, ttl=None, owner=None):
+        self.backend = backend
+        self.ttl = ttl if ttl is not None else float(os.getenv("INGEST_LEASE_TTL", 30))
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.leading = False
+        self._renewed = 0.0
+        self._buffer = None
+        # Último id de ticks publicado en tick_broker (None sin suscriptores)
+        self._published_id = None
+        self._engine = None
+        self._engine_thread = None
+        self._tasks_stop = None
+        self._shutdown = threading.Event()
+        self._thread = None
+
+    # Encolar un lote de ticks del motor de ingesta
+    def _store(self, ticks):
+        self._buffer.put_many(ticks)
+        print(f"Ticks recibidos ({ticks[0].source}): {len(ticks)}")
+
+    # Escribir un lote del buffer y difundirlo a los clientes de /stream/prices
+    # de este proceso (si la ingesta corre embebida en el proceso web). Como el
+    # tailer de broker.py, se releen por id tras el commit para publicarlos con
+    # sus ids y que el navegador pueda reanudar con Last-Event-ID.
+    def _write(self, ticks):
+        if not tick_broker.subscribers:
+            self._published_id = None
+        elif self._published_id is None:
+            self._published_id = self.backend.max_tick_id()
+        self.backend.write_ticks(ticks)
+        if self._published_id is not None:
+            self._published_id = publish_ticks_after(self.backend, self._published_id)
+
+    def _start(self):
+        # Buffer de escritura diferida para la tabla ticks: agrupa los ticks y los
+        # confirma en una sola transacción cada WRITE_BATCH_ROWS filas o WRITE_BATCH_MS ms
+        self._buffer = WriteBehindBuffer(
+            self._write,
+            max_rows=int(os.getenv("WRITE_BATCH_ROWS", 500)),
+            max_delay_ms=int(os.getenv("WRITE_BATCH_MS", 1000)),
+            max_queue=int(os.getenv("WRITE_QUEUE_SIZE", 10000)),
+            max_attempts=int(os.getenv("WRITE_MAX_ATTEMPTS", 5)),
+        ).start()
+        self._engine = IngestionEngine(build_providers(), sink=self._store, streams=build_streams())
+        self._engine_thread = self._engine.start_in_thread()
+
+        self._tasks_stop = threading.Event()
+        # Purgar periódicamente los datos antiguos según RETENTION_RULES
+        start_retention_thread(self.backend, interval=int(os.getenv("RETENTION_INTERVAL", 3600)), stop=self._tasks_stop)
+        # Buscar huecos en las series y rellenarlos con el histórico
+        start_gap_healer_thread(self.backend, stop=self._tasks_stop)
+        # Velas OHLCV de los exchanges con cursor incremental
+        start_ohlcv_thread(self.backend, stop=self._tasks_stop)
+        # Fotos del libro de órdenes
+        if int(os.getenv("ORDERBOOK_DEPTH", 20)) > 0:
+            start_order_book_thread(self.backend, stop=self._tasks_stop)
+        self.leading = True
+
+    def _stop(self):
+        self.leading = False
+        self._tasks_stop.set()
+        self._engine.stop()
+        # Esperar a que el motor entregue lo que tenga en cola antes del último flush
+        self._engine_thread.join(self.ttl)
+        self._buffer.close()
+
+    # Intentar obtener o renovar el lease. Si la base de datos falla, se conserva
+    # el estado actual mientras no haya caducado el último lease obtenido.
+    def _hold_lease(self):
+        try:
+            held = self.backend.acquire_lease(LEASE_NAME, self.owner, int(self.ttl * 1000))
+        except Exception as e:
+            print(f"Error renovando el lease de ingesta: {e}")
+            return self.leading and time.monotonic() - self._renewed < self.ttl
+        if held:
+            self._renewed = time.monotonic()
+        return held
+
+    def run(self):
+        try:
+            while not self._shutdown.is_set():
+                held = self._hold_lease()
+                if held and not self.leading:
+                    print(f"Lease de ingesta obtenido ({self.owner}): empezando a sondear")
+                    self._start()
+                elif not held and self.leading:
+                    print(f"Lease de ingesta perdido ({self.owner}): deteniendo la ingesta")
+                    self._stop()
+                self._shutdown.wait(self.ttl / 3)
+        finally:
+            if self.leading:
+                self._stop()
+                try:
+                    self.backend.release_lease(LEASE_NAME, self.owner)
+                except Exception as e:
+                    print(f"Error liberando el lease de ingesta: {e}")
+
+    def stop(self):
+        self._shutdown.set()
+
+    # Ejecutar la elección de líder en un hilo de fondo (ingesta embebida en la web)
+    def start_in_thread(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    # Parar y esperar al hilo de fondo, liberando el lease si se tenía
+    def shutdown(self):
+        self.stop()
+        if self._thread is not None:
+            self._thread.join(self.ttl)
+
+
+# Uso: python worker.py  -> proceso de ingesta dedicado (junto a gunicorn app:app)
+if __name__ == "__main__":
+    load_dotenv()
+    backend = get_backend()
+    backend.init_schema()
+    worker = IngestionWorker(backend)
+    # Métricas de breakers y límites de los proveedores en http://host:puerto/metrics
+    metrics_port = int(os.getenv("WORKER_METRICS_PORT", 9101))
+    if metrics_port:
+        start_metrics_server(metrics_port)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        backend.close()
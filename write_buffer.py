@@ -0,0 +1,97 @@
+import time
+import queue
+import threading
+
+# Marcador para indicar al hilo escritor que debe vaciar la cola y terminar
+_STOP = object()
+
+
+# Buffer de escritura diferida (write-behind): acumula filas y las entrega a
+# write(batch), que las escribe en una sola transacción (p. ej. el write_ticks
+# de un backend), cada max_rows filas o cada max_delay_ms milisegundos, lo que
+# ocurra primero. La cola está acotada: si el escritor no da abasto, put() se
+# bloquea y frena a los productores (backpressure).
+# Si write falla (p. ej. "database is locked" con otro proceso escribiendo) el
+# mismo lote se reintenta hasta max_attempts veces con backoff exponencial;
+# mientras tanto la cola se sigue llenando y frena a los productores. Solo si
+# fallan todos los intentos se descarta el lote (y se cuenta en lost_rows).
+class WriteBehindBuffer:
+    def __init__(self, write, max_rows=500, max_delay_ms=1000, max_queue=10000, max_attempts=5, retry_delay_ms=100):
+        self.write = write
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000.0
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay_ms / 1000.0
+        self.lost_rows = 0
+        self._thread = None
+        self._closed = False
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def put(self, row, timeout=None):
+        if self._closed:
+            raise RuntimeError("WriteBehindBuffer cerrado")
+        self.queue.put(row, timeout=timeout)
+
+    def put_many(self, rows, timeout=None):
+        for row in rows:
+            self.put(row, timeout=timeout)
+
+    # Vaciar la cola, hacer el último flush y esperar al hilo escritor
+    def close(self, timeout=None):
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self.queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _collect(self):
+        batch = []
+        stop = False
+        # Esperar sin límite al primer elemento; el plazo empieza a contar desde ahí
+        item = self.queue.get()
+        deadline = time.monotonic() + self.max_delay
+        while True:
+            if item is _STOP:
+                stop = True
+                break
+            batch.append(item)
+            if len(batch) >= self.max_rows:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        return batch, stop
+
+    def _flush(self, batch):
+        delay = self.retry_delay
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self.write(batch)
+                return
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    self.lost_rows += len(batch)
+                    print(f"Error al escribir {len(batch)} filas tras {attempt} intentos, se descartan: {e}")
+                    return
+                print(f"Error al escribir {len(batch)} filas (intento {attempt}), reintentando en {delay:.1f}s: {e}")
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+    def _run(self):
+        while True:
+            batch, stop = self._collect()
+            if batch:
+                self._flush(batch)
+            if stop:
+                break